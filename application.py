@@ -2,81 +2,85 @@ import os
 import sys
 import time
 import json
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from dotenv import load_dotenv
-
-from services.youtube import get_transcript
-from services.ai_engine import analyze_structure, generate_script
+from services import startup
+
+# 시작 시간 측정: 구간별 import 시간은 /api/startup 에서 확인
+with startup.timed("import:framework"):
+    from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+    from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse, Response, StreamingResponse
+    from fastapi.middleware.gzip import GZipMiddleware
+    from pydantic import BaseModel
+    from dotenv import load_dotenv
+    from starlette.concurrency import run_in_threadpool
+
+with startup.timed("import:services"):
+    from services.youtube import get_transcript, get_whisper_status, warm_up_whisper, extract_video_id
+    from services.ai_engine import analyze_structure, generate_script, get_gemini_health
+    from services.admission import AdmissionController, AdmissionRejected, PRIORITY_ADMIN, PRIORITY_NORMAL
+    from services.state import create_backend
+    from services.activity import parse_time
+    from services.warmup import CacheWarmer, watch_file
+    from services.assets import AssetBundle
+    from services.similarity import SimilarityIndex
+    from services.templates import TemplateLibrary, build_library, save_library
+    from services.analytics import AnalyticsEngine
+    from services.presence import PresenceHub
+    from services.transcripts import get_transcript_stats
+    from services.transcription import POLICY as TRANSCRIPTION_POLICY
+    from services import metadata as video_metadata
+    from services.negative_cache import NegativeCache, describe as describe_failure
+    from services.profiling import CpuProfiler, MemoryProfiler, ProfilingMiddleware
+    from services.deadline import Deadline, DeadlineExceeded, RequestCancelled, activate as activate_deadline
+    from services.prescore import prescore
+    from services.comparison import compare as compare_analyses
+    from services.popular_videos import PopularVideos, PopularRefresher, parse_category_values, parse_intervals
+    from services.quota import QuotaLedger
+    from services.video_history import VideoHistory
 
 # 실시간 접속자 추적
-ACTIVE_USERS: Dict[str, float] = {}  # session_id -> last_heartbeat_time
-TOTAL_VISITORS: set = set()  # 누적 방문자 (세션 ID 저장)
 HEARTBEAT_TIMEOUT = 30  # 30초 동안 heartbeat 없으면 비활성으로 간주
 
 # 데이터 저장 경로
 DATA_DIR = Path(__file__).parent / "data"
 DATA_DIR.mkdir(exist_ok=True)
-DATA_FILE = DATA_DIR / "usage_data.json"
-
-# IP별 사용 제한 (하루 1회씩)
-IP_USAGE_ANALYZE: Dict[str, float] = {}  # 분석 제한
-IP_USAGE_GENERATE: Dict[str, float] = {}  # 스크립트 제한
-DAILY_LIMIT_SECONDS = 24 * 60 * 60  # 24시간
 
-# 활동 로그 (최근 100개)
-ACTIVITY_LOG: List[Dict] = []
-MAX_LOG_SIZE = 100
+# 분석 요청 전체(대기열 + 자막 + Whisper + Gemini) 시간 예산, 클라이언트 연결 확인 주기
+ANALYZE_DEADLINE_SECONDS = float(os.getenv("ANALYZE_DEADLINE_SECONDS", "300"))
+DISCONNECT_POLL_SECONDS = 1.0
 
+# 예비 점수 일괄 계산 (/api/triage): 요청당 최대 영상 수, 동시 자막 조회 수
+TRIAGE_MAX_URLS = 50
+TRIAGE_CONCURRENCY = int(os.getenv("TRIAGE_CONCURRENCY", "4"))
 
-def save_data():
-    """데이터를 파일에 저장"""
-    data = {
-        "ip_usage_analyze": IP_USAGE_ANALYZE,
-        "ip_usage_generate": IP_USAGE_GENERATE,
-        "whitelist_ips": list(WHITELIST_IPS),
-        "activity_log": ACTIVITY_LOG[-MAX_LOG_SIZE:]
-    }
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+# 분석 풀 동시 실행 수 (ADMISSION 설정과 워밍업 동시 실행 상한에서 공용)
+ADMISSION_ANALYZE_LIMIT = int(os.getenv("ADMISSION_ANALYZE_LIMIT", "2"))
 
+# 여러 영상 비교: 최대 영상 수, 요청당 동시 분석 수 (일일 한도는 1회 차감)
+# 비교 분석은 별도 "compare" 풀에서 돌아 일반 분석 풀을 차지하지 않음. 영상마다 풀 슬롯을 받은
+# 뒤부터 ANALYZE_DEADLINE_SECONDS 예산 적용
+COMPARE_MAX_URLS = 10
+COMPARE_CONCURRENCY = int(os.getenv("COMPARE_CONCURRENCY", "3"))
 
-def load_data():
-    """파일에서 데이터 로드"""
-    global IP_USAGE_ANALYZE, IP_USAGE_GENERATE, WHITELIST_IPS, ACTIVITY_LOG
-    if DATA_FILE.exists():
-        try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            IP_USAGE_ANALYZE = data.get("ip_usage_analyze", {})
-            IP_USAGE_GENERATE = data.get("ip_usage_generate", {})
-            WHITELIST_IPS = set(data.get("whitelist_ips", []))
-            ACTIVITY_LOG = data.get("activity_log", [])
-        except:
-            pass
+# IP별 사용 제한 (하루 1회씩)
+DAILY_LIMIT_SECONDS = 24 * 60 * 60  # 24시간
 
 
 def log_activity(action: str, ip: str, details: str):
     """활동 로그 기록"""
-    ACTIVITY_LOG.append({
+    STATE.append_activity({
         "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "action": action,
         "ip": ip,
         "details": details
     })
-    if len(ACTIVITY_LOG) > MAX_LOG_SIZE:
-        ACTIVITY_LOG.pop(0)
-    save_data()
-
 
-# 시작 시 데이터 로드
-load_data()
 
 # 관리자 IP 화이트리스트 (제한 없음)
 ADMIN_IPS = {
@@ -86,9 +90,6 @@ ADMIN_IPS = {
     
 }
 
-# 동적 화이트리스트 (admin에서 추가/제거 가능)
-WHITELIST_IPS: set = set()
-
 # 관리자 페이지 비밀번호
 ADMIN_PASSWORD = "my-test-key"
 
@@ -111,18 +112,21 @@ def get_client_ip(request: Request) -> str:
     return request.client.host if request.client else "unknown"
 
 
+def is_privileged(ip: str) -> bool:
+    """관리자 IP 또는 동적 화이트리스트 (admin에서 추가/제거 가능)"""
+    return ip in ADMIN_IPS or STATE.is_whitelisted(ip)
+
+
 def check_daily_limit(ip: str, usage_type: str = "analyze") -> tuple[bool, int]:
     """IP별 일일 사용 제한 확인. (허용여부, 남은시간초) 반환"""
     # 관리자 IP 또는 화이트리스트는 항상 허용
-    if ip in ADMIN_IPS or ip in WHITELIST_IPS:
+    if is_privileged(ip):
         return True, 0
 
-    ip_usage = IP_USAGE_ANALYZE if usage_type == "analyze" else IP_USAGE_GENERATE
-
-    if ip not in ip_usage:
+    last_usage = STATE.get_usage(usage_type, ip)
+    if last_usage is None:
         return True, 0
 
-    last_usage = ip_usage[ip]
     elapsed = time.time() - last_usage
 
     if elapsed >= DAILY_LIMIT_SECONDS:
@@ -134,12 +138,8 @@ def check_daily_limit(ip: str, usage_type: str = "analyze") -> tuple[bool, int]:
 
 def record_usage(ip: str, usage_type: str = "analyze"):
     """IP 사용 기록 (관리자 IP 제외)"""
-    if ip not in ADMIN_IPS and ip not in WHITELIST_IPS:
-        if usage_type == "analyze":
-            IP_USAGE_ANALYZE[ip] = time.time()
-        else:
-            IP_USAGE_GENERATE[ip] = time.time()
-        save_data()
+    if not is_privileged(ip):
+        STATE.set_usage(usage_type, ip, time.time())
 
 
 def get_config_dir() -> Path:
@@ -159,21 +159,163 @@ STATIC_DIR = get_static_dir()
 ENV_PATH = CONFIG_DIR / ".env"
 load_dotenv(ENV_PATH)
 
-app = FastAPI(title="YouTube Pattern Benchmark", docs_url=None, redoc_url=None)
+# 런타임 상태 저장소 (memory: 단일 프로세스 / sqlite: 같은 호스트 다중 워커 / redis: 다중 노드)
+STATE = create_backend(os.getenv("STATE_BACKEND", "memory"), DATA_DIR)
+
+# 시작 시 Whisper 모델 미리 로드 (WHISPER_WARMUP=1일 때, 서버 기동은 막지 않음)
+WHISPER_WARMUP = os.getenv("WHISPER_WARMUP", "0") == "1"
+
+# 인기 영상 캐시 워밍 (scripts/update_videos.py 결과 파일 감시)
+WARM_POPULAR = os.getenv("WARM_POPULAR", "0") == "1"
+POPULAR_VIDEOS_FILE = DATA_DIR / "popular_videos.json"
+POPULAR = PopularVideos(POPULAR_VIDEOS_FILE)
+
+# 인기 영상 자동 갱신 (POPULAR_REFRESH=1): 카테고리별 주기(시간)로 앱 안에서 수집 후 원자적으로 교체
+# 여러 워커로 실행할 때는 한 워커에서만 켜기 (각 워커가 따로 API 할당량을 씀)
+POPULAR_REFRESH = os.getenv("POPULAR_REFRESH", "0") == "1"
+# YouTube Data API 할당량 사용 기록 (scripts/update_videos.py 와 같은 파일 공유, 태평양 시간 자정 초기화)
+YOUTUBE_QUOTA = QuotaLedger(DATA_DIR / "youtube_quota.json")
+# 수집할 때마다 쌓이는 조회수 관측 기록 (하루 1개 .npz, VIDEO_HISTORY_DAYS 일 보관) → 조회수 증가 속도 순위
+VIDEO_HISTORY = VideoHistory(DATA_DIR / "video_history")
+POPULAR_REFRESHER = PopularRefresher(
+    POPULAR,
+    parse_intervals(float(os.getenv("POPULAR_REFRESH_HOURS", "24")), os.getenv("POPULAR_REFRESH_INTERVALS", "")),
+    YOUTUBE_QUOTA,
+    # 할당량이 부족할 때 먼저 갱신할 카테고리 가중치 (예: "food=2,humor=0.5", 0 이면 제외)
+    priorities=parse_category_values(1.0, os.getenv("POPULAR_PRIORITIES", "")),
+    retry_delay=float(os.getenv("POPULAR_REFRESH_RETRY", "3600")),
+    history=VIDEO_HISTORY,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.mark("app_startup")
+    if WHISPER_WARMUP:
+        threading.Thread(target=warm_up_whisper, name="whisper-warmup", daemon=True).start()
+    # 무거운 의존성(genai, yt-dlp)은 소켓이 열린 뒤 백그라운드에서 미리 로드
+    startup.start_preload(delay=float(os.getenv("STARTUP_PRELOAD_DELAY", "1.0")))
+
+    # 인기 영상 목록이 갱신되면 해당 영상들을 백그라운드에서 미리 분석 (WARM_POPULAR=1)
+    watcher = None
+    if WARM_POPULAR:
+        watcher = asyncio.create_task(watch_file(
+            POPULAR_VIDEOS_FILE,
+            lambda: WARMER.enqueue(popular_video_urls()),
+            interval=float(os.getenv("WARM_POPULAR_POLL", "60")),
+        ))
+    refresher = asyncio.create_task(POPULAR_REFRESHER.run()) if POPULAR_REFRESH else None
+    presence = asyncio.create_task(PRESENCE.run())
+    yield
+    presence.cancel()
+    if refresher:
+        refresher.cancel()
+    if watcher:
+        watcher.cancel()
+    WARMER.cancel()
+
+
+app = FastAPI(title="YouTube Pattern Benchmark", docs_url=None, redoc_url=None, lifespan=lifespan)
+
+# 정적 파일: 시작 시 한 번 읽어 해시 URL + gzip/brotli 압축본을 메모리에 준비
+with startup.timed("build:assets"):
+    ASSETS = AssetBundle(STATIC_DIR).build()
+
+# API JSON 등 동적 응답은 일정 크기 이상일 때만 압축 (정적 파일은 이미 압축된 채로 통과)
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=int(os.getenv("GZIP_MIN_SIZE", "1024")),
+    compresslevel=int(os.getenv("GZIP_LEVEL", "6")),
+)
+
+# 운영 중 프로파일링 (관리자가 켤 때만 동작, 꺼져 있으면 요청마다 플래그 확인 한 번)
+CPU_PROFILER = CpuProfiler()
+MEMORY_PROFILER = MemoryProfiler()
+app.add_middleware(ProfilingMiddleware, profiler=CPU_PROFILER)
+
+# 카테고리별 구조 템플릿 (scripts/build_templates.py 로 미리 계산, 없으면 기본 뼈대 사용)
+TEMPLATES = TemplateLibrary(DATA_DIR / "structure_templates.json").load()
+
+# 분석 결과 유사도 색인 (첫 조회 때 캐시 전체로 채우고, 이후 새 분석마다 추가)
+SIMILAR = SimilarityIndex()
+
+# 접속자 집계: WebSocket 연결 수명 = 접속, 상태 저장소에는 주기적으로 한 번에 기록
+PRESENCE = PresenceHub(STATE, HEARTBEAT_TIMEOUT, flush_interval=float(os.getenv("PRESENCE_FLUSH_INTERVAL", "10")))
+
+# 자막 추출이 반복 실패하는 영상은 영상 ID 단위로 일정 시간 바로 거절 (실패할수록 길어짐)
+FAILED_VIDEOS = NegativeCache(STATE)
+
+# 카테고리별 분석 통계 (새 분석마다 누적 갱신, 카테고리 매핑이 바뀌면 일괄 재계산)
+ANALYTICS = AnalyticsEngine()
+_analytics_popular_mtime = None
+
+# 메모리 스냅샷마다 항목 수와 실제 크기를 재는 오래 사는 구조 (tracemalloc 은 할당한 줄 기준이라 따로 측정)
+for _name in ("analysis_cache", "sessions", "visitors", "usage", "failed_videos"):
+    MEMORY_PROFILER.track(_name, lambda name=_name: STATE.memory_structures().get(name))
+MEMORY_PROFILER.track("similarity_index", lambda: SIMILAR)
+MEMORY_PROFILER.track("analytics", lambda: ANALYTICS)
+
+# 무거운 파이프라인 동시 실행 제한 (엔드포인트 종류별 풀 + 대기열)
+# 스레드풀 전체를 점유하지 않도록 분석(Whisper 포함)은 적게, 스크립트 생성은 조금 더 허용
+ADMISSION = AdmissionController()
+ADMISSION.configure(
+    "analyze",
+    limit=ADMISSION_ANALYZE_LIMIT,
+    max_queue=int(os.getenv("ADMISSION_ANALYZE_QUEUE", "8")),
+    max_wait=float(os.getenv("ADMISSION_ANALYZE_MAX_WAIT", "180")),
+)
+ADMISSION.configure(
+    "compare",
+    limit=int(os.getenv("ADMISSION_COMPARE_LIMIT", "3")),
+    max_queue=int(os.getenv("ADMISSION_COMPARE_QUEUE", "12")),
+    max_wait=float(os.getenv("ADMISSION_COMPARE_MAX_WAIT", "180")),
+)
+ADMISSION.configure(
+    "generate",
+    limit=int(os.getenv("ADMISSION_GENERATE_LIMIT", "4")),
+    max_queue=int(os.getenv("ADMISSION_GENERATE_QUEUE", "16")),
+    max_wait=float(os.getenv("ADMISSION_GENERATE_MAX_WAIT", "60")),
+)
+
+
+async def acquire_admission(pool: str, ip: str) -> float:
+    """풀 슬롯 확보 (관리자/화이트리스트 우선). 대기열이 가득 차면 503 + Retry-After. 반납은 ADMISSION.release"""
+    priority = PRIORITY_ADMIN if is_privileged(ip) else PRIORITY_NORMAL
+    try:
+        return await ADMISSION.acquire(pool, priority)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"현재 요청이 많아 대기열이 가득 찼습니다. 약 {e.retry_after}초 후에 다시 시도해주세요.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
 
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
-# 간단한 메모리 캐시: 동일 URL은 같은 분석 결과를 반환
-ANALYSIS_CACHE: Dict[str, Any] = {}
+@asynccontextmanager
+async def admission_slot(pool: str, ip: str):
+    """블록 동안 풀 슬롯 점유 (acquire_admission 참고)"""
+    admitted_at = await acquire_admission(pool, ip)
+    try:
+        yield
+    finally:
+        ADMISSION.release(pool, admitted_at)
 
 
 class AnalyzeRequest(BaseModel):
     url: str
 
 
+class TriageRequest(BaseModel):
+    urls: List[str]
+
+
+class CompareRequest(BaseModel):
+    urls: List[str]
+
+
 class GenerateRequest(BaseModel):
     topic: str
-    analysis: Dict[str, Any]
+    analysis: Optional[Dict[str, Any]] = None  # category+template 이면 생략 가능
     tone: Optional[str] = None
     style: Optional[str] = None
     audience: Optional[str] = None
@@ -181,18 +323,169 @@ class GenerateRequest(BaseModel):
     template: Optional[str] = None  # 템플릿 구조명
 
 
-@app.get("/")
-def root():
-    return FileResponse(STATIC_DIR / "index.html")
+startup.mark("app_imported")
 
 
-@app.post("/api/analyze")
-def api_analyze(payload: AnalyzeRequest, request: Request):
-    if not payload.url:
-        raise HTTPException(status_code=400, detail="URL is required")
+async def _warm_analysis(url: str):
+    check_failed_video(url)
+    await run_analysis(url)
+    log_activity("분석(워밍업)", "system", url)
 
-    # IP별 일일 사용 제한 체크 (분석)
-    client_ip = get_client_ip(request)
+
+# 인기 영상 미리 분석: 사용자 분석과 같은 풀을 쓰되 가장 낮은 우선순위, 동시 실행 수 제한
+# (분석 풀보다 1개 적게 잡아 일반 분석용 슬롯 하나는 항상 남김, 풀이 1개면 어쩔 수 없이 1)
+WARMER = CacheWarmer(
+    analyze=_warm_analysis,
+    is_cached=lambda url: STATE.cache_get(url) is not None,
+    admission=ADMISSION,
+    concurrency=max(1, min(int(os.getenv("WARMUP_CONCURRENCY", "1")), ADMISSION_ANALYZE_LIMIT - 1)),
+)
+
+
+def serve_asset(request: Request, path: str) -> Response:
+    found = ASSETS.lookup(path)
+    if not found:
+        raise HTTPException(status_code=404, detail="Not Found")
+    asset, immutable = found
+    status, headers, body = ASSETS.respond(
+        asset,
+        immutable,
+        request.headers.get("accept-encoding", ""),
+        request.headers.get("if-none-match", ""),
+    )
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(len(body))
+        body = b""
+    return Response(content=body, status_code=status, headers=headers)
+
+
+@app.api_route("/", methods=["GET", "HEAD"])
+def root(request: Request):
+    return serve_asset(request, "index.html")
+
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+def static_files(request: Request, path: str):
+    """해시가 붙은 URL은 1년 immutable 캐시, 원래 이름은 ETag 재검증"""
+    return serve_asset(request, path)
+
+
+class AnalysisError(HTTPException):
+    """분석 파이프라인 실패 (reason: 활동 로그에 남길 사유)"""
+
+    def __init__(self, status_code: int, detail: str, reason: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
+        self.reason = reason
+
+
+def check_failed_video(url: str):
+    """최근 자막 추출에 실패한 영상이면 파이프라인을 돌리지 않고 바로 AnalysisError"""
+    record = FAILED_VIDEOS.check(extract_video_id(url))
+    if record:
+        raise AnalysisError(
+            422,
+            describe_failure(record),
+            f"자막 추출 실패(캐시): {record['reason']}",
+            headers={"Retry-After": str(record["retry_after"])},
+        )
+
+
+async def run_analysis(url: str, on_transcript=None) -> tuple[Dict[str, Any], Optional[float]]:
+    """
+    자막 추출 + AI 구조 분석 후 캐시에 저장. (결과, 영상 길이) 반환, 실패 시 AnalysisError
+    on_transcript: 자막이 준비되면 Gemini 호출 전에 호출되는 async 콜백 (스트리밍 응답용)
+    """
+    # 자막 추출은 블로킹 I/O라 스레드풀에서, Gemini 호출은 이벤트 루프에서 대기
+    failure: Dict[str, str] = {}
+    transcript = await run_blocking(get_transcript, url, failure)
+    if not transcript:
+        reason = failure.get("reason", "error")
+        FAILED_VIDEOS.record(extract_video_id(url), reason, failure.get("detail", ""))
+        raise AnalysisError(400, "Failed to fetch transcript.", f"자막 추출 실패: {reason}")
+    if on_transcript is not None:
+        await on_transcript(transcript)
+
+    text = transcript.get("text") if isinstance(transcript, dict) else transcript
+    duration = transcript.get("duration") if isinstance(transcript, dict) else None
+    result = await analyze_structure(text, duration_seconds=duration)
+
+    if not result:
+        raise AnalysisError(500, "Analysis failed.", "AI 분석 실패")
+    if isinstance(result, dict) and result.get("error"):
+        if result.get("retry_after"):
+            # AI 제공자 장애로 회로 차단기가 열린 상태: 즉시 실패 + 재시도 시점 안내
+            raise AnalysisError(
+                503,
+                "AI 분석 서버가 일시적으로 불안정합니다. 잠시 후 다시 시도해주세요.",
+                result["error"],
+                headers={"Retry-After": str(result["retry_after"])},
+            )
+        raise AnalysisError(500, f"Analysis failed: {result.get('error')}", result["error"])
+
+    STATE.cache_set(url, result)
+    FAILED_VIDEOS.clear(extract_video_id(url) or url)
+    SIMILAR.add(url, result)
+    ANALYTICS.add(url, result)
+    return result, duration
+
+
+async def run_blocking(func, *args):
+    """
+    스레드풀 실행. 작업이 취소돼도 스레드가 끝날 때까지 기다린 뒤 취소를 전달하므로,
+    작업 종료 = 스레드 종료 (분석 슬롯을 스레드가 실제로 끝난 뒤에 반납하기 위함)
+    """
+    future = asyncio.ensure_future(run_in_threadpool(func, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # 스레드는 Deadline 취소를 보고 다음 확인 지점에서 멈춤 (그때 나는 예외는 여기서 소비)
+        await asyncio.wait({future})
+        future.cancelled() or future.exception()
+        raise
+
+
+async def run_with_deadline(request: Request, request_deadline: Deadline, make_coro, on_finished=None):
+    """
+    마감 시간을 걸고 파이프라인 실행. 클라이언트가 끊거나 시간이 다 되면 작업을 취소하고
+    스레드에서 도는 단계도 다음 확인 지점에서 멈추게 함. 초과 시 단계 이름을 담은 504
+    on_finished: 응답과 상관없이 작업(스레드 단계 포함)이 실제로 끝나면 호출 (슬롯 반납용)
+    """
+    async def scoped():
+        with activate_deadline(request_deadline):
+            request_deadline.check("queue")
+            return await make_coro()
+
+    task = asyncio.ensure_future(scoped())
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=min(DISCONNECT_POLL_SECONDS, max(request_deadline.remaining(), 0.01)))
+            if done:
+                return task.result()
+            if request_deadline.remaining() <= 0:
+                # 블로킹 호출 중인 스레드를 기다리지 않고 바로 응답
+                raise DeadlineExceeded(request_deadline.stage, request_deadline.budget)
+            if await request.is_disconnected():
+                raise RequestCancelled(request_deadline.stage)
+    except DeadlineExceeded as e:
+        raise AnalysisError(
+            504,
+            f"분석 시간({e.budget:.0f}초)을 초과했습니다. 시간이 초과된 단계: {e.stage_label}",
+            f"시간 초과: {e.stage} ({request_deadline.elapsed():.0f}초)",
+        )
+    except RequestCancelled as e:
+        raise AnalysisError(499, "Client closed request", f"연결 종료로 취소: {e.stage}")
+    finally:
+        if not task.done():
+            request_deadline.cancel()
+            task.cancel()
+            # 스레드가 멈춘 뒤 남는 취소 예외는 여기서 소비
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        if on_finished is not None:
+            task.add_done_callback(lambda t: on_finished())
+
+
+def check_analyze_limit(client_ip: str):
+    """일일 분석 한도 초과 시 429"""
     allowed, remaining = check_daily_limit(client_ip, "analyze")
 
     if not allowed:
@@ -203,31 +496,56 @@ def api_analyze(payload: AnalyzeRequest, request: Request):
             detail=f"일일 분석 한도를 초과했습니다. {hours}시간 {minutes}분 후에 다시 시도해주세요. 무제한 사용 문의: https://litt.ly/reels_code_official/sale/XdbLaGW"
         )
 
-    if payload.url in ANALYSIS_CACHE:
-        log_activity("분석(캐시)", client_ip, payload.url)
-        return JSONResponse(ANALYSIS_CACHE[payload.url])
 
-    log_activity("분석 시작", client_ip, payload.url)
+def prepare_analysis(payload: AnalyzeRequest, request: Request) -> tuple[str, Optional[Dict[str, Any]]]:
+    """요청 검증 + 일일 한도 + 캐시 + 실패 영상 확인. (클라이언트 IP, 캐시된 결과) 반환"""
+    if not payload.url:
+        raise HTTPException(status_code=400, detail="URL is required")
 
-    transcript = get_transcript(payload.url)
-    if not transcript:
-        log_activity("분석 실패", client_ip, f"{payload.url} - 자막 추출 실패")
-        raise HTTPException(status_code=400, detail="Failed to fetch transcript.")
+    # IP별 일일 사용 제한 체크 (분석)
+    client_ip = get_client_ip(request)
+    check_analyze_limit(client_ip)
 
-    text = transcript.get("text") if isinstance(transcript, dict) else transcript
-    duration = transcript.get("duration") if isinstance(transcript, dict) else None
-    result = analyze_structure(text, duration_seconds=duration)
-    if not result:
-        log_activity("분석 실패", client_ip, f"{payload.url} - AI 분석 실패")
-        raise HTTPException(status_code=500, detail="Analysis failed.")
-    if isinstance(result, dict) and result.get("error"):
-        log_activity("분석 실패", client_ip, f"{payload.url} - {result.get('error')}")
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {result.get('error')}")
+    # 분석 캐시: 동일 URL은 같은 분석 결과를 반환
+    cached = STATE.cache_get(payload.url)
+    if cached is not None:
+        log_activity("분석(캐시)", client_ip, payload.url)
+        return client_ip, cached
 
-    ANALYSIS_CACHE[payload.url] = result
+    # 최근 자막 추출에 실패한 영상은 대기열에 넣지 않고 바로 사유 안내 (사용 횟수 차감 없음)
+    try:
+        check_failed_video(payload.url)
+    except AnalysisError as e:
+        log_activity("분석 거절", client_ip, f"{payload.url} - {e.reason}")
+        raise
+    return client_ip, None
+
+
+async def analyze_for_client(url: str, client_ip: str, request: Request, on_transcript=None,
+                             count_usage: bool = True, pool: str = "analyze") -> Dict[str, Any]:
+    """
+    대기열 + 마감 시간 안에서 분석 실행, 성공 시 사용 기록 (일반/스트리밍/비교 분석 공용)
+    count_usage=False: 호출한 쪽이 사용 기록을 직접 남김 (비교 분석은 여러 영상을 1회로 차감)
+    pool="compare": 비교 분석 전용 풀. 대기 시간은 빼고 슬롯을 받은 뒤부터 예산 적용
+    """
+    # 일반 분석은 대기열에 들어가는 시점부터, 비교 분석은 슬롯을 받은 시점부터 전체 예산 적용
+    queued_deadline = Deadline(ANALYZE_DEADLINE_SECONDS)
+    admitted_at = await acquire_admission(pool, client_ip)
+    request_deadline = Deadline(ANALYZE_DEADLINE_SECONDS) if pool == "compare" else queued_deadline
+    log_activity("분석 시작", client_ip, url)
+    try:
+        # 504/연결 종료로 먼저 응답해도 스레드 단계가 멈출 때까지 슬롯을 잡고 있다가 반납
+        result, duration = await run_with_deadline(
+            request, request_deadline, lambda: run_analysis(url, on_transcript=on_transcript),
+            on_finished=lambda: ADMISSION.release(pool, admitted_at),
+        )
+    except AnalysisError as e:
+        log_activity("분석 실패", client_ip, f"{url} - {e.reason}")
+        raise
 
     # 분석 성공 시 사용 기록
-    record_usage(client_ip, "analyze")
+    if count_usage:
+        record_usage(client_ip, "analyze")
 
     # 영상 길이 포맷팅
     duration_str = ""
@@ -236,16 +554,198 @@ def api_analyze(payload: AnalyzeRequest, request: Request):
         secs = int(duration) % 60
         duration_str = f" ({mins}분 {secs}초)"
 
-    log_activity("분석 완료", client_ip, f"{payload.url}{duration_str}")
+    log_activity("분석 완료", client_ip, f"{url}{duration_str}")
+    return result
+
+
+@app.post("/api/analyze")
+async def api_analyze(payload: AnalyzeRequest, request: Request):
+    client_ip, cached = prepare_analysis(payload, request)
+    if cached is not None:
+        return JSONResponse(cached)
+    return JSONResponse(await analyze_for_client(payload.url, client_ip, request))
 
-    return JSONResponse(result)
+
+def _ndjson(event: Dict[str, Any]) -> bytes:
+    return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+@app.post("/api/analyze/stream")
+async def api_analyze_stream(payload: AnalyzeRequest, request: Request):
+    """
+    NDJSON 스트리밍 분석: 자막이 준비되는 즉시 {"type": "prescore"} (로컬 휴리스틱 예비 점수),
+    Gemini 분석이 끝나면 {"type": "result"}, 실패 시 {"type": "error", "status", "detail"}
+    """
+    # 검증/한도/캐시/실패 영상은 스트림 시작 전에 일반 HTTP 오류로 응답
+    client_ip, cached = prepare_analysis(payload, request)
+
+    async def events():
+        if cached is not None:
+            yield _ndjson({"type": "result", "analysis": cached})
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def on_transcript(transcript):
+            try:
+                await queue.put({"type": "prescore", **prescore(transcript)})
+            except Exception as e:
+                # 예비 점수는 부가 정보라 실패해도 본 분석은 계속
+                print(f"prescore failed: {e}")
+
+        task = asyncio.ensure_future(analyze_for_client(payload.url, client_ip, request, on_transcript=on_transcript))
+        try:
+            while not task.done() or not queue.empty():
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield _ndjson(getter.result())
+                else:
+                    getter.cancel()
+            try:
+                yield _ndjson({"type": "result", "analysis": task.result()})
+            except HTTPException as e:
+                yield _ndjson({"type": "error", "status": e.status_code, "detail": e.detail})
+        finally:
+            # 클라이언트가 스트림 도중 끊으면 분석도 취소 (run_with_deadline 이 스레드 단계까지 정리)
+            if not task.done():
+                task.cancel()
+
+    # GZipMiddleware 는 스트리밍 본문을 압축 버퍼에 모아두므로 이 응답은 압축하지 않음
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Content-Encoding": "identity", "Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/triage")
+async def api_triage(payload: TriageRequest, request: Request, pw: str = ""):
+    """
+    여러 영상의 예비 점수 일괄 계산 (관리자). 자막만 사용하고 Whisper/Gemini 는 호출하지 않음.
+    이미 분석된 영상은 캐시된 viral_score 도 함께 반환
+    """
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+    urls = list(dict.fromkeys(url.strip() for url in payload.urls if url.strip()))[:TRIAGE_MAX_URLS]
+    semaphore = asyncio.Semaphore(TRIAGE_CONCURRENCY)
+
+    async def triage(url: str) -> Dict[str, Any]:
+        async with semaphore:
+            failure: Dict[str, str] = {}
+            transcript = await run_in_threadpool(get_transcript, url, failure, False)
+        cached = STATE.cache_get(url)
+        item = {"url": url, "viral_score": cached.get("viral_score") if isinstance(cached, dict) else None}
+        if not transcript:
+            return {**item, "error": failure.get("reason", "error")}
+        return {**item, **prescore(transcript)}
+
+    results = await asyncio.gather(*(triage(url) for url in urls))
+    results.sort(key=lambda item: item.get("preliminary_score", -1), reverse=True)
+    return {"count": len(results), "results": results}
+
+
+@app.post("/api/compare")
+async def api_compare(payload: CompareRequest, request: Request):
+    """
+    여러 영상 비교 분석. 캐시된 영상은 바로 쓰고 나머지는 요청당 COMPARE_CONCURRENCY 개씩 동시에
+    분석 ("compare" 풀에서, 영상마다 슬롯을 받은 뒤부터 ANALYZE_DEADLINE_SECONDS 예산).
+    새로 분석한 영상이 있으면 일일 한도 1회 차감. 일부 영상이 실패해도 나머지로 비교 결과를
+    만들고, 실패한 영상은 videos[i].error 로 안내
+    """
+    urls = list(dict.fromkeys(url.strip() for url in payload.urls if url.strip()))
+    if len(urls) < 2:
+        raise HTTPException(status_code=400, detail="비교하려면 서로 다른 영상 URL이 2개 이상 필요합니다.")
+    if len(urls) > COMPARE_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"한 번에 최대 {COMPARE_MAX_URLS}개 영상까지 비교할 수 있습니다.")
+
+    client_ip = get_client_ip(request)
+    analyses: Dict[str, Dict[str, Any]] = {}
+    for url in urls:
+        cached = STATE.cache_get(url)
+        if cached is not None:
+            analyses[url] = cached
+    pending = [url for url in urls if url not in analyses]
+    if pending:
+        check_analyze_limit(client_ip)
+    log_activity("비교 분석 시작", client_ip, f"{len(urls)}개 영상 (캐시 {len(analyses)}개)")
+
+    semaphore = asyncio.Semaphore(COMPARE_CONCURRENCY)
+    errors: Dict[str, Dict[str, Any]] = {}
+
+    async def analyze(url: str):
+        async with semaphore:
+            try:
+                check_failed_video(url)
+                analyses[url] = await analyze_for_client(url, client_ip, request, count_usage=False, pool="compare")
+            except HTTPException as e:
+                errors[url] = {"status": e.status_code, "detail": e.detail}
+
+    await asyncio.gather(*(analyze(url) for url in pending))
+
+    analyzed = len(pending) - len(errors)
+    if analyzed:
+        record_usage(client_ip, "analyze")
+    log_activity("비교 분석 완료", client_ip, f"{len(urls)}개 영상 (새로 분석 {analyzed}개, 실패 {len(errors)}개)")
+
+    # 모든 행은 요청한 URL 순서, 실패한 영상 칸은 None
+    comparison = compare_analyses([analyses.get(url) for url in urls])
+    comparison["videos"] = [
+        dict(video, url=url, source="analyzed" if url in pending else "cached") if video
+        else {"url": url, "error": errors.get(url, {"status": 500, "detail": "Analysis failed."})}
+        for url, video in zip(urls, comparison["videos"])
+    ]
+    return comparison
+
+
+@app.get("/api/similar")
+def api_similar(url: str, k: int = 5):
+    """구조가 비슷한 분석 영상 top-k (점수 구성, 구간 비중, 키워드 기준)"""
+    # 다른 워커가 분석해 캐시에만 있는 항목은 조회 시점에 색인에 추가
+    if STATE.cache_count() != SIMILAR.source_count:
+        SIMILAR.sync(STATE.cache_items())
+    if url not in SIMILAR:
+        raise HTTPException(status_code=404, detail="분석된 영상만 비교할 수 있습니다. 먼저 분석해주세요.")
+    return {"url": url, "similar": SIMILAR.search(url, k=max(1, min(k, 50)))}
+
+
+def refresh_analytics():
+    """인기 영상 목록이 바뀌었거나 다른 워커가 캐시에 쓴 분석이 있으면 일괄 재계산"""
+    global _analytics_popular_mtime
+    try:
+        mtime = POPULAR_VIDEOS_FILE.stat().st_mtime
+    except OSError:
+        mtime = None
+    categories_changed = False
+    if mtime != _analytics_popular_mtime:
+        _analytics_popular_mtime = mtime
+        categories_changed = ANALYTICS.set_categories(popular_category_urls())
+    if categories_changed or STATE.cache_count() != ANALYTICS.source_count:
+        ANALYTICS.rebuild(STATE.cache_items())
+
+
+@app.get("/api/analytics")
+def api_analytics(category: str = ""):
+    """카테고리별 바이럴 점수 분포, 평균 훅 길이, 구간 비중 (category 생략 시 전체)"""
+    refresh_analytics()
+    snapshot = ANALYTICS.snapshot()
+    if not category:
+        return snapshot
+    if category == "all":
+        return {"category": category, **snapshot["all"]}
+    if category not in snapshot["categories"]:
+        raise HTTPException(status_code=404, detail="해당 카테고리의 분석 데이터가 없습니다.")
+    return {"category": category, **snapshot["categories"][category]}
 
 
 @app.post("/api/generate")
-def api_generate(payload: GenerateRequest, request: Request):
+async def api_generate(payload: GenerateRequest, request: Request):
     if not payload.topic:
         raise HTTPException(status_code=400, detail="Topic is required")
-    if not payload.analysis:
+
+    # 카테고리+템플릿 요청은 미리 계산된 구조를 사용 (자막 추출/분석 없이 바로 생성)
+    structure = TEMPLATES.get(payload.category, payload.template) or payload.analysis
+    if not structure:
         raise HTTPException(status_code=400, detail="Analysis result is required")
 
     # IP별 일일 사용 제한 체크 (스크립트)
@@ -260,15 +760,16 @@ def api_generate(payload: GenerateRequest, request: Request):
             detail=f"일일 스크립트 생성 한도를 초과했습니다. {hours}시간 {minutes}분 후에 다시 시도해주세요. 무제한 사용 문의: https://litt.ly/reels_code_official/sale/XdbLaGW"
         )
 
-    script = generate_script(
-        payload.analysis,
-        payload.topic,
-        payload.tone,
-        payload.style,
-        payload.audience,
-        payload.category,
-        payload.template,
-    )
+    async with admission_slot("generate", client_ip):
+        script = await generate_script(
+            structure,
+            payload.topic,
+            payload.tone,
+            payload.style,
+            payload.audience,
+            payload.category,
+            payload.template,
+        )
     if not script:
         raise HTTPException(status_code=500, detail="Failed to generate script.")
 
@@ -281,31 +782,74 @@ def api_generate(payload: GenerateRequest, request: Request):
     else:
         log_activity("스크립트", client_ip, f"{payload.topic} ({payload.tone}/{payload.style})")
 
-    return {"script": script}
+    return {"script": script, "analysis": structure}
 
 
 def get_active_user_count() -> int:
     """활성 사용자 수 계산 (타임아웃된 사용자 제거)"""
-    current_time = time.time()
-    expired = [sid for sid, last_time in ACTIVE_USERS.items()
-               if current_time - last_time > HEARTBEAT_TIMEOUT]
-    for sid in expired:
-        del ACTIVE_USERS[sid]
-    return len(ACTIVE_USERS)
+    return STATE.count_active_sessions(HEARTBEAT_TIMEOUT)
 
 
-class HeartbeatRequest(BaseModel):
-    session_id: str
+@app.websocket("/ws/presence")
+async def ws_presence(websocket: WebSocket, sid: str = ""):
+    """접속 유지 채널: 연결이 열려 있는 동안 접속 중으로 집계 (메시지 주고받을 필요 없음)"""
+    if not sid or len(sid) > 64:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    PRESENCE.connect(sid)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        PRESENCE.disconnect(sid)
+
+
+@app.post("/api/presence")
+async def api_presence(sid: str = "", leave: int = 0):
+    """WebSocket을 못 쓰는 클라이언트용 heartbeat (본문 파싱/스레드풀 없이 쿼리만 사용)"""
+    if not sid or len(sid) > 64:
+        return Response(status_code=400)
+    if leave:
+        PRESENCE.leave(sid)
+    else:
+        PRESENCE.touch(sid)
+    return Response(status_code=204)
 
 
 @app.post("/api/heartbeat")
-def api_heartbeat(payload: HeartbeatRequest):
-    """클라이언트 heartbeat 수신"""
-    ACTIVE_USERS[payload.session_id] = time.time()
-    # 누적 방문자 추가 (_leave 제외)
-    if not payload.session_id.endswith('_leave'):
-        TOTAL_VISITORS.add(payload.session_id)
-    return {"status": "ok", "active_users": get_active_user_count()}
+async def api_heartbeat(request: Request):
+    """이전 버전 클라이언트 호환용 heartbeat ({"session_id": ...}, 떠날 때 _leave 접미사)"""
+    try:
+        session_id = json.loads(await request.body() or b"{}").get("session_id")
+    except (ValueError, AttributeError):
+        session_id = None
+    if not isinstance(session_id, str) or not session_id:
+        raise HTTPException(status_code=422, detail="session_id is required")
+    if session_id.endswith("_leave"):
+        PRESENCE.leave(session_id[:-len("_leave")])
+    else:
+        PRESENCE.touch(session_id)
+    return {"status": "ok", "active_users": PRESENCE.active_users}
+
+
+@app.get("/api/ready")
+def api_ready():
+    """준비 상태 확인 (워밍업 사용 시 Whisper 로드 완료 전까지 503)"""
+    transcriber = get_whisper_status()
+    ready = not WHISPER_WARMUP or transcriber["status"] == "warm"
+    return JSONResponse(
+        {"ready": ready, "warmup_enabled": WHISPER_WARMUP, "transcriber": transcriber},
+        status_code=200 if ready else 503,
+    )
+
+
+@app.get("/api/startup")
+def api_startup():
+    """시작 시간 리포트 (import 구간별 시간, 리스닝까지 걸린 시간, 예산 초과 여부)"""
+    return dict(startup.report(), assets=ASSETS.stats())
 
 
 @app.get("/api/stats")
@@ -313,9 +857,12 @@ def api_stats():
     """실시간 접속자 통계"""
     current_time = time.time()
     
+    usage_analyze = STATE.all_usage("analyze")
+    usage_generate = STATE.all_usage("generate")
+
     # 분석 사용 현황
     analyze_status = {}
-    for ip, last_time in IP_USAGE_ANALYZE.items():
+    for ip, last_time in usage_analyze.items():
         elapsed = current_time - last_time
         remaining = max(0, int(DAILY_LIMIT_SECONDS - elapsed))
         hours = remaining // 3600
@@ -324,7 +871,7 @@ def api_stats():
     
     # 스크립트 사용 현황
     generate_status = {}
-    for ip, last_time in IP_USAGE_GENERATE.items():
+    for ip, last_time in usage_generate.items():
         elapsed = current_time - last_time
         remaining = max(0, int(DAILY_LIMIT_SECONDS - elapsed))
         hours = remaining // 3600
@@ -333,14 +880,26 @@ def api_stats():
 
     return {
         "active_users": get_active_user_count(),
-        "total_visitors": len(TOTAL_VISITORS),
-        "cached_analyses": len(ANALYSIS_CACHE),
-        "blocked_analyze": len(IP_USAGE_ANALYZE),
-        "blocked_generate": len(IP_USAGE_GENERATE),
+        "total_visitors": STATE.count_visitors(),
+        "cached_analyses": STATE.cache_count(),
+        "gemini": get_gemini_health(),
+        "admission": ADMISSION.metrics(),
+        "warmup": WARMER.status(),
+        "popular_refresh": dict(POPULAR_REFRESHER.status(), enabled=POPULAR_REFRESH),
+        "video_history": VIDEO_HISTORY.status(),
+        "presence": PRESENCE.status(),
+        "transcript_routes": get_transcript_stats(),
+        "metadata_cache": video_metadata.stats(),
+        "transcription": TRANSCRIPTION_POLICY.stats(),
+        "failed_videos": FAILED_VIDEOS.status(),
+        "templates": TEMPLATES.status(),
+        "blocked_analyze": len(usage_analyze),
+        "blocked_generate": len(usage_generate),
         "analyze_status": analyze_status,
         "generate_status": generate_status,
-        "whitelist_ips": list(WHITELIST_IPS),
-        "activity_log": ACTIVITY_LOG[-20:][::-1]  # 최근 20개, 역순
+        "whitelist_ips": STATE.list_whitelist(),
+        "activity_log": STATE.recent_activity(20),  # 최근 20개, 역순
+        "state_backend": STATE.name,
     }
 
 
@@ -354,17 +913,44 @@ def api_activate_admin(payload: AdminKeyRequest, request: Request):
     client_ip = get_client_ip(request)
 
     if payload.key == ADMIN_PASSWORD:
-        WHITELIST_IPS.add(client_ip)
+        STATE.add_whitelist(client_ip)
         return {"success": True, "message": "무제한 사용이 활성화되었습니다.", "ip": client_ip}
     else:
         raise HTTPException(status_code=403, detail="잘못된 키입니다.")
 
 
+def is_admin_request(request: Request, pw: str = "") -> bool:
+    """관리자 비밀번호 또는 관리자/화이트리스트 IP로 접근한 요청인지"""
+    return pw == ADMIN_PASSWORD or is_privileged(get_client_ip(request))
+
+
+@app.get("/api/activity")
+def api_activity(request: Request, pw: str = "", ip: str = "", action: str = "",
+                 since: str = "", until: str = "", cursor: Optional[int] = None, limit: int = 50):
+    """활동 로그 조회 (관리자 전용). 최신순 커서 페이지네이션 + IP/액션/기간 필터"""
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 조회할 수 있습니다.")
+    try:
+        since_ts, until_ts = parse_time(since), parse_time(until, end_of_day=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since/until 형식: epoch 초 또는 YYYY-MM-DD[ HH:MM:SS] (until 에 날짜만 주면 그날 끝까지 포함)")
+
+    items, next_cursor = STATE.query_activity(
+        ip=ip.strip() or None,
+        action=action.strip() or None,
+        since=since_ts,
+        until=until_ts,
+        cursor=cursor,
+        limit=max(1, min(limit, 200)),
+    )
+    return {"items": items, "next_cursor": next_cursor}
+
+
 @app.get("/api/check-admin")
 def api_check_admin(request: Request):
     """현재 IP가 관리자/화이트리스트인지 확인"""
     client_ip = get_client_ip(request)
-    is_admin = client_ip in ADMIN_IPS or client_ip in WHITELIST_IPS
+    is_admin = is_privileged(client_ip)
     return {"is_admin": is_admin, "ip": client_ip}
 
 
@@ -373,13 +959,9 @@ def add_whitelist(ip: str):
     """화이트리스트에 IP 추가"""
     if not ip:
         return {"success": False, "error": "IP 필요"}
-    WHITELIST_IPS.add(ip.strip())
+    STATE.add_whitelist(ip.strip())
     # 해당 IP의 사용 기록 삭제 (즉시 사용 가능하도록)
-    if ip.strip() in IP_USAGE_ANALYZE:
-        del IP_USAGE_ANALYZE[ip.strip()]
-    if ip.strip() in IP_USAGE_GENERATE:
-        del IP_USAGE_GENERATE[ip.strip()]
-    save_data()
+    STATE.clear_usage(ip.strip())
     return {"success": True, "ip": ip.strip()}
 
 
@@ -388,34 +970,187 @@ def remove_whitelist(ip: str):
     """화이트리스트에서 IP 제거"""
     if not ip:
         return {"success": False, "error": "IP 필요"}
-    WHITELIST_IPS.discard(ip.strip())
-    save_data()
+    STATE.remove_whitelist(ip.strip())
     return {"success": True, "ip": ip.strip()}
 
 
+def load_popular_videos() -> Dict[str, Any]:
+    """인기 영상 데이터 (메모리 사본, 파일이 바뀌면 자동으로 다시 읽음. 없거나 깨졌으면 빈 dict)"""
+    # JSON 구조: {"updated_at": "...", "categories": {"health": [...], ...}, "category_updated_at": {...}}
+    return POPULAR.get()
+
+
+def popular_category_urls() -> Dict[str, list]:
+    """카테고리별 인기 영상 URL"""
+    return POPULAR.category_urls()
+
+
+def popular_video_urls() -> list:
+    """모든 카테고리의 인기 영상 URL"""
+    return [url for urls in popular_category_urls().values() for url in urls]
+
+
 @app.get("/api/popular-videos")
 def api_popular_videos(category: str = ""):
     """카테고리별 인기 영상 목록 반환"""
-    popular_videos_file = DATA_DIR / "popular_videos.json"
-
-    # 파일이 없으면 빈 배열 반환
-    if not popular_videos_file.exists():
+    # 카테고리가 지정된 경우 해당 카테고리 영상만 반환
+    if not category:
         return {"videos": []}
+    return {"videos": load_popular_videos().get("categories", {}).get(category, [])}
+
 
+@app.get("/api/popular-videos/trending")
+def api_popular_videos_trending(category: str = "", hours: float = 48, limit: int = 20):
+    """최근 hours 시간 동안 조회수가 가장 빠르게 늘어난 영상 (수집 기록 2회 이상인 영상만)"""
+    hours = min(max(hours, 1.0), VIDEO_HISTORY.retention_days * 24.0)
+    ranked = VIDEO_HISTORY.rank(hours, category, max(1, min(limit, 100)))
+    # 현재 인기 목록에 있는 영상은 제목/채널 등 표시 정보 합치기
+    listed = {video.get("id"): video for videos in load_popular_videos().get("categories", {}).values() for video in videos}
+    return {"hours": hours, "videos": [dict(listed.get(item["id"], {}), **item) for item in ranked]}
+
+
+@app.post("/admin/popular-videos/refresh")
+async def admin_refresh_popular_videos(request: Request, pw: str = "", category: str = "", dry_run: bool = False):
+    """
+    인기 영상 즉시 갱신 (category 생략 시 주기가 지난 카테고리만, "all" 이면 전체).
+    남은 할당량 안에서 우선순위 × 오래된 정도 순으로 수집. dry_run=1 이면 계획만 반환.
+    이미 갱신 중(스케줄러 포함)이면 409
+    """
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+    if category == "all":
+        categories = list(POPULAR_REFRESHER.intervals)
+    elif category:
+        if category not in POPULAR_REFRESHER.intervals:
+            raise HTTPException(status_code=404, detail=f"알 수 없는 카테고리: {category}")
+        categories = [category]
+    else:
+        categories = POPULAR_REFRESHER.due_categories()
+    if dry_run:
+        return {"plan": POPULAR_REFRESHER.plan(categories), "quota": YOUTUBE_QUOTA.status()}
+    if POPULAR_REFRESHER.busy:
+        raise HTTPException(status_code=409, detail="이미 인기 영상을 갱신하는 중입니다. 잠시 후 다시 시도해주세요.")
+    refreshed = await POPULAR_REFRESHER.refresh(categories)
+    return {"requested": categories, "refreshed": refreshed, "status": POPULAR_REFRESHER.status()}
+
+
+@app.post("/admin/templates/rebuild")
+async def admin_rebuild_templates(request: Request, pw: str = ""):
+    """카테고리 구조 템플릿 재계산 (메모리 캐시 사용 시 build_templates.py --server 에서 호출)"""
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+
+    def rebuild():
+        library = build_library(popular_category_urls(), STATE.cache_items())
+        save_library(library, TEMPLATES.path)
+        TEMPLATES.replace(library)
+
+    await run_in_threadpool(rebuild)
+    return TEMPLATES.status()
+
+
+@app.post("/admin/failed-videos/clear")
+def admin_clear_failed_video(request: Request, url: str, pw: str = ""):
+    """실패 기록 삭제 (해당 영상을 바로 다시 분석할 수 있도록)"""
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+    video_id = extract_video_id(url) or url
+    FAILED_VIDEOS.clear(video_id)
+    return {"success": True, "video_id": video_id}
+
+
+@app.post("/admin/profile/cpu/start")
+def admin_profile_cpu_start(request: Request, pw: str = "", requests: int = 10, seconds: float = 60,
+                            path: str = "/api/", interval_ms: float = 5):
+    """다음 N개 요청(또는 seconds 동안) CPU 샘플링 시작, 결과는 /admin/profile/cpu.folded"""
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
     try:
-        with open(popular_videos_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        # 카테고리가 지정된 경우 해당 카테고리 영상만 반환
-        # JSON 구조: {"updated_at": "...", "categories": {"health": [...], ...}}
-        if category:
-            videos = data.get("categories", {}).get(category, [])
-        else:
-            videos = []
-
-        return {"videos": videos}
-    except (json.JSONDecodeError, IOError):
-        return {"videos": []}
+        return CPU_PROFILER.start(
+            requests=max(1, requests),
+            seconds=min(max(seconds, 1), 3600),
+            path_prefix=path,
+            interval_ms=min(max(interval_ms, 1), 1000),
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.post("/admin/profile/cpu/stop")
+def admin_profile_cpu_stop(request: Request, pw: str = ""):
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+    return CPU_PROFILER.stop()
+
+
+@app.get("/admin/profile/cpu")
+def admin_profile_cpu(request: Request, pw: str = ""):
+    """CPU 프로파일링 상태 + 샘플이 많은 함수"""
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+    return {**CPU_PROFILER.status(), "top_functions": CPU_PROFILER.top_functions()}
+
+
+@app.get("/admin/profile/cpu.folded")
+def admin_profile_cpu_folded(request: Request, pw: str = ""):
+    """flamegraph.pl / speedscope 에 바로 넣을 수 있는 folded stack 파일"""
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+    return PlainTextResponse(
+        CPU_PROFILER.folded(),
+        headers={"Content-Disposition": f'attachment; filename="cpu-{int(time.time())}.folded"'},
+    )
+
+
+@app.post("/admin/profile/memory/snapshot")
+def admin_profile_memory_snapshot(request: Request, pw: str = "", reset: bool = False):
+    """tracemalloc 스냅샷 (첫 스냅샷 또는 reset=true 가 기준점)"""
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+    return MEMORY_PROFILER.snapshot(reset_baseline=reset)
+
+
+@app.get("/admin/profile/memory")
+def admin_profile_memory(request: Request, pw: str = "", limit: int = 30):
+    """기준 스냅샷 대비 증가량 (소스 줄별) + 프로젝트 파일별 현재 크기 + 오래 사는 구조별 항목 수/크기"""
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+    try:
+        return MEMORY_PROFILER.report(limit=max(1, min(limit, 500)))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/admin/profile/memory.folded")
+def admin_profile_memory_folded(request: Request, pw: str = "", growth: bool = True):
+    """바이트 단위 folded stack (growth=false 면 현재 추적 중인 전체 메모리)"""
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+    try:
+        content = MEMORY_PROFILER.folded(growth=growth)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        content,
+        headers={"Content-Disposition": f'attachment; filename="memory-{int(time.time())}.folded"'},
+    )
+
+
+@app.post("/admin/profile/memory/stop")
+def admin_profile_memory_stop(request: Request, pw: str = ""):
+    """tracemalloc 종료 (추적 중에는 할당마다 비용이 있음)"""
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+    return MEMORY_PROFILER.stop()
+
+
+@app.post("/admin/warm-cache")
+async def admin_warm_cache(request: Request, pw: str = ""):
+    """인기 영상 미리 분석 요청 (update_videos.py --warm 에서 호출)"""
+    if not is_admin_request(request, pw):
+        raise HTTPException(status_code=403, detail="관리자만 요청할 수 있습니다.")
+    queued = WARMER.enqueue(popular_video_urls())
+    return {"queued": queued, "status": WARMER.status()}
 
 
 @app.get("/admin")
@@ -580,6 +1315,27 @@ def admin_page(pw: str = ""):
             <div class="section-title">최근 활동 로그</div>
             <div id="activityLog"><div class="log-entry">로딩...</div></div>
         </div>
+
+        <div class="section">
+            <div class="section-title">활동 로그 검색</div>
+            <div style="display:flex; gap:8px; flex-wrap:wrap; margin-bottom:8px;">
+                <input type="text" id="searchIp" placeholder="IP">
+                <select id="searchAction" style="padding:6px 10px; border-radius:4px; border:none; font-size:0.8rem;">
+                    <option value="">전체 액션</option>
+                    <option>분석 시작</option>
+                    <option>분석 완료</option>
+                    <option>분석 실패</option>
+                    <option>분석(캐시)</option>
+                    <option>스크립트</option>
+                    <option>스크립트(템플릿)</option>
+                </select>
+                <input type="date" id="searchSince">
+                <input type="date" id="searchUntil">
+                <button onclick="searchActivity(true)">검색</button>
+            </div>
+            <div id="activitySearch"><div class="log-entry">검색 조건을 입력하세요</div></div>
+            <button id="activityMore" onclick="searchActivity(false)" style="display:none; margin-top:8px;">더 보기</button>
+        </div>
     </div>
 
     <script>
@@ -619,21 +1375,49 @@ def admin_page(pw: str = ""):
                 const actDiv = document.getElementById('activityLog');
                 const actList = data.activity_log || [];
                 actDiv.innerHTML = actList.length > 0
-                    ? actList.map(a => {
-                        let actionClass = 'act-script';
-                        if (a.action === '분석 시작') actionClass = 'act-start';
-                        else if (a.action === '분석 완료') actionClass = 'act-success';
-                        else if (a.action === '분석 실패') actionClass = 'act-fail';
-                        else if (a.action === '분석(캐시)') actionClass = 'act-cache';
-                        else if (a.action === '분석') actionClass = 'act-analyze';
-                        return `<div class="activity-item"><span class="activity-time">${a.time}</span><span class="activity-action ${actionClass}">${a.action}</span><span class="activity-ip">${a.ip}</span><span class="activity-details">${a.details}</span></div>`;
-                    }).join('')
+                    ? actList.map(renderActivity).join('')
                     : '<div class="log-entry">활동 없음</div>';
             } catch (e) {
                 console.error(e);
             }
         }
 
+        function renderActivity(a) {
+            let actionClass = 'act-script';
+            if (a.action === '분석 시작') actionClass = 'act-start';
+            else if (a.action === '분석 완료') actionClass = 'act-success';
+            else if (a.action === '분석 실패') actionClass = 'act-fail';
+            else if (a.action === '분석(캐시)') actionClass = 'act-cache';
+            else if (a.action === '분석') actionClass = 'act-analyze';
+            return `<div class="activity-item"><span class="activity-time">${a.time}</span><span class="activity-action ${actionClass}">${a.action}</span><span class="activity-ip">${a.ip}</span><span class="activity-details">${a.details}</span></div>`;
+        }
+
+        // 활동 로그 검색 (커서 기반 더 보기)
+        let activityCursor = null;
+        async function searchActivity(reset) {
+            const params = new URLSearchParams({ limit: 50 });
+            const pw = new URLSearchParams(location.search).get('pw');
+            if (pw) params.set('pw', pw);
+            const ip = document.getElementById('searchIp').value.trim();
+            const action = document.getElementById('searchAction').value;
+            const since = document.getElementById('searchSince').value;
+            const until = document.getElementById('searchUntil').value;
+            if (ip) params.set('ip', ip);
+            if (action) params.set('action', action);
+            if (since) params.set('since', since);
+            if (until) params.set('until', until);
+            if (!reset && activityCursor) params.set('cursor', activityCursor);
+
+            const res = await fetch('/api/activity?' + params.toString());
+            const data = await res.json();
+            const div = document.getElementById('activitySearch');
+            const html = (data.items || []).map(renderActivity).join('');
+            if (reset) div.innerHTML = html || '<div class="log-entry">결과 없음</div>';
+            else div.insertAdjacentHTML('beforeend', html);
+            activityCursor = data.next_cursor;
+            document.getElementById('activityMore').style.display = activityCursor ? 'inline-block' : 'none';
+        }
+
         async function addWhitelist() {
             const ip = document.getElementById('whitelistIp').value.trim();
             if (!ip) return alert('IP를 입력하세요');
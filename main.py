@@ -1,4 +1,8 @@
 import multiprocessing
+import time
+
+from services import startup
+
 import uvicorn
 import webbrowser
 import threading
@@ -6,7 +10,9 @@ import socket
 
 import sys
 import os
-from application import app, CONFIG_DIR
+
+with startup.timed("import:application"):
+    from application import app, CONFIG_DIR, STATE
 
 if __name__ == "__main__":
     multiprocessing.freeze_support()
@@ -93,10 +99,36 @@ if __name__ == "__main__":
     preferred_port = int(os.getenv("PORT", "8000"))
     port = find_available_port(preferred_port)
 
-    def _open_browser():
-        webbrowser.open(f"http://localhost:{port}")
+    # 여러 워커 프로세스로 실행 (WORKERS>1). 프로세스 간 상태 공유가 필요하므로
+    # 메모리 저장소 대신 SQLite 저장소를 사용 (워커는 이 환경변수를 물려받음)
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1 and STATE.name == "memory":
+        print("WORKERS > 1 with in-process state; switching workers to STATE_BACKEND=sqlite")
+        os.environ["STATE_BACKEND"] = "sqlite"
+
+    if workers > 1:
+        threading.Timer(1.5, lambda: webbrowser.open(f"http://localhost:{port}")).start()
+        uvicorn.run(
+            "application:app",
+            host="0.0.0.0",
+            port=port,
+            workers=workers,
+            log_config=log_config,
+            use_colors=False,
+        )
+    else:
+        # Run with custom log config and no colors
+        server = uvicorn.Server(uvicorn.Config(
+            app, host="0.0.0.0", port=port, reload=False, log_config=log_config, use_colors=False
+        ))
 
-    threading.Timer(1.5, _open_browser).start()
+        def _on_listening():
+            # 고정 1.5초 대기 대신 소켓이 열리는 즉시 브라우저 열기 + 리스닝 시간 기록
+            while not server.started and not server.should_exit:
+                time.sleep(0.05)
+            if server.started:
+                startup.mark_listening()
+                webbrowser.open(f"http://localhost:{port}")
 
-    # Run with custom log config and no colors
-    uvicorn.run(app, host="0.0.0.0", port=port, reload=False, log_config=log_config, use_colors=False)
+        threading.Thread(target=_on_listening, name="startup-watch", daemon=True).start()
+        server.run()
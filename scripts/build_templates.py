@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+카테고리별 구조 템플릿 사전 계산 스크립트
+
+data/popular_videos.json 의 카테고리별 인기 영상 중 이미 분석된 영상(분석 캐시)을
+카테고리 단위로 집계해 data/structure_templates.json 에 저장합니다.
+서버는 시작 시 이 파일을 읽어 카테고리+템플릿 스크립트 생성에 사용합니다.
+
+분석 캐시는 STATE_BACKEND(sqlite/redis)에서 읽습니다. 기본 memory 백엔드는
+캐시가 서버 프로세스 안에만 있으므로 --server 로 실행 중인 서버에 재계산을 요청하세요.
+"""
+
+import os
+import sys
+import json
+import argparse
+import urllib.request
+from pathlib import Path
+
+# 프로젝트 루트 경로 설정 (scripts 폴더 기준 상위 디렉토리)
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+# .env 파일에서 환경변수 로드
+from dotenv import load_dotenv
+load_dotenv(PROJECT_ROOT / ".env")
+
+from services.state import create_backend
+from services.templates import MIN_SAMPLES, build_library, save_library
+
+DATA_DIR = PROJECT_ROOT / "data"
+
+
+def load_category_urls() -> dict:
+    path = DATA_DIR / "popular_videos.json"
+    if not path.exists():
+        print(f"인기 영상 파일이 없습니다: {path} (scripts/update_videos.py 먼저 실행)")
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        categories = json.load(f).get("categories", {})
+    return {
+        category: [video["url"] for video in videos if video.get("url")]
+        for category, videos in categories.items()
+    }
+
+
+def rebuild_on_server(server_url: str):
+    """실행 중인 서버에서 재계산 (로컬 서버는 관리자 IP로 인정됨)"""
+    url = server_url.rstrip("/") + "/admin/templates/rebuild"
+    req = urllib.request.Request(url, data=b"", method="POST")
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        status = json.loads(resp.read().decode("utf-8"))
+    print(f"서버 템플릿 재계산 완료: {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="카테고리별 구조 템플릿 사전 계산")
+    parser.add_argument("--min-samples", type=int, default=MIN_SAMPLES,
+                        help="카테고리 프로필을 만들 최소 분석 영상 수")
+    parser.add_argument("--server", metavar="SERVER_URL",
+                        help="파일 대신 실행 중인 서버에서 재계산 (memory 백엔드용)")
+    args = parser.parse_args()
+
+    if args.server:
+        rebuild_on_server(args.server)
+        return
+
+    backend = os.getenv("STATE_BACKEND", "memory")
+    if backend == "memory":
+        print("STATE_BACKEND=memory 는 분석 캐시를 저장하지 않습니다. --server 옵션을 사용하세요.")
+        sys.exit(1)
+
+    DATA_DIR.mkdir(exist_ok=True)
+    state = create_backend(backend, DATA_DIR)
+    library = build_library(load_category_urls(), state.cache_items(), min_samples=args.min_samples)
+
+    output_path = DATA_DIR / "structure_templates.json"
+    save_library(library, output_path)
+
+    print("=" * 60)
+    for category, entry in library["categories"].items():
+        profile = entry["profile"]
+        if profile:
+            print(f"[{category}] 분석 {profile['sample_size']}개, 평균 길이 {profile['median_length']}초")
+        else:
+            print(f"[{category}] 분석 부족 - 기본 뼈대 사용")
+    print(f"저장 위치: {output_path} (서버 재시작 시 적용)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
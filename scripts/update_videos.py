@@ -11,12 +11,29 @@ v2 변경사항:
 - 필터 조건 적용 (구독자 1천~100만, 조회수 1만+, 바이럴 2배+)
 - 바이럴 지수 순 정렬
 - 업로드 날짜 표시
+
+--warm http://127.0.0.1:8000 을 주면 저장 후 실행 중인 서버에
+인기 영상 미리 분석(캐시 워밍)을 요청합니다.
+
+--category food --category game 처럼 일부 카테고리만 갱신할 수 있습니다.
+나머지 카테고리와 결과가 없는 카테고리는 기존 목록을 유지합니다.
+파일은 임시 파일에 쓴 뒤 교체하므로 실행 중인 서버가 쓰다 만 파일을 읽지 않습니다.
+(서버 안에서 주기적으로 갱신하려면 POPULAR_REFRESH=1)
+
+API 호출 비용(검색 100, 영상/채널 조회 1)은 data/youtube_quota.json 에 하루(태평양 시간) 단위로
+기록합니다. 남은 할당량으로 모든 카테고리를 수집할 수 없으면 POPULAR_PRIORITIES 가중치 ×
+오래된 정도 순으로 수집하고 나머지는 기존 목록을 유지합니다. --dry-run 은 계획만 출력합니다.
+
+수집한 모든 영상의 조회수/구독자 수는 data/video_history/ 에 날짜별로 누적되어
+서버의 /api/popular-videos/trending (시간당 조회수 증가 순위) 계산에 쓰입니다.
 """
 
 import os
 import sys
 import json
-from datetime import datetime, timedelta, timezone
+import argparse
+import urllib.request
+from datetime import datetime
 from pathlib import Path
 
 # 프로젝트 루트 경로 설정 (scripts 폴더 기준 상위 디렉토리)
@@ -27,293 +44,70 @@ sys.path.insert(0, str(PROJECT_ROOT))
 from dotenv import load_dotenv
 load_dotenv(PROJECT_ROOT / ".env")
 
-# Google API 클라이언트
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-
-# 카테고리 정의 (메인 검색어, 대체 검색어)
-CATEGORIES = {
-    "health": ("건강 쇼츠", "건강 유튜브"),
-    "finance": ("재테크 쇼츠", "재테크 유튜브"),
-    "food": ("요리 레시피 쇼츠", "요리 유튜브"),
-    "tech": ("IT 쇼츠", "IT 유튜브"),
-    "selfdev": ("자기계발 쇼츠", "자기계발 유튜브"),
-    "beauty": ("뷰티 쇼츠", "뷰티 유튜브"),
-    "travel": ("여행 쇼츠", "여행 유튜브"),
-    "game": ("게임 쇼츠", "게임 유튜브"),
-    "pet": ("반려동물 쇼츠", "반려동물 유튜브"),
-    "humor": ("유머 쇼츠", "유머 유튜브"),
-}
-
-# 필터 조건
-MIN_SUBSCRIBERS = 1_000       # 최소 구독자 1,000명
-MAX_SUBSCRIBERS = 1_000_000   # 최대 구독자 100만명
-MIN_VIEWS = 10_000            # 최소 조회수 1만
-MIN_VIRAL_RATIO = 2.0         # 최소 바이럴 지수 2배
-
-
-def get_youtube_client():
-    """YouTube Data API v3 클라이언트 생성"""
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY 환경변수가 설정되지 않았습니다.")
-    return build("youtube", "v3", developerKey=api_key)
-
-
-def format_count(count: int) -> str:
-    """숫자를 읽기 쉬운 형식으로 변환 (예: 12300 -> '1.2만')"""
-    if count >= 100_000_000:
-        return f"{count / 100_000_000:.1f}억"
-    elif count >= 10_000:
-        return f"{count / 10_000:.1f}만"
-    elif count >= 1_000:
-        return f"{count / 1_000:.1f}천"
-    else:
-        return str(count)
-
-
-def format_duration(iso_duration: str) -> str:
-    """ISO 8601 duration을 읽기 쉬운 형식으로 변환 (예: PT1M30S -> '1:30')"""
-    duration = iso_duration.replace("PT", "")
-
-    hours = 0
-    minutes = 0
-    seconds = 0
-
-    if "H" in duration:
-        hours, duration = duration.split("H")
-        hours = int(hours)
-    if "M" in duration:
-        minutes, duration = duration.split("M")
-        minutes = int(minutes)
-    if "S" in duration:
-        seconds = int(duration.replace("S", ""))
-
-    if hours > 0:
-        return f"{hours}:{minutes:02d}:{seconds:02d}"
-    else:
-        return f"{minutes}:{seconds:02d}"
-
-
-def format_relative_time(published_at: str) -> str:
-    """ISO 날짜를 상대적 시간으로 변환 (예: '3일 전')"""
-    try:
-        # ISO 형식 파싱 (예: 2025-12-23T10:30:00Z)
-        pub_date = datetime.fromisoformat(published_at.replace("Z", "+00:00"))
-        now = datetime.now(timezone.utc)
-        diff = now - pub_date
+from services.popular_videos import (
+    CATEGORIES, MAX_SUBSCRIBERS, MIN_SUBSCRIBERS, MIN_VIEWS, MIN_VIRAL_RATIO,
+    PopularVideos, fetch_category, format_count, get_youtube_client,
+    parse_category_values, parse_intervals, plan_refresh,
+)
+from services.quota import QuotaExhausted, QuotaLedger
+from services.video_history import VideoHistory
 
-        days = diff.days
-        hours = diff.seconds // 3600
+DATA_DIR = PROJECT_ROOT / "data"
 
-        if days == 0:
-            if hours < 1:
-                return "방금 전"
-            return f"{hours}시간 전"
-        elif days == 1:
-            return "1일 전"
-        elif days < 7:
-            return f"{days}일 전"
-        elif days < 30:
-            weeks = days // 7
-            return f"{weeks}주 전"
-        else:
-            months = days // 30
-            return f"{months}개월 전"
-    except Exception:
-        return ""
 
+def print_plan(plan: list, quota: dict):
+    """수집 계획 표 출력"""
+    print(f"할당량 ({quota['day']} PT): 사용 {quota['used']} / {quota['daily_limit']} "
+          f"(예비 {quota['reserve']}, 사용 가능 {quota['available']}, {quota['resets_in_minutes']}분 후 초기화)")
+    for row in plan:
+        age = f"{row['age_hours']}시간 전" if row["age_hours"] is not None else "수집 기록 없음"
+        note = f" - {row['reason']}" if row["reason"] else ""
+        print(f"  {row['action']:<5} {row['category']:<8} 우선순위 {row['priority']:g}, {age}, "
+              f"최대 {row['estimated_cost']} units{note}")
 
-def search_shorts(youtube, query: str, max_results: int = 50) -> list:
-    """
-    YouTube 쇼츠 검색 (더 많이 가져와서 필터링)
-    """
-    published_after = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
 
+def request_cache_warmup(server_url: str):
+    """실행 중인 서버에 인기 영상 미리 분석 요청 (로컬 서버는 관리자 IP로 인정됨)"""
+    url = server_url.rstrip("/") + "/admin/warm-cache"
     try:
-        search_response = youtube.search().list(
-            q=query,
-            part="id,snippet",
-            type="video",
-            videoDuration="short",
-            publishedAfter=published_after,
-            order="viewCount",
-            maxResults=max_results,  # 필터링을 위해 더 많이 가져옴
-            regionCode="KR",
-            relevanceLanguage="ko",
-        ).execute()
-
-        return search_response.get("items", [])
-
-    except HttpError as e:
-        print(f"  검색 오류 ({query}): {e}")
-        return []
-
-
-def get_channel_subscribers(youtube, channel_ids: list) -> dict:
-    """
-    채널 구독자 수 조회
-
-    Returns:
-        채널 ID를 키로 하는 구독자 수 딕셔너리
-    """
-    if not channel_ids:
-        return {}
-
-    # 중복 제거
-    unique_ids = list(set(channel_ids))
-
-    try:
-        # 50개씩 분할 (API 제한)
-        subscribers = {}
-        for i in range(0, len(unique_ids), 50):
-            batch = unique_ids[i:i+50]
-            response = youtube.channels().list(
-                part="statistics",
-                id=",".join(batch),
-            ).execute()
-
-            for item in response.get("items", []):
-                channel_id = item["id"]
-                stats = item.get("statistics", {})
-                # 구독자 수가 숨겨진 경우 0으로 처리
-                sub_count = int(stats.get("subscriberCount", 0))
-                subscribers[channel_id] = sub_count
-
-        return subscribers
-
-    except HttpError as e:
-        print(f"  채널 정보 조회 오류: {e}")
-        return {}
-
-
-def get_video_details(youtube, video_ids: list) -> dict:
-    """
-    비디오 상세 정보 조회 (채널 ID 포함)
-    """
-    if not video_ids:
-        return {}
-
-    try:
-        videos_response = youtube.videos().list(
-            part="snippet,statistics,contentDetails",
-            id=",".join(video_ids),
-        ).execute()
-
-        details = {}
-        for item in videos_response.get("items", []):
-            video_id = item["id"]
-            snippet = item.get("snippet", {})
-            statistics = item.get("statistics", {})
-            content_details = item.get("contentDetails", {})
-
-            view_count = int(statistics.get("viewCount", 0))
-
-            details[video_id] = {
-                "id": video_id,
-                "title": snippet.get("title", ""),
-                "channel": snippet.get("channelTitle", ""),
-                "channel_id": snippet.get("channelId", ""),
-                "views_raw": view_count,
-                "views": format_count(view_count),
-                "duration": format_duration(content_details.get("duration", "PT0S")),
-                "uploaded_at": format_relative_time(snippet.get("publishedAt", "")),
-                "url": f"https://www.youtube.com/shorts/{video_id}",
-            }
-
-        return details
-
-    except HttpError as e:
-        print(f"  비디오 상세 조회 오류: {e}")
-        return {}
-
-
-def fetch_popular_videos_for_category(youtube, category: str, queries: tuple) -> list:
-    """
-    특정 카테고리의 바이럴 쇼츠 수집 (필터링 + 바이럴 지수 정렬)
-    """
-    main_query, fallback_query = queries
-
-    print(f"[{category}] 검색 중: '{main_query}'")
-    search_results = search_shorts(youtube, main_query, max_results=50)
-
-    if not search_results:
-        print(f"  결과 없음. 대체 검색어로 재시도: '{fallback_query}'")
-        search_results = search_shorts(youtube, fallback_query, max_results=50)
-
-    if not search_results:
-        print(f"  [{category}] 검색 결과 없음 - 카테고리 제외")
-        return []
-
-    # 비디오 ID 추출
-    video_ids = [item["id"]["videoId"] for item in search_results if "videoId" in item.get("id", {})]
-
-    if not video_ids:
-        return []
-
-    # 비디오 상세 정보 조회
-    details = get_video_details(youtube, video_ids)
-
-    if not details:
-        return []
-
-    # 채널 ID 수집 및 구독자 수 조회
-    channel_ids = [d["channel_id"] for d in details.values() if d.get("channel_id")]
-    subscribers = get_channel_subscribers(youtube, channel_ids)
-
-    # 바이럴 지수 계산 및 필터링
-    filtered_videos = []
-
-    for video_id, video in details.items():
-        channel_id = video.get("channel_id", "")
-        sub_count = subscribers.get(channel_id, 0)
-        view_count = video.get("views_raw", 0)
-
-        # 필터 조건 체크
-        if sub_count < MIN_SUBSCRIBERS:
-            continue
-        if sub_count > MAX_SUBSCRIBERS:
-            continue
-        if view_count < MIN_VIEWS:
-            continue
-
-        # 바이럴 지수 계산
-        viral_ratio = view_count / sub_count if sub_count > 0 else 0
-
-        if viral_ratio < MIN_VIRAL_RATIO:
-            continue
-
-        # 결과에 추가
-        video["subscribers_raw"] = sub_count
-        video["subscribers"] = format_count(sub_count)
-        video["viral_ratio"] = round(viral_ratio, 1)
-
-        # views_raw, subscribers_raw 는 정렬용이므로 최종 결과에서 제거
-        filtered_videos.append(video)
-
-    # 바이럴 지수 내림차순 정렬
-    filtered_videos.sort(key=lambda x: x.get("viral_ratio", 0), reverse=True)
-
-    # 상위 10개만 선택
-    top_videos = filtered_videos[:10]
-
-    # 정렬용 필드 제거
-    for v in top_videos:
-        v.pop("views_raw", None)
-        v.pop("subscribers_raw", None)
-        v.pop("channel_id", None)
-
-    print(f"  [{category}] 필터 통과: {len(filtered_videos)}개 → 상위 {len(top_videos)}개 선택")
-    return top_videos
+        req = urllib.request.Request(url, data=b"", method="POST")
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            queued = json.loads(resp.read().decode("utf-8")).get("queued", 0)
+        print(f"캐시 워밍 요청 완료: {queued}개 영상 대기열 추가")
+    except Exception as e:
+        print(f"캐시 워밍 요청 실패 ({server_url}): {e}")
 
 
 def main():
     """메인 실행 함수"""
+    parser = argparse.ArgumentParser(description="YouTube 인기 쇼츠 수집")
+    parser.add_argument("--warm", metavar="SERVER_URL",
+                        help="저장 후 이 서버에 인기 영상 캐시 워밍 요청")
+    parser.add_argument("--category", action="append", choices=list(CATEGORIES),
+                        help="이 카테고리만 갱신 (여러 번 지정 가능, 생략 시 전체)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="API를 호출하지 않고 할당량 기준 수집 계획만 출력")
+    args = parser.parse_args()
+
+    store = PopularVideos(DATA_DIR / "popular_videos.json")
+    ledger = QuotaLedger(DATA_DIR / "youtube_quota.json")
+    plan = plan_refresh(
+        store,
+        args.category or list(CATEGORIES),
+        ledger,
+        parse_intervals(float(os.getenv("POPULAR_REFRESH_HOURS", "24")), os.getenv("POPULAR_REFRESH_INTERVALS", "")),
+        parse_category_values(1.0, os.getenv("POPULAR_PRIORITIES", "")),
+    )
+    if args.dry_run:
+        print_plan(plan, ledger.status())
+        return
+
     print("=" * 60)
     print("YouTube 바이럴 쇼츠 수집 v2")
     print(f"수집 시간: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"필터: 구독자 {format_count(MIN_SUBSCRIBERS)}~{format_count(MAX_SUBSCRIBERS)}, "
           f"조회수 {format_count(MIN_VIEWS)}+, 바이럴 {MIN_VIRAL_RATIO}배+")
+    print_plan(plan, ledger.status())
     print("=" * 60)
 
     # YouTube API 클라이언트 생성
@@ -323,42 +117,41 @@ def main():
         print(f"오류: {e}")
         sys.exit(1)
 
-    # 카테고리별 수집
+    # 카테고리별 수집 (필터와 관계없이 가져온 영상의 조회수는 모두 기록)
+    history = VideoHistory(DATA_DIR / "video_history")
     categories_data = {}
 
-    for category, queries in CATEGORIES.items():
-        videos = fetch_popular_videos_for_category(youtube, category, queries)
+    for row in plan:
+        if row["action"] != "fetch":
+            continue
+        observations = []
+        try:
+            videos = fetch_category(youtube, row["category"], ledger, observations)
+        except QuotaExhausted as e:
+            # 이미 수집한 카테고리는 저장하고, 나머지는 기존 목록 유지
+            print(f"  할당량 부족으로 중단: {e}")
+            break
+        finally:
+            history.append(row["category"], observations)
         if videos:
-            categories_data[category] = videos
+            categories_data[row["category"]] = videos
 
-    # 결과 저장
-    result = {
-        "updated_at": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
-        "filter_config": {
-            "min_subscribers": MIN_SUBSCRIBERS,
-            "max_subscribers": MAX_SUBSCRIBERS,
-            "min_views": MIN_VIEWS,
-            "min_viral_ratio": MIN_VIRAL_RATIO,
-        },
-        "categories": categories_data,
-    }
-
-    # data 디렉토리 확인 및 생성
-    data_dir = PROJECT_ROOT / "data"
-    data_dir.mkdir(exist_ok=True)
-
-    output_path = data_dir / "popular_videos.json"
-
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+    # 결과 저장: 기존 파일에 갱신된 카테고리만 합쳐서 원자적으로 교체
+    output_path = store.path
+    if categories_data:
+        store.publish(categories_data)
 
     total_videos = sum(len(v) for v in categories_data.values())
     print("=" * 60)
     print(f"수집 완료!")
-    print(f"총 {len(categories_data)}개 카테고리, {total_videos}개 바이럴 영상")
+    print(f"총 {len(categories_data)}개 카테고리 갱신, {total_videos}개 바이럴 영상")
     print(f"저장 위치: {output_path}")
+    print(f"할당량 사용: {ledger.status()['used']} units (오늘 누적)")
     print("=" * 60)
 
+    if args.warm:
+        request_cache_warmup(args.warm)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# 기본 보관 기간 14일 (ACTIVITY_RETENTION_DAYS)
+DEFAULT_RETENTION_DAYS = 14
+PRUNE_EVERY = 500  # N건 기록마다 오래된 로그 정리
+
+
+class ActivityStore:
+    """
+    Activity log in an indexed SQLite table.
+
+    Every filter (IP, action, time range) is answered from an index and pages
+    are keyed by a descending id cursor, so neither listing nor filtering
+    scans the whole log. Rows older than the retention window are pruned
+    periodically on write.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS activity_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts REAL NOT NULL,
+        time TEXT NOT NULL,
+        action TEXT NOT NULL,
+        ip TEXT NOT NULL,
+        details TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_activity_ip ON activity_events(ip, id);
+    CREATE INDEX IF NOT EXISTS idx_activity_action ON activity_events(action, id);
+    CREATE INDEX IF NOT EXISTS idx_activity_ts ON activity_events(ts);
+    """
+
+    def __init__(self, db_path: Path, retention_days: float = None):
+        self.db_path = str(db_path)
+        if retention_days is None:
+            retention_days = float(os.getenv("ACTIVITY_RETENTION_DAYS", DEFAULT_RETENTION_DAYS))
+        self.retention_seconds = retention_days * 24 * 60 * 60
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, entry: Dict[str, str], ts: float = None):
+        ts = ts if ts is not None else time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO activity_events (ts, time, action, ip, details) VALUES (?, ?, ?, ?, ?)",
+                (ts, entry["time"], entry["action"], entry["ip"], entry.get("details", "")),
+            )
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM activity_events WHERE ts < ?", (time.time() - self.retention_seconds,))
+
+    def is_empty(self) -> bool:
+        return not self._conn().execute("SELECT 1 FROM activity_events LIMIT 1").fetchall()
+
+    def query(self, ip: Optional[str] = None, action: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              cursor: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict], Optional[int]]:
+        """Newest-first page of events; returns (items, next_cursor or None)."""
+        clauses, params = [], []
+        for column, value in (("ip", ip), ("action", action)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        rows = self._conn().execute(
+            f"SELECT id, ts, time, action, ip, details FROM activity_events {where} ORDER BY id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+        items = [
+            {"id": row_id, "ts": ts, "time": t, "action": a, "ip": row_ip, "details": d}
+            for row_id, ts, t, a, row_ip, d in rows[:limit]
+        ]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return items, next_cursor
+
+
+def parse_time(value: Optional[str], end_of_day: bool = False) -> Optional[float]:
+    """
+    Accept epoch seconds or an ISO-like 'YYYY-MM-DD[ HH:MM:SS]' string.
+    end_of_day: a bare date means the end of that day (for exclusive `until` bounds).
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if end_of_day and len(value.strip()) == 10:
+            # 날짜만 주면 그날 자정이 아니라 다음 날 자정까지 (ts < until 이라 그날 전체 포함)
+            parsed += timedelta(days=1)
+        return parsed.timestamp()
@@ -0,0 +1,140 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+
+# 낮을수록 먼저 처리
+PRIORITY_ADMIN = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+
+class AdmissionRejected(Exception):
+    """The pool is saturated and its queue is full (or the wait timed out)."""
+
+    def __init__(self, pool: str, retry_after: int):
+        self.pool = pool
+        self.retry_after = retry_after
+        super().__init__(f"{pool} pool saturated, retry after {retry_after}s")
+
+
+class _Pool:
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters = []  # heap of [priority, seq, future]
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._wait_total = 0.0
+        self._service_total = 0.0
+        self._completed = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def estimate_wait(self, position: int) -> int:
+        """Seconds until a request at `position` in the queue would likely start."""
+        avg_service = self._service_total / self._completed if self._completed else 30.0
+        return max(1, math.ceil(position / self.limit * avg_service))
+
+    async def acquire(self, priority: int):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        # 관리자 요청은 대기열이 가득 차도 줄을 설 수 있음
+        if self.queued >= self.max_queue and priority > PRIORITY_ADMIN:
+            self.rejected += 1
+            raise AdmissionRejected(self.name, self.estimate_wait(self.queued + 1))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), future]
+        heapq.heappush(self._waiters, entry)
+        enqueued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # 슬롯을 넘겨받은 직후 취소됨 -> 다음 대기자에게 반납
+                self._handoff()
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise AdmissionRejected(self.name, self.estimate_wait(self.queued + 1))
+            raise
+        self._wait_total += time.monotonic() - enqueued_at
+        self.admitted += 1
+
+    def release(self, service_seconds: float):
+        self._service_total += service_seconds
+        self._completed += 1
+        self._handoff()
+
+    def _handoff(self):
+        # 실행 슬롯을 가장 우선순위 높은 대기자에게 그대로 넘김
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def metrics(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": int(self._wait_total / self.admitted * 1000) if self.admitted else 0,
+            "avg_service_s": round(self._service_total / self._completed, 1) if self._completed else None,
+        }
+
+
+class AdmissionController:
+    """
+    Per-endpoint-class concurrency limits with bounded priority queues.
+
+    Expensive pipelines (analysis, generation) each get their own pool so a burst
+    of one cannot occupy every worker thread; when a pool's queue is full the
+    caller gets AdmissionRejected with a queue-depth based retry hint.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self):
+        self._pools = {}
+
+    def configure(self, name: str, limit: int, max_queue: int, max_wait: float = 120.0):
+        self._pools[name] = _Pool(name, limit, max_queue, max_wait)
+
+    async def acquire(self, name: str, priority: int = PRIORITY_NORMAL) -> float:
+        await self._pools[name].acquire(priority)
+        return time.monotonic()
+
+    def release(self, name: str, admitted_at: float):
+        self._pools[name].release(time.monotonic() - admitted_at)
+
+    @asynccontextmanager
+    async def slot(self, name: str, priority: int = PRIORITY_NORMAL):
+        admitted_at = await self.acquire(name, priority)
+        try:
+            yield
+        finally:
+            self.release(name, admitted_at)
+
+    def metrics(self) -> dict:
+        return {name: pool.metrics() for name, pool in self._pools.items()}
@@ -1,21 +1,66 @@
 import os
 import json
-import time
-from google import genai
-from google.genai import types
+
+from services import deadline
+from services.deadline import PipelineAborted
+from services.resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, call_with_resilience
+from services.schemas import (
+    CRITICAL_STRUCTURE_FIELDS,
+    TitleSet,
+    ViralStructure,
+    fill_structure_defaults,
+    parse_json_lenient,
+    partial_structure_schema,
+    repair_structure,
+    repair_titles,
+)
+
+# Gemini 호출 공용 회로 차단기 + 함수별 지연 시간 (헤징 기준 p95)
+GEMINI_BREAKER = CircuitBreaker("gemini")
+_LATENCY = {
+    "analyze": LatencyTracker(),
+    "script": LatencyTracker(),
+    "titles": LatencyTracker(),
+}
 
 
 def get_client():
+    # google.genai는 import 비용이 커서 첫 호출 시점에 로드 (services.startup에서 미리 로드 가능)
+    from google import genai
+
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise ValueError("GOOGLE_API_KEY not found in environment variables")
     return genai.Client(api_key=api_key)
 
 
-def analyze_structure(transcript_text, duration_seconds=None):
+async def _generate(client, kind, **kwargs):
+    """
+    Call Gemini through the shared resilience layer.
+    GEMINI_RETRY_ATTEMPTS sets the attempt count, GEMINI_HEDGE=1 enables hedged requests.
+    """
+    return await call_with_resilience(
+        lambda: client.aio.models.generate_content(**kwargs),
+        breaker=GEMINI_BREAKER,
+        latency=_LATENCY[kind],
+        attempts=int(os.getenv("GEMINI_RETRY_ATTEMPTS", "3")),
+        hedge=os.getenv("GEMINI_HEDGE", "0") == "1",
+        deadline=deadline.current(),
+        stage=f"gemini:{kind}",
+    )
+
+
+def get_gemini_health():
+    """Circuit breaker state for the stats endpoint."""
+    return GEMINI_BREAKER.snapshot()
+
+
+async def analyze_structure(transcript_text, duration_seconds=None):
     """
     Analyze transcript and return viral structure JSON.
     """
+    from google.genai import types
+
     try:
         client = get_client()
 
@@ -49,48 +94,80 @@ def analyze_structure(transcript_text, duration_seconds=None):
             "}"
         )
 
-        response = None
-        for attempt in range(3):
-            try:
-                response = client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=transcript_text,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json",
-                    temperature=0.2,
-                    top_p=0.8,
-                    top_k=40,
-                    max_output_tokens=8192,
-                )
-                )
-                break
-            except Exception as e:
-                msg = str(e).upper()
-                if attempt < 2 and ("503" in msg or "UNAVAILABLE" in msg or "OVERLOADED" in msg):
-                    time.sleep(1.5 * (attempt + 1))
-                    continue
-                raise
-
-        try:
-            return json.loads(response.text)
-        except json.JSONDecodeError:
-            text = response.text.strip()
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.endswith("```"):
-                text = text[:-3]
-            return json.loads(text.strip())
+        # 스키마 강제 출력이라 JSON 자체는 작음 -> 토큰 상한을 낮추고 사고 토큰도 제한
+        response = await _generate(
+            client,
+            "analyze",
+            model="gemini-2.5-flash",
+            contents=transcript_text,
+            config=types.GenerateContentConfig(
+                system_instruction=system_prompt,
+                response_mime_type="application/json",
+                response_schema=ViralStructure,
+                temperature=0.2,
+                top_p=0.8,
+                top_k=40,
+                max_output_tokens=4096,
+                thinking_config=types.ThinkingConfig(thinking_budget=1024),
+            )
+        )
 
+        result, missing = repair_structure(parse_json_lenient(response.text) or {})
+        if missing:
+            # 전체 재분석 대신 빠진 필드만 다시 요청
+            print(f"analyze_structure: re-asking missing fields {missing}")
+            patch = await _request_missing_fields(client, system_prompt, transcript_text, result, missing)
+            result, missing = repair_structure({**result, **patch})
+
+        if any(name in missing for name in CRITICAL_STRUCTURE_FIELDS):
+            return {"error": f"Incomplete analysis from model (missing: {', '.join(missing)})"}
+        return fill_structure_defaults(result)
+
+    except PipelineAborted:
+        raise
+    except CircuitOpenError as e:
+        print(f"Error in analyze_structure: {e}")
+        return {"error": str(e), "retry_after": e.retry_after}
     except Exception as e:
         print(f"Error in analyze_structure: {e}")
         return {"error": str(e)}
 
 
-def generate_script(structure_json, user_topic, tone=None, style=None, audience=None):
+async def _request_missing_fields(client, system_prompt, transcript_text, partial, missing):
+    """Ask the model for just the missing fields of a partial analysis."""
+    from google.genai import types
+
+    user_message = (
+        f"{transcript_text}\n\n"
+        f"[이미 추출된 분석]\n{json.dumps(partial, ensure_ascii=False)}\n\n"
+        f"위 분석에서 누락된 다음 필드만 채워 JSON으로 출력하세요: {', '.join(missing)}"
+    )
+    response = await _generate(
+        client,
+        "analyze",
+        model="gemini-2.5-flash",
+        contents=user_message,
+        config=types.GenerateContentConfig(
+            system_instruction=system_prompt,
+            response_mime_type="application/json",
+            response_schema=partial_structure_schema(missing),
+            temperature=0.2,
+            max_output_tokens=2048,
+            thinking_config=types.ThinkingConfig(thinking_budget=0),
+        )
+    )
+    return parse_json_lenient(response.text) or {}
+
+
+async def generate_script(structure_json, user_topic, tone=None, style=None, audience=None,
+                          category=None, template=None):
     """
     Generate new script based on structure and topic.
+    `category`/`template` are set when the structure comes from the template library
+    rather than an analyzed video.
     """
+    from google.genai import types
+
     try:
         client = get_client()
 
@@ -104,6 +181,14 @@ def generate_script(structure_json, user_topic, tone=None, style=None, audience=
         tone_line = tone_map.get(tone or "default", tone_map["default"])
         style_line = f"스타일: {style}" if style else "스타일: 기본"
         audience_line = f"타깃 시청자: {audience}" if audience else "타깃 시청자: 일반"
+        template_lines = ""
+        if category and template:
+            template_lines = (
+                f"[카테고리]: {category}\n"
+                f"[구조 템플릿]: {template}\n"
+                "구조 데이터의 category_patterns가 있으면 같은 카테고리 인기 영상의 실제 전개 방식이니 "
+                "말투와 전개 리듬만 참고하세요.\n\n"
+            )
         system_prompt = (
             "당신은 유튜브 벤치마킹 전문 스크립트 작가입니다.\n"
             "사용자가 제공한 [영상 구조 분석 데이터]의 '구조(흐름, 타이밍, 의도)'만 차용하고, "
@@ -112,6 +197,7 @@ def generate_script(structure_json, user_topic, tone=None, style=None, audience=
             f"[타겟 독자]: {audience_line}\n"
             f"[톤앤매너]: {tone_line}\n"
             f"[스타일]: {style_line}\n\n"
+            f"{template_lines}"
             "[필수: 작성 원칙]\n"
             "1. **주제 절대 준수**:\n"
             "   - 입력된 [주제]에 대해서만 이야기하세요. 구조 데이터에 있는 원본 영상의 소재(예: 다이어트, 주식 등)가 [주제]와 다르면 절대 언급하지 마세요.\n"
@@ -131,27 +217,19 @@ def generate_script(structure_json, user_topic, tone=None, style=None, audience=
             f"구조 데이터: {json.dumps(structure_json, ensure_ascii=False)}\n"
         )
 
-        response = None
-        for attempt in range(3):
-            try:
-                response = client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=user_message,
-                    config=types.GenerateContentConfig(
-                        system_instruction=system_prompt,
-                        temperature=0.3,
-                        top_p=0.8,
-                        top_k=40,
-                        max_output_tokens=3000,
-                    )
-                )
-                break
-            except Exception as e:
-                msg = str(e).upper()
-                if attempt < 2 and ("503" in msg or "UNAVAILABLE" in msg or "OVERLOADED" in msg):
-                    time.sleep(1.5 * (attempt + 1))
-                    continue
-                raise
+        response = await _generate(
+            client,
+            "script",
+            model="gemini-2.5-flash",
+            contents=user_message,
+            config=types.GenerateContentConfig(
+                system_instruction=system_prompt,
+                temperature=0.3,
+                top_p=0.8,
+                top_k=40,
+                max_output_tokens=3000,
+            )
+        )
 
         return response.text
 
@@ -160,10 +238,12 @@ def generate_script(structure_json, user_topic, tone=None, style=None, audience=
         return f"Error generating script: {e}"
 
 
-def generate_titles(structure_json, user_topic):
+async def generate_titles(structure_json, user_topic):
     """
     Generate 3 hooky YouTube titles based on structure and topic.
     """
+    from google.genai import types
+
     try:
         client = get_client()
 
@@ -178,26 +258,23 @@ def generate_titles(structure_json, user_topic):
 
         user_message = f"User Topic: {user_topic}\n\nViral Structure JSON:\n{json.dumps(structure_json, ensure_ascii=False)}"
 
-        response = client.models.generate_content(
+        response = await _generate(
+            client,
+            "titles",
             model="gemini-2.5-flash",
             contents=user_message,
             config=types.GenerateContentConfig(
                 system_instruction=system_prompt,
                 response_mime_type="application/json",
+                response_schema=TitleSet,
                 temperature=0.2,
-                top_p=0.9
+                top_p=0.9,
+                max_output_tokens=512,
+                thinking_config=types.ThinkingConfig(thinking_budget=0),
             )
         )
 
-        try:
-            return json.loads(response.text)
-        except json.JSONDecodeError:
-            text = response.text.strip()
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.endswith("```"):
-                text = text[:-3]
-            return json.loads(text.strip())
+        return {"titles": repair_titles(parse_json_lenient(response.text))}
 
     except Exception as e:
         print(f"Error in generate_titles: {e}")
@@ -0,0 +1,230 @@
+"""
+Per-category analytics over cached analyses, kept up to date incrementally.
+
+Every analysis is reduced to one small feature row (viral score, hook length,
+runtime share per phase bucket, score components). Each category keeps
+fixed-size running aggregates: counts, sums and histograms. Viral scores are
+integers in 0..100, so a 101-bin histogram doubles as an exact quantile
+sketch. Writes update the aggregates in O(1); a full rebuild, needed when the
+category mapping changes or other workers wrote to the cache, is a handful of
+vectorized NumPy reductions. Reads only summarize fixed-size arrays.
+"""
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.schemas import PHASE_BUCKETS, phase_bucket, timeline_durations
+
+SCORE_NAMES = ("후킹", "전환", "감정", "CTA")
+UNCATEGORIZED = "other"
+ALL = "all"
+
+SCORE_BINS = 101  # 0~100 정수 점수 → 구간 하나당 1점 (분위수 정확)
+HOOK_MAX_SECONDS = 30  # 훅 길이 히스토그램: 1초 단위, 마지막 구간은 30초 이상
+QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+# 특성 행: [점수, 훅 길이, 전체 길이, 구간별 비중 x4, 세부 점수 x4 (없으면 NaN)]
+_SHARE = slice(3, 3 + len(PHASE_BUCKETS))
+_BREAKDOWN = slice(_SHARE.stop, _SHARE.stop + len(SCORE_NAMES))
+FEATURE_DIM = _BREAKDOWN.stop
+
+
+def features(analysis: Dict[str, Any]) -> Optional[List[float]]:
+    timeline = analysis.get("timeline") if isinstance(analysis, dict) else None
+    if not timeline:
+        return None
+    durations = timeline_durations(timeline)
+    total = sum(durations)
+    per_bucket = dict.fromkeys(PHASE_BUCKETS, 0.0)
+    for item, seconds in zip(timeline, durations):
+        per_bucket[phase_bucket(item.get("phase"))] += seconds
+    breakdown = {item.get("name"): item.get("score") for item in analysis.get("score_breakdown") or []}
+    return (
+        [float(analysis.get("viral_score") or 0), per_bucket["HOOK"], total]
+        + [per_bucket[bucket] / total if total else 0.0 for bucket in PHASE_BUCKETS]
+        + [float(breakdown[name]) if breakdown.get(name) is not None else float("nan") for name in SCORE_NAMES]
+    )
+
+
+def _quantiles(hist, count: int) -> Dict[str, Optional[int]]:
+    import numpy as np
+
+    if not count:
+        return {f"p{int(q * 100)}": None for q in QUANTILES}
+    cumulative = np.cumsum(hist)
+    return {f"p{int(q * 100)}": int(np.searchsorted(cumulative, q * count)) for q in QUANTILES}
+
+
+class _Aggregate:
+    """Running sums and histograms for one category."""
+
+    def __init__(self):
+        import numpy as np
+
+        self.count = 0
+        self.score_hist = np.zeros(SCORE_BINS, dtype=np.int64)
+        self.hook_hist = np.zeros(HOOK_MAX_SECONDS + 1, dtype=np.int64)
+        self.sums = np.zeros(FEATURE_DIM, dtype=np.float64)  # 세부 점수는 NaN 제외 합계
+        self.breakdown_n = np.zeros(len(SCORE_NAMES), dtype=np.int64)
+
+    def apply(self, row, sign: int):
+        import numpy as np
+
+        self.count += sign
+        self.score_hist[_score_bin(row[0])] += sign
+        self.hook_hist[_hook_bin(row[1])] += sign
+        present = ~np.isnan(row[_BREAKDOWN])
+        self.sums += sign * np.nan_to_num(row)
+        self.breakdown_n += sign * present
+
+    def merge(self, other: "_Aggregate"):
+        self.count += other.count
+        self.score_hist += other.score_hist
+        self.hook_hist += other.hook_hist
+        self.sums += other.sums
+        self.breakdown_n += other.breakdown_n
+
+    def summary(self) -> Dict[str, Any]:
+        n = max(self.count, 1)
+        breakdown_means = {
+            name: round(float(self.sums[_BREAKDOWN][i] / self.breakdown_n[i]), 1)
+            for i, name in enumerate(SCORE_NAMES) if self.breakdown_n[i]
+        }
+        return {
+            "count": self.count,
+            "viral_score": {
+                "mean": round(float(self.sums[0] / n), 1) if self.count else None,
+                **_quantiles(self.score_hist, self.count),
+                # 10점 단위 분포 (대시보드 막대그래프용)
+                "histogram": [int(self.score_hist[i:i + 10].sum()) for i in range(0, 100, 10)],
+            },
+            "hook_seconds": {
+                "mean": round(float(self.sums[1] / n), 1) if self.count else None,
+                **_quantiles(self.hook_hist, self.count),
+            },
+            "avg_length_seconds": round(float(self.sums[2] / n), 1) if self.count else None,
+            "phase_mix": {
+                bucket: round(float(share / n), 3) for bucket, share in zip(PHASE_BUCKETS, self.sums[_SHARE])
+            },
+            "score_breakdown": breakdown_means,
+        }
+
+
+def _score_bin(score: float) -> int:
+    return int(min(max(round(score), 0), SCORE_BINS - 1))
+
+
+def _hook_bin(seconds: float) -> int:
+    return int(min(max(seconds, 0), HOOK_MAX_SECONDS))
+
+
+class AnalyticsEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._category_of: Dict[str, str] = {}
+        self._aggregates: Dict[str, _Aggregate] = {}
+        self._entries: Dict[str, Tuple[str, Any]] = {}  # 캐시 키 → (카테고리, 특성 행), 덮어쓰기 시 차감용
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self.source_count = 0  # 마지막 재계산 이후 반영한 캐시 항목 수 (캐시 크기와 다르면 재계산)
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def _category(self, key: str) -> str:
+        from services.youtube import extract_video_id
+
+        return self._category_of.get(extract_video_id(key) or key, UNCATEGORIZED)
+
+    def set_categories(self, category_urls: Dict[str, List[str]]) -> bool:
+        """Update the video→category mapping; returns True if it changed (rebuild needed)."""
+        from services.youtube import extract_video_id
+
+        mapping = {
+            extract_video_id(url) or url: category
+            for category, urls in category_urls.items() for url in urls
+        }
+        if mapping == self._category_of:
+            return False
+        self._category_of = mapping
+        return True
+
+    def add(self, key: str, analysis: Dict[str, Any]):
+        """Fold one newly cached analysis into the running aggregates."""
+        import numpy as np
+
+        values = features(analysis)
+        if values is None:
+            return
+        row = np.array(values, dtype=np.float64)
+        category = self._category(key)
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous:
+                self._aggregates[previous[0]].apply(previous[1], -1)
+            else:
+                self.source_count += 1
+            self._aggregates.setdefault(category, _Aggregate()).apply(row, 1)
+            self._entries[key] = (category, row)
+            self._snapshot = None
+
+    def rebuild(self, items: Iterable[Tuple[str, Any]]):
+        """Recompute every aggregate from scratch with vectorized reductions."""
+        import numpy as np
+
+        keys, rows, categories = [], [], []
+        source_count = 0
+        for key, analysis in items:
+            source_count += 1
+            values = features(analysis)
+            if values is not None:
+                keys.append(key)
+                rows.append(values)
+                categories.append(self._category(key))
+
+        matrix = np.array(rows, dtype=np.float64).reshape(-1, FEATURE_DIM)
+        names = sorted(set(categories))
+        index = np.array([names.index(c) for c in categories], dtype=np.int64)
+        n_cat = len(names)
+
+        score_hist = np.bincount(
+            index * SCORE_BINS + np.clip(np.rint(matrix[:, 0]), 0, SCORE_BINS - 1).astype(np.int64),
+            minlength=n_cat * SCORE_BINS,
+        ).reshape(n_cat, SCORE_BINS)
+        hook_hist = np.bincount(
+            index * (HOOK_MAX_SECONDS + 1) + np.clip(matrix[:, 1], 0, HOOK_MAX_SECONDS).astype(np.int64),
+            minlength=n_cat * (HOOK_MAX_SECONDS + 1),
+        ).reshape(n_cat, HOOK_MAX_SECONDS + 1)
+        sums = np.zeros((n_cat, FEATURE_DIM))
+        np.add.at(sums, index, np.nan_to_num(matrix))
+        breakdown_n = np.zeros((n_cat, len(SCORE_NAMES)), dtype=np.int64)
+        np.add.at(breakdown_n, index, ~np.isnan(matrix[:, _BREAKDOWN]))
+        counts = np.bincount(index, minlength=n_cat)
+
+        aggregates = {}
+        for i, name in enumerate(names):
+            aggregate = _Aggregate()
+            aggregate.count = int(counts[i])
+            aggregate.score_hist = score_hist[i].copy()
+            aggregate.hook_hist = hook_hist[i].copy()
+            aggregate.sums = sums[i].copy()
+            aggregate.breakdown_n = breakdown_n[i].copy()
+            aggregates[name] = aggregate
+
+        with self._lock:
+            self._aggregates = aggregates
+            self._entries = {key: (category, matrix[i]) for i, (key, category) in enumerate(zip(keys, categories))}
+            self.source_count = source_count
+            self._snapshot = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Summary per category plus an `all` rollup; cached until the next write."""
+        with self._lock:
+            if self._snapshot is None:
+                total = _Aggregate()
+                categories = {}
+                for name, aggregate in sorted(self._aggregates.items()):
+                    if aggregate.count:
+                        categories[name] = aggregate.summary()
+                        total.merge(aggregate)
+                self._snapshot = {ALL: total.summary(), "categories": categories}
+            return self._snapshot
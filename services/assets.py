@@ -0,0 +1,142 @@
+"""
+Static assets served from memory with precompressed variants and fingerprinted URLs.
+
+At startup every file in the static directory is read once, hashed and
+compressed (gzip, plus brotli when the `brotli` package is installed).
+HTML files have their `/static/<name>` references rewritten to
+`/static/<stem>.<hash><suffix>`; those URLs never change content and are
+served with an immutable Cache-Control, while HTML and unhashed URLs are
+revalidated cheaply via ETag.
+"""
+import gzip
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "no-cache"
+
+# 이보다 작거나 이미 압축된 형식(이미지 등)은 원본 그대로 제공
+COMPRESSIBLE_SUFFIXES = (".html", ".css", ".js", ".json", ".svg", ".txt", ".map")
+MIN_COMPRESS_SIZE = 256
+
+_STATIC_REF = re.compile(r"/static/([\w./-]+)")
+
+
+class Asset:
+    def __init__(self, name: str, body: bytes, media_type: str):
+        self.name = name
+        self.body = body
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        self.variants: Dict[str, bytes] = {}
+
+        if name.endswith(COMPRESSIBLE_SUFFIXES) and len(body) >= MIN_COMPRESS_SIZE:
+            compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(body, quality=11)
+            # 압축해도 작아지지 않으면 원본만 제공
+            self.variants = {enc: data for enc, data in compressed.items() if len(data) < len(body)}
+
+    @property
+    def fingerprinted_name(self) -> str:
+        path = Path(self.name)
+        return str(path.with_name(f"{path.stem}.{self.digest}{path.suffix}").as_posix())
+
+    def etag(self, encoding: Optional[str]) -> str:
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+
+def accepted_encodings(header: str) -> set:
+    """Content codings from an Accept-Encoding header, ignoring ones with q=0."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q=") and params[2:] in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(coding.lower())
+    return accepted
+
+
+class AssetBundle:
+    def __init__(self, static_dir: Path, prefix: str = "/static"):
+        self.static_dir = Path(static_dir)
+        self.prefix = prefix
+        self.assets: Dict[str, Asset] = {}
+        self._routes: Dict[str, Tuple[Asset, bool]] = {}  # URL 경로 → (자산, 해시 URL 여부)
+
+    def build(self) -> "AssetBundle":
+        files = sorted(p for p in self.static_dir.rglob("*") if p.is_file())
+        # HTML은 다른 자산의 해시 URL을 참조하므로 마지막에 처리
+        files.sort(key=lambda p: p.suffix == ".html")
+        for path in files:
+            name = path.relative_to(self.static_dir).as_posix()
+            body = path.read_bytes()
+            if path.suffix == ".html":
+                # 인코딩이 깨진 파일도 바이트 그대로 보존
+                html = body.decode("utf-8", errors="surrogateescape")
+                body = self._rewrite_refs(html).encode("utf-8", errors="surrogateescape")
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if media_type.startswith("text/") or media_type == "application/javascript":
+                media_type += "; charset=utf-8"
+            asset = Asset(name, body, media_type)
+            self.assets[name] = asset
+            self._routes[name] = (asset, False)
+            self._routes[asset.fingerprinted_name] = (asset, True)
+        return self
+
+    def _rewrite_refs(self, html: str) -> str:
+        def replace(match):
+            asset = self.assets.get(match.group(1))
+            return f"{self.prefix}/{asset.fingerprinted_name}" if asset else match.group(0)
+        return _STATIC_REF.sub(replace, html)
+
+    def url(self, name: str) -> str:
+        asset = self.assets.get(name)
+        return f"{self.prefix}/{asset.fingerprinted_name if asset else name}"
+
+    def lookup(self, path: str) -> Optional[Tuple[Asset, bool]]:
+        return self._routes.get(path)
+
+    def respond(self, asset: Asset, immutable: bool, accept_encoding: str, if_none_match: str):
+        """Pick the best variant for the client; returns (status, headers, body)."""
+        accepted = accepted_encodings(accept_encoding)
+        encoding = next((enc for enc in ("br", "gzip") if enc in accepted and enc in asset.variants), None)
+        etag = asset.etag(encoding)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": CACHE_IMMUTABLE if immutable else CACHE_REVALIDATE,
+        }
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return 304, headers, b""
+
+        headers["Content-Type"] = asset.media_type
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            return 200, headers, asset.variants[encoding]
+        return 200, headers, asset.body
+
+    def stats(self) -> dict:
+        return {
+            "brotli": brotli is not None,
+            "files": {
+                name: {
+                    "url": self.url(name),
+                    "bytes": len(asset.body),
+                    **{f"{enc}_bytes": len(data) for enc, data in asset.variants.items()},
+                }
+                for name, asset in self.assets.items()
+            },
+        }
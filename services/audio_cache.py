@@ -0,0 +1,93 @@
+import os
+import threading
+from pathlib import Path
+
+# Whisper 입력 형식: 16kHz 모노. 디스크에는 int16 PCM(.npy)으로 저장해 용량 절반
+SAMPLE_RATE = 16000
+
+_evict_lock = threading.Lock()
+
+
+def get_cache_dir() -> Path:
+    default_dir = Path(__file__).resolve().parent.parent / "data" / "audio_cache"
+    cache_dir = Path(os.getenv("AUDIO_CACHE_DIR", str(default_dir)))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def _max_bytes() -> int:
+    return int(float(os.getenv("AUDIO_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+
+def _path(video_id: str) -> Path:
+    return get_cache_dir() / f"{video_id}.npy"
+
+
+def load_audio(video_id: str):
+    """
+    Return cached 16 kHz mono float32 samples for a video, or None.
+    A hit refreshes the file's mtime, which is what LRU eviction orders by.
+    """
+    import numpy as np
+
+    path = _path(video_id)
+    if not path.exists():
+        return None
+    try:
+        pcm = np.load(path)
+        os.utime(path)
+    except Exception as e:
+        print(f"Audio cache entry unreadable, dropping {path.name}: {e}")
+        path.unlink(missing_ok=True)
+        return None
+    return pcm.astype(np.float32) / 32768.0
+
+
+def store_audio(video_id: str, samples):
+    """Store decoded float32 samples (written atomically), then evict down to the size budget."""
+    import numpy as np
+
+    if _max_bytes() <= 0:
+        return
+    path = _path(video_id)
+    tmp_path = path.with_name(path.name + ".tmp")
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    try:
+        with open(tmp_path, "wb") as f:
+            np.save(f, pcm)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Failed to cache audio for {video_id}: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return
+    evict()
+
+
+def evict():
+    """Delete least recently used entries until the cache fits AUDIO_CACHE_MAX_MB."""
+    with _evict_lock:
+        entries = []
+        for path in get_cache_dir().glob("*.npy"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        limit = _max_bytes()
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def cache_stats() -> dict:
+    files = list(get_cache_dir().glob("*.npy"))
+    return {
+        "entries": len(files),
+        "bytes": sum(f.stat().st_size for f in files if f.exists()),
+        "max_bytes": _max_bytes(),
+    }
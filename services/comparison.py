@@ -0,0 +1,84 @@
+"""
+Side-by-side comparison of several analyses.
+
+Timeline phases are free text and every video splits its runtime
+differently, so phases are aligned on the HOOK/BODY/CTA/END buckets used by
+the analytics and templates. Each bucket row holds, per video, how long
+that part runs, its share of the video, when it starts, and the formulas
+the model found in it. Scores are aligned by name (the viral score plus the
+four breakdown components), with the best video marked per row. Videos
+whose analysis failed stay in their column as None, so every row lines up
+with the requested order.
+"""
+from typing import Any, Dict, List, Optional
+
+from services.analytics import SCORE_NAMES
+from services.schemas import PHASE_BUCKETS, parse_time_range, phase_bucket, timeline_durations
+
+
+def _phases(timeline: List[Dict[str, Any]]) -> Dict[str, Optional[Dict[str, Any]]]:
+    durations = timeline_durations(timeline) if timeline else []
+    total = sum(durations)
+    buckets: Dict[str, Optional[Dict[str, Any]]] = dict.fromkeys(PHASE_BUCKETS)
+    for item, seconds in zip(timeline, durations):
+        name = phase_bucket(item.get("phase"))
+        time_range = parse_time_range(item.get("time", ""))
+        entry = buckets[name] or {"seconds": 0.0, "start": time_range[0] if time_range else None, "items": []}
+        entry["seconds"] += seconds
+        entry["items"].append({
+            "time": item.get("time", ""),
+            "phase": item.get("phase", ""),
+            "formula": item.get("formula", ""),
+            "intent": item.get("intent", ""),
+        })
+        buckets[name] = entry
+    for entry in buckets.values():
+        if entry:
+            entry["share"] = round(entry["seconds"] / total, 3) if total else 0.0
+            entry["seconds"] = round(entry["seconds"], 1)
+    return buckets
+
+
+def _best(values: List[Optional[float]]) -> Optional[int]:
+    known = [(value, i) for i, value in enumerate(values) if value is not None]
+    # 동점이면 앞쪽 영상
+    return max(known, key=lambda pair: pair[0])[1] if known else None
+
+
+def compare(analyses: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Align analyses (in the given order, None for missing ones) into per-score and per-phase rows."""
+    videos, phases, breakdowns = [], [], []
+    for analysis in analyses:
+        if analysis is None:
+            phases.append(dict.fromkeys(PHASE_BUCKETS))
+            breakdowns.append({})
+            videos.append(None)
+            continue
+        timeline = analysis.get("timeline") or []
+        phases.append(_phases(timeline))
+        breakdowns.append({item.get("name"): item.get("score") for item in analysis.get("score_breakdown") or []})
+        videos.append({
+            "viral_score": analysis.get("viral_score"),
+            "one_line_summary": analysis.get("one_line_summary", ""),
+            "keywords": analysis.get("keywords") or [],
+            "duration": round(sum(timeline_durations(timeline)), 1) if timeline else None,
+        })
+
+    scores = [{"name": "viral_score", "values": [video and video["viral_score"] for video in videos]}]
+    scores += [{"name": name, "values": [b.get(name) for b in breakdowns]} for name in SCORE_NAMES]
+    for row in scores:
+        row["best"] = _best(row["values"])
+
+    # 두 개 이상 영상에 나온 키워드 = 이 니치의 공통 주제
+    keyword_counts: Dict[str, int] = {}
+    for video in filter(None, videos):
+        for keyword in set(video["keywords"]):
+            keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
+    shared = sorted((k for k, n in keyword_counts.items() if n > 1), key=lambda k: (-keyword_counts[k], k))
+
+    return {
+        "videos": videos,
+        "scores": scores,
+        "phases": [{"phase": bucket, "videos": [p[bucket] for p in phases]} for bucket in PHASE_BUCKETS],
+        "shared_keywords": shared,
+    }
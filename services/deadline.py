@@ -0,0 +1,113 @@
+"""
+Request-scoped deadlines and cancellation for the analysis pipeline.
+
+api_analyze creates a Deadline and activates it in a context variable.
+Starlette's run_in_threadpool copies that context, so transcript, yt-dlp
+and Whisper code running in worker threads see the same object as the
+Gemini calls on the event loop. Each stage calls check(stage) at its
+checkpoints (between routes, download progress, Whisper segments, Gemini
+attempts). It raises DeadlineExceeded once the budget is spent, or
+RequestCancelled after the client disconnects, so blocking work stops at
+the next checkpoint instead of running to completion for nobody.
+Without an active deadline (cache warmer, scripts) every check is a no-op.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+# 단계 이름 → 사용자 안내용 표시 이름
+STAGE_LABELS = {
+    "queue": "분석 대기열",
+    "transcript_api": "자막 조회",
+    "subtitles": "자막 다운로드",
+    "metadata": "영상 정보 조회",
+    "audio_download": "오디오 다운로드",
+    "whisper": "Whisper 음성 인식",
+    "gemini": "AI 구조 분석",
+}
+
+
+class PipelineAborted(Exception):
+    """Base for errors that must pass through the pipeline's broad exception handlers."""
+
+    def __init__(self, stage: str, message: str):
+        self.stage = stage
+        super().__init__(message)
+
+    @property
+    def stage_label(self) -> str:
+        return STAGE_LABELS.get(self.stage.split(":")[0], self.stage)
+
+
+class DeadlineExceeded(PipelineAborted):
+    def __init__(self, stage: str, budget: float):
+        self.budget = budget
+        super().__init__(stage, f"Deadline of {budget:g}s exceeded during {stage}")
+
+
+class RequestCancelled(PipelineAborted):
+    def __init__(self, stage: str):
+        super().__init__(stage, f"Request cancelled during {stage}")
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.started = time.monotonic()
+        self.expires = self.started + seconds
+        self.stage = "start"
+        self.stages: List[Tuple[str, float]] = []  # (단계, 시작 시점의 경과 초)
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self, stage: str):
+        """Record the current stage; raise if the request was cancelled or the budget is spent."""
+        if stage != self.stage:
+            self.stage = stage
+            self.stages.append((stage, round(self.elapsed(), 2)))
+        if self._cancelled.is_set():
+            raise RequestCancelled(stage)
+        if time.monotonic() >= self.expires:
+            raise DeadlineExceeded(stage, self.budget)
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+def check(stage: str):
+    """Checkpoint for code that may run with or without a request deadline."""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    deadline = _current.get()
+    return deadline.remaining() if deadline is not None else default
+
+
+@contextmanager
+def activate(deadline: Deadline):
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
@@ -0,0 +1,45 @@
+"""
+Cross-process exclusive lock for small read-modify-write data files.
+
+The popular-videos file, the YouTube quota ledger and the view history are
+updated by both scripts/update_videos.py and the server (possibly several
+workers). A threading.Lock only serializes threads of one process, so the
+re-read → merge → replace sequence is also wrapped in an OS lock held on
+a sibling "<name>.lock" file (flock on POSIX, msvcrt on Windows). The lock
+is released when the block exits or the process dies.
+"""
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Hold an exclusive lock on `<path>.lock` for the duration of the block."""
+    lock_path = path.with_name(path.name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    # LK_LOCK 은 10초 동안 재시도 후 OSError → 잡힐 때까지 반복
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,161 @@
+"""
+Per-video yt-dlp metadata, extracted once and shared between pipeline stages.
+
+`extract_info` (watch page + player API) is the expensive part of every
+yt-dlp call. The subtitle fallback and the Whisper audio download both
+start from the same info dict: subtitles are read straight from the caption
+URLs it lists, and audio goes through `process_ie_result`, so a video is
+extracted once no matter how many stages need it. Entries expire after
+METADATA_TTL seconds, because format URLs are signed and time-limited.
+"""
+import copy
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+SUBTITLE_LANGS = ["ko", "en", "ja", "zh", "es", "pt", "de", "fr"]
+MAX_ENTRIES = 64
+
+_cache: "OrderedDict[str, tuple]" = OrderedDict()  # video_id → (저장 시각, info)
+_cache_lock = threading.Lock()
+_inflight: Dict[str, threading.Lock] = {}  # 같은 영상 동시 요청은 한 번만 추출
+_stats = {"extractions": 0, "hits": 0}
+
+
+def _ttl() -> float:
+    return float(os.getenv("METADATA_TTL", "600"))
+
+
+def _base_opts() -> dict:
+    return {"quiet": True, "no_warnings": True}
+
+
+def _get_cached(video_id: str) -> Optional[dict]:
+    with _cache_lock:
+        entry = _cache.get(video_id)
+        if entry and time.time() - entry[0] < _ttl():
+            _cache.move_to_end(video_id)
+            return entry[1]
+        _cache.pop(video_id, None)
+        return None
+
+
+def resolve(video_id: str, url: str) -> Dict[str, Any]:
+    """Info dict for a video, extracted at most once per TTL (concurrent callers share it)."""
+    from yt_dlp import YoutubeDL
+
+    info = _get_cached(video_id)
+    if info is not None:
+        _stats["hits"] += 1
+        return info
+
+    with _cache_lock:
+        lock = _inflight.setdefault(video_id, threading.Lock())
+    with lock:
+        info = _get_cached(video_id)
+        if info is not None:
+            _stats["hits"] += 1
+            return info
+        start = time.time()
+        try:
+            with YoutubeDL(_base_opts()) as ydl:
+                # process=False: 포맷 선택/다운로드 없이 추출 결과만 (단계별로 process_ie_result 에서 이어서 처리)
+                info = ydl.extract_info(url, download=False, process=False)
+            _stats["extractions"] += 1
+            print(f"Extracted metadata for {video_id} in {time.time() - start:.1f}s")
+            with _cache_lock:
+                _cache[video_id] = (time.time(), info)
+                while len(_cache) > MAX_ENTRIES:
+                    _cache.popitem(last=False)
+        finally:
+            # 캐시에 넣은 뒤에 지워야 그 사이 도착한 요청이 새 잠금으로 다시 추출하지 않음
+            with _cache_lock:
+                _inflight.pop(video_id, None)
+    return info
+
+
+def cached(video_id: str) -> Optional[Dict[str, Any]]:
+    """Info dict if it is already in the cache (never triggers an extraction)."""
+    return _get_cached(video_id)
+
+
+def invalidate(video_id: str):
+    with _cache_lock:
+        _cache.pop(video_id, None)
+
+
+def _pick_subtitle(info: Dict[str, Any]) -> Optional[str]:
+    """VTT URL: uploaded subtitles first, then original-language auto captions, in SUBTITLE_LANGS order."""
+    manual = info.get("subtitles") or {}
+    automatic = info.get("automatic_captions") or {}
+    candidates = []
+    for lang in SUBTITLE_LANGS:
+        candidates += [tracks for code, tracks in manual.items() if code == lang or code.startswith(lang + "-")]
+    # 자동 자막은 모든 언어로 기계 번역본이 붙으므로 원어(-orig)를 우선
+    candidates += [tracks for code, tracks in automatic.items() if code.endswith("-orig")]
+    for lang in SUBTITLE_LANGS:
+        candidates += [tracks for code, tracks in automatic.items() if code == lang]
+    for tracks in candidates:
+        for track in tracks:
+            if track.get("ext") == "vtt" and track.get("url"):
+                return track["url"]
+    return None
+
+
+_CUE_TIME = re.compile(r"(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})")
+_INLINE_TAG = re.compile(r"<[^>]+>")
+
+
+def _cue_seconds(value: str) -> float:
+    hours, minutes, seconds, millis = _CUE_TIME.match(value.strip()).groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+
+
+def vtt_to_segments(content: str) -> List[Dict[str, Any]]:
+    """Timed cues from WebVTT, skipping repeated rolling-caption lines and inline timing tags."""
+    segments, seen_lines = [], set()
+    start = end = None
+    for line in content.splitlines():
+        line = line.strip()
+        if '-->' in line:
+            begin, _, rest = line.partition('-->')
+            try:
+                start, end = _cue_seconds(begin), _cue_seconds(rest.split()[0])
+            except (AttributeError, IndexError):
+                start = end = None
+            continue
+        if not line or line == 'WEBVTT' or start is None:
+            continue
+        line = _INLINE_TAG.sub("", line).strip()
+        if line and line not in seen_lines:
+            segments.append({"start": start, "end": end, "text": line})
+            seen_lines.add(line)
+    return segments
+
+
+def subtitle_segments(info: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Timed subtitle cues fetched directly from the caption URL in the info dict, or None."""
+    from yt_dlp import YoutubeDL
+
+    subtitle_url = _pick_subtitle(info)
+    if not subtitle_url:
+        return None
+    with YoutubeDL(_base_opts()) as ydl:
+        content = ydl.urlopen(subtitle_url).read().decode("utf-8", errors="replace")
+    return vtt_to_segments(content) or None
+
+
+def download(info: Dict[str, Any], opts: Dict[str, Any]):
+    """Run format selection + download on an already extracted info dict (no page re-fetch)."""
+    from yt_dlp import YoutubeDL
+
+    with YoutubeDL({**_base_opts(), **opts}) as ydl:
+        ydl.process_ie_result(copy.deepcopy(info), download=True)
+
+
+def stats() -> dict:
+    with _cache_lock:
+        return dict(_stats, cached=len(_cache))
@@ -0,0 +1,84 @@
+"""
+Negative cache for videos whose transcript extraction failed.
+
+A video with no captions that Whisper cannot transcribe either (music only,
+region-blocked, removed) would otherwise run the whole
+youtube_transcript_api → yt-dlp → Whisper chain again on every request.
+Failures are recorded per video ID in the state backend with their reason;
+the video is refused for a TTL that doubles with every consecutive failure.
+Transient reasons (blocked routes, a missing Whisper model, network errors)
+are never cached, and a successful analysis clears the record.
+"""
+import os
+import time
+from typing import Any, Dict, Optional
+
+from services.state import StateBackend
+
+# 사유 → (첫 차단 시간(초), 사용자 안내 문구)
+CACHEABLE_REASONS = {
+    "unavailable": (6 * 3600, "삭제되었거나 비공개/지역 제한으로 재생할 수 없는 영상입니다."),
+    "no_speech": (3600, "자막이 없고 음성도 인식되지 않는 영상입니다 (음악 위주 영상 등)."),
+    "transcription_failed": (1800, "자막이 없고 음성 인식에도 실패한 영상입니다."),
+}
+MAX_TTL = 7 * 24 * 3600
+
+
+class NegativeCache:
+    def __init__(self, state: StateBackend):
+        self.state = state
+        self.stats = {"hits": 0, "recorded": 0}
+
+    @staticmethod
+    def _enabled() -> bool:
+        return os.getenv("NEGATIVE_CACHE", "1") == "1"
+
+    def check(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """Active failure record (with `retry_after` seconds) if the video should be refused."""
+        if not video_id or not self._enabled():
+            return None
+        record = self.state.failure_get(video_id)
+        if not record:
+            return None
+        retry_after = int(record["expires_at"] - time.time())
+        if retry_after <= 0:
+            # 만료된 기록은 연속 실패 횟수 계산용으로 남겨 둠
+            return None
+        self.stats["hits"] += 1
+        return dict(record, retry_after=retry_after)
+
+    def record(self, video_id: str, reason: str, detail: str = "") -> Optional[Dict[str, Any]]:
+        """Store a failure; returns the record, or None for reasons that are not cached."""
+        if not video_id or reason not in CACHEABLE_REASONS or not self._enabled():
+            return None
+        now = time.time()
+        previous = self.state.failure_get(video_id) or {}
+        failures = previous.get("failures", 0) + 1
+        base_ttl = CACHEABLE_REASONS[reason][0]
+        ttl = min(MAX_TTL, base_ttl * 2 ** (failures - 1))
+        record = {
+            "reason": reason,
+            "detail": detail,
+            "failures": failures,
+            "first_failed_at": previous.get("first_failed_at", now),
+            "expires_at": now + ttl,
+        }
+        self.state.failure_set(video_id, record)
+        self.stats["recorded"] += 1
+        print(f"Negative-cached {video_id} ({reason}, failure #{failures}) for {ttl // 60:.0f} min")
+        return record
+
+    def clear(self, video_id: str):
+        self.state.failure_delete(video_id)
+
+    def status(self) -> Dict[str, Any]:
+        return dict(self.stats, entries=self.state.failure_count(), enabled=self._enabled())
+
+
+def describe(record: Dict[str, Any]) -> str:
+    """User-facing explanation with the retry time."""
+    message = CACHEABLE_REASONS.get(record["reason"], (0, "자막을 추출할 수 없는 영상입니다."))[1]
+    remaining = record["retry_after"]
+    hours, minutes = remaining // 3600, (remaining % 3600) // 60
+    wait = f"{hours}시간 {minutes}분" if hours else f"{max(minutes, 1)}분"
+    return f"{message} 최근 {record['failures']}회 연속 실패하여 {wait} 후에 다시 시도할 수 있습니다."
@@ -0,0 +1,644 @@
+"""
+Popular Shorts per category: collection, atomic publish and in-memory view.
+
+Collection (YouTube Data API search → video details → channel subscribers,
+filtered and ranked by views per subscriber) is shared by
+scripts/update_videos.py and the optional in-app scheduler.
+
+Publishing merges the refreshed categories into the current file (under a
+cross-process file lock, so concurrent publishers keep each other's
+categories), writes a temp file in the same directory and renames it over
+popular_videos.json, so a reader (this process, another worker, the
+template script) sees either the old file or the new one, never a
+half-written one. PopularVideos keeps the parsed file in memory. Readers
+get the current dict without taking a lock, and a changed file (the
+script, another worker) is reloaded by whichever reader notices it first
+while the others keep using the previous view.
+
+The scheduler refreshes each category on its own interval, using the
+per-category timestamps stored in the file, so a restart does not refresh
+everything at once.
+
+API calls are charged to a QuotaLedger. plan_refresh orders the requested
+categories by priority × staleness and budgets each one's worst-case cost
+against the units left today. Categories that do not fit are skipped and
+keep their last published list until the quota resets.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from services.filelock import file_lock
+from services.quota import COSTS, QuotaExhausted, QuotaLedger, is_quota_error, seconds_until_reset
+
+# 카테고리 정의 (메인 검색어, 대체 검색어)
+CATEGORIES = {
+    "health": ("건강 쇼츠", "건강 유튜브"),
+    "finance": ("재테크 쇼츠", "재테크 유튜브"),
+    "food": ("요리 레시피 쇼츠", "요리 유튜브"),
+    "tech": ("IT 쇼츠", "IT 유튜브"),
+    "selfdev": ("자기계발 쇼츠", "자기계발 유튜브"),
+    "beauty": ("뷰티 쇼츠", "뷰티 유튜브"),
+    "travel": ("여행 쇼츠", "여행 유튜브"),
+    "game": ("게임 쇼츠", "게임 유튜브"),
+    "pet": ("반려동물 쇼츠", "반려동물 유튜브"),
+    "humor": ("유머 쇼츠", "유머 유튜브"),
+}
+
+# 필터 조건
+MIN_SUBSCRIBERS = 1_000       # 최소 구독자 1,000명
+MAX_SUBSCRIBERS = 1_000_000   # 최대 구독자 100만명
+MIN_VIEWS = 10_000            # 최소 조회수 1만
+MIN_VIRAL_RATIO = 2.0         # 최소 바이럴 지수 2배
+TOP_N = 10
+
+FILTER_CONFIG = {
+    "min_subscribers": MIN_SUBSCRIBERS,
+    "max_subscribers": MAX_SUBSCRIBERS,
+    "min_views": MIN_VIEWS,
+    "min_viral_ratio": MIN_VIRAL_RATIO,
+}
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# 카테고리 1개 수집의 최악 비용: 검색 2회(대체 검색어 포함) + 영상 상세 1회 + 채널 1회(50개 이하)
+CATEGORY_WORST_COST = 2 * COSTS["search"] + COSTS["videos"] + COSTS["channels"]
+
+
+def get_youtube_client():
+    """YouTube Data API v3 client (raises ValueError without GOOGLE_API_KEY)."""
+    from googleapiclient.discovery import build
+
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY 환경변수가 설정되지 않았습니다.")
+    return build("youtube", "v3", developerKey=api_key, cache_discovery=False)
+
+
+def format_count(count: int) -> str:
+    """12300 -> '1.2만'"""
+    if count >= 100_000_000:
+        return f"{count / 100_000_000:.1f}억"
+    elif count >= 10_000:
+        return f"{count / 10_000:.1f}만"
+    elif count >= 1_000:
+        return f"{count / 1_000:.1f}천"
+    else:
+        return str(count)
+
+
+def format_duration(iso_duration: str) -> str:
+    """ISO 8601 duration -> '1:30' (PT1M30S)"""
+    duration = iso_duration.replace("PT", "")
+
+    hours = 0
+    minutes = 0
+    seconds = 0
+
+    if "H" in duration:
+        hours, duration = duration.split("H")
+        hours = int(hours)
+    if "M" in duration:
+        minutes, duration = duration.split("M")
+        minutes = int(minutes)
+    if "S" in duration:
+        seconds = int(duration.replace("S", ""))
+
+    if hours > 0:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    else:
+        return f"{minutes}:{seconds:02d}"
+
+
+def format_relative_time(published_at: str) -> str:
+    """ISO timestamp -> relative label such as '3일 전'."""
+    try:
+        # ISO 형식 파싱 (예: 2025-12-23T10:30:00Z)
+        pub_date = datetime.fromisoformat(published_at.replace("Z", "+00:00"))
+        now = datetime.now(timezone.utc)
+        diff = now - pub_date
+
+        days = diff.days
+        hours = diff.seconds // 3600
+
+        if days == 0:
+            if hours < 1:
+                return "방금 전"
+            return f"{hours}시간 전"
+        elif days == 1:
+            return "1일 전"
+        elif days < 7:
+            return f"{days}일 전"
+        elif days < 30:
+            weeks = days // 7
+            return f"{weeks}주 전"
+        else:
+            months = days // 30
+            return f"{months}개월 전"
+    except Exception:
+        return ""
+
+
+def _charge(ledger: Optional[QuotaLedger], kind: str, calls: int = 1):
+    if ledger is not None:
+        ledger.spend(kind, calls)
+
+
+def _api_error(ledger: Optional[QuotaLedger], error: Exception):
+    if ledger is not None and is_quota_error(error):
+        ledger.mark_exhausted()
+
+
+def search_shorts(youtube, query: str, max_results: int = 50, ledger: Optional[QuotaLedger] = None) -> list:
+    """Shorts uploaded in the last 7 days by view count (more than needed, filtered later)."""
+    from googleapiclient.errors import HttpError
+
+    _charge(ledger, "search")
+    published_after = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+
+    try:
+        search_response = youtube.search().list(
+            q=query,
+            part="id,snippet",
+            type="video",
+            videoDuration="short",
+            publishedAfter=published_after,
+            order="viewCount",
+            maxResults=max_results,  # 필터링을 위해 더 많이 가져옴
+            regionCode="KR",
+            relevanceLanguage="ko",
+        ).execute()
+
+        return search_response.get("items", [])
+
+    except HttpError as e:
+        _api_error(ledger, e)
+        print(f"  검색 오류 ({query}): {e}")
+        return []
+
+
+def get_channel_subscribers(youtube, channel_ids: list, ledger: Optional[QuotaLedger] = None) -> dict:
+    """Subscriber count per channel ID (hidden counts are 0)."""
+    from googleapiclient.errors import HttpError
+
+    if not channel_ids:
+        return {}
+
+    # 중복 제거
+    unique_ids = list(set(channel_ids))
+
+    try:
+        # 50개씩 분할 (API 제한)
+        subscribers = {}
+        for i in range(0, len(unique_ids), 50):
+            batch = unique_ids[i:i+50]
+            _charge(ledger, "channels")
+            response = youtube.channels().list(
+                part="statistics",
+                id=",".join(batch),
+            ).execute()
+
+            for item in response.get("items", []):
+                channel_id = item["id"]
+                stats = item.get("statistics", {})
+                # 구독자 수가 숨겨진 경우 0으로 처리
+                sub_count = int(stats.get("subscriberCount", 0))
+                subscribers[channel_id] = sub_count
+
+        return subscribers
+
+    except HttpError as e:
+        _api_error(ledger, e)
+        print(f"  채널 정보 조회 오류: {e}")
+        return {}
+
+
+def get_video_details(youtube, video_ids: list, ledger: Optional[QuotaLedger] = None) -> dict:
+    """Video details (including the channel ID) per video ID."""
+    from googleapiclient.errors import HttpError
+
+    if not video_ids:
+        return {}
+
+    _charge(ledger, "videos")
+    try:
+        videos_response = youtube.videos().list(
+            part="snippet,statistics,contentDetails",
+            id=",".join(video_ids),
+        ).execute()
+
+        details = {}
+        for item in videos_response.get("items", []):
+            video_id = item["id"]
+            snippet = item.get("snippet", {})
+            statistics = item.get("statistics", {})
+            content_details = item.get("contentDetails", {})
+
+            view_count = int(statistics.get("viewCount", 0))
+
+            details[video_id] = {
+                "id": video_id,
+                "title": snippet.get("title", ""),
+                "channel": snippet.get("channelTitle", ""),
+                "channel_id": snippet.get("channelId", ""),
+                "views_raw": view_count,
+                "views": format_count(view_count),
+                "duration": format_duration(content_details.get("duration", "PT0S")),
+                "uploaded_at": format_relative_time(snippet.get("publishedAt", "")),
+                "url": f"https://www.youtube.com/shorts/{video_id}",
+            }
+
+        return details
+
+    except HttpError as e:
+        _api_error(ledger, e)
+        print(f"  비디오 상세 조회 오류: {e}")
+        return {}
+
+
+def fetch_category(youtube, category: str, ledger: Optional[QuotaLedger] = None,
+                   observations: Optional[list] = None) -> list:
+    """
+    Viral Shorts of one category: filtered, sorted by viral ratio, top TOP_N.
+    Raises QuotaExhausted when the ledger cannot pay for the next call.
+    `observations`, if given, receives the raw counts of every fetched video
+    (filtered out or not) for the velocity history.
+    """
+    main_query, fallback_query = CATEGORIES[category]
+
+    print(f"[{category}] 검색 중: '{main_query}'")
+    search_results = search_shorts(youtube, main_query, max_results=50, ledger=ledger)
+
+    if not search_results:
+        print(f"  결과 없음. 대체 검색어로 재시도: '{fallback_query}'")
+        search_results = search_shorts(youtube, fallback_query, max_results=50, ledger=ledger)
+
+    if not search_results:
+        print(f"  [{category}] 검색 결과 없음")
+        return []
+
+    # 비디오 ID 추출
+    video_ids = [item["id"]["videoId"] for item in search_results if "videoId" in item.get("id", {})]
+
+    if not video_ids:
+        return []
+
+    # 비디오 상세 정보 조회
+    details = get_video_details(youtube, video_ids, ledger=ledger)
+
+    if not details:
+        return []
+
+    # 채널 ID 수집 및 구독자 수 조회
+    channel_ids = [d["channel_id"] for d in details.values() if d.get("channel_id")]
+    subscribers = get_channel_subscribers(youtube, channel_ids, ledger=ledger)
+
+    # 바이럴 지수 계산 및 필터링
+    filtered_videos = []
+
+    for video_id, video in details.items():
+        channel_id = video.get("channel_id", "")
+        sub_count = subscribers.get(channel_id, 0)
+        view_count = video.get("views_raw", 0)
+        if observations is not None:
+            observations.append({"id": video_id, "views": view_count, "subscribers": sub_count})
+
+        # 필터 조건 체크
+        if sub_count < MIN_SUBSCRIBERS:
+            continue
+        if sub_count > MAX_SUBSCRIBERS:
+            continue
+        if view_count < MIN_VIEWS:
+            continue
+
+        # 바이럴 지수 계산
+        viral_ratio = view_count / sub_count if sub_count > 0 else 0
+
+        if viral_ratio < MIN_VIRAL_RATIO:
+            continue
+
+        video["subscribers_raw"] = sub_count
+        video["subscribers"] = format_count(sub_count)
+        video["viral_ratio"] = round(viral_ratio, 1)
+        filtered_videos.append(video)
+
+    # 바이럴 지수 내림차순 정렬
+    filtered_videos.sort(key=lambda x: x.get("viral_ratio", 0), reverse=True)
+
+    top_videos = filtered_videos[:TOP_N]
+
+    # 정렬용 필드 제거
+    for v in top_videos:
+        v.pop("views_raw", None)
+        v.pop("subscribers_raw", None)
+        v.pop("channel_id", None)
+
+    print(f"  [{category}] 필터 통과: {len(filtered_videos)}개 → 상위 {len(top_videos)}개 선택")
+    return top_videos
+
+
+def write_atomic(path: Path, data: Dict[str, Any]):
+    """Write JSON to a temp file in the same directory, then rename it over `path`."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 워커/스크립트가 동시에 써도 임시 파일이 겹치지 않도록 PID 포함
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+class PopularVideos:
+    """In-memory view of popular_videos.json, swapped as a whole on every change."""
+
+    def __init__(self, path: Path, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._data: Dict[str, Any] = {}
+        self._mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()  # 다시 읽기/쓰기끼리만 직렬화, 읽는 쪽은 잠그지 않음
+
+    def _stat(self) -> Optional[int]:
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def get(self) -> Dict[str, Any]:
+        """Current data; picks up changes made by other processes at most every check_interval."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            if self._stat() != self._mtime and self._lock.acquire(blocking=False):
+                # 다른 스레드가 이미 다시 읽는 중이면 이번 요청은 이전 데이터로 응답
+                try:
+                    mtime = self._stat()
+                    if mtime != self._mtime:
+                        self._data, self._mtime = (self._read() if mtime is not None else {}), mtime
+                finally:
+                    self._lock.release()
+        return self._data
+
+    def categories(self) -> Dict[str, list]:
+        return self.get().get("categories", {})
+
+    def category_urls(self) -> Dict[str, list]:
+        return {
+            category: [video["url"] for video in videos if video.get("url")]
+            for category, videos in self.categories().items()
+        }
+
+    def category_updated_at(self, category: str) -> Optional[float]:
+        """Epoch seconds of the category's last refresh (files without per-category stamps use updated_at)."""
+        data = self.get()
+        stamp = data.get("category_updated_at", {}).get(category)
+        if stamp is None and category in data.get("categories", {}):
+            stamp = data.get("updated_at")
+        try:
+            return datetime.strptime(stamp, TIME_FORMAT).timestamp() if stamp else None
+        except ValueError:
+            return None
+
+    def publish(self, updates: Dict[str, list]) -> Dict[str, Any]:
+        """
+        Merge refreshed categories into the file (re-read first), write atomically, swap the view.
+        The re-read and replace run under a cross-process file lock, so the script and the
+        server (or two workers) publishing different categories do not drop each other's.
+        """
+        with self._lock, file_lock(self.path):
+            current = self._read()
+            now = datetime.now().strftime(TIME_FORMAT)
+            categories = dict(current.get("categories", {}))
+            stamps = dict(current.get("category_updated_at", {}))
+            for category, videos in updates.items():
+                categories[category] = videos
+                stamps[category] = now
+            data = {
+                "updated_at": now,
+                "filter_config": FILTER_CONFIG,
+                "categories": categories,
+                "category_updated_at": stamps,
+            }
+            write_atomic(self.path, data)
+            self._data, self._mtime = data, self._stat()
+            return data
+
+
+def parse_category_values(default: float, spec: str) -> Dict[str, float]:
+    """Per-category numbers from a spec like "humor=6,game=12"; unlisted categories get `default`."""
+    values = {category: default for category in CATEGORIES}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        category, _, value = part.partition("=")
+        if category.strip() not in CATEGORIES:
+            print(f"Unknown popular-videos category in spec: {category!r}")
+            continue
+        try:
+            values[category.strip()] = float(value)
+        except ValueError:
+            print(f"Invalid value for {category}: {value!r}")
+    return values
+
+
+def parse_intervals(default_hours: float, spec: str) -> Dict[str, float]:
+    """Refresh interval in seconds per category; spec like "humor=6,game=12" (hours) overrides the default."""
+    # 0 이하면 해당 카테고리는 자동 갱신하지 않음
+    return {
+        category: hours * 3600
+        for category, hours in parse_category_values(default_hours, spec).items()
+        if hours > 0
+    }
+
+
+def plan_refresh(store: PopularVideos, categories: List[str], ledger: QuotaLedger,
+                 intervals: Dict[str, float], priorities: Dict[str, float]) -> List[Dict[str, Any]]:
+    """
+    Order categories by priority × staleness (age / refresh interval; never
+    fetched comes first) and mark each "fetch" while today's remaining quota
+    covers its worst-case cost, "skip" after that. Makes no API calls.
+    """
+    now = time.time()
+    rows = []
+    for category in categories:
+        updated_at = store.category_updated_at(category)
+        interval = intervals.get(category) or 24 * 3600
+        priority = priorities.get(category, 1.0)
+        staleness = (now - updated_at) / interval if updated_at else None
+        rows.append({
+            "category": category,
+            "priority": priority,
+            "age_hours": round((now - updated_at) / 3600, 1) if updated_at else None,
+            "staleness": round(staleness, 2) if staleness is not None else None,
+            # 한 번도 수집하지 않은 카테고리가 먼저, 그 안에서는 우선순위 순
+            "urgency": (priority > 0, staleness is None, priority if staleness is None else priority * staleness),
+            "has_snapshot": bool(store.categories().get(category)),
+        })
+    rows.sort(key=lambda row: row["urgency"], reverse=True)
+
+    budget = ledger.available()
+    for row in rows:
+        row["estimated_cost"] = CATEGORY_WORST_COST
+        del row["urgency"]
+        if row["priority"] <= 0:
+            row["action"], row["reason"] = "skip", "priority 0"
+        elif budget >= CATEGORY_WORST_COST:
+            row["action"], row["reason"] = "fetch", ""
+            budget -= CATEGORY_WORST_COST
+        else:
+            # 할당량이 모자라면 수집하지 않고 마지막으로 게시된 목록을 그대로 사용
+            row["action"] = "skip"
+            row["reason"] = "quota: reuse last snapshot" if row["has_snapshot"] else "quota: no snapshot yet"
+    return rows
+
+
+class PopularRefresher:
+    """
+    Background scheduler refreshing each category when its interval has passed.
+
+    Due categories are planned against the quota ledger first; the ones that
+    do not fit wait for the quota reset. The rest are fetched one at a time in
+    the threadpool (the API client blocks) and each one is published as soon
+    as it is done. A category whose fetch came back empty (API errors) keeps
+    its previous list and is retried after `retry_delay` instead of its full
+    interval. Only one refresh runs at a time (the API client is not
+    thread-safe, and overlapping runs would fetch and pay for the same
+    category twice): the scheduler waits for a manual refresh to finish,
+    and callers can check `busy` to turn a manual one away.
+    """
+
+    def __init__(self, store: PopularVideos, intervals: Dict[str, float], ledger: QuotaLedger,
+                 priorities: Optional[Dict[str, float]] = None, retry_delay: float = 3600.0, tick: float = 60.0,
+                 history=None):
+        self.store = store
+        self.history = history  # VideoHistory: 수집할 때마다 조회수 관측값 누적
+        self.intervals = intervals
+        self.ledger = ledger
+        self.priorities = priorities or {}
+        self.retry_delay = retry_delay
+        self.tick = tick
+        self._retry_at: Dict[str, float] = {}
+        self._youtube = None
+        self._lock = asyncio.Lock()
+        self.stats = {
+            "refreshed": 0, "empty": 0, "failed": 0, "skipped_quota": 0,
+            "last_refresh": None, "last_error": None, "last_plan": [],
+        }
+
+    def next_due(self, category: str) -> float:
+        updated_at = self.store.category_updated_at(category)
+        due = (updated_at or 0.0) + self.intervals[category]
+        return max(due, self._retry_at.get(category, 0.0))
+
+    def due_categories(self) -> List[str]:
+        now = time.time()
+        return sorted((c for c in self.intervals if self.next_due(c) <= now), key=self.next_due)
+
+    def _fetch(self, category: str) -> list:
+        if self._youtube is None:
+            self._youtube = get_youtube_client()
+        observations: list = []
+        try:
+            return fetch_category(self._youtube, category, self.ledger, observations)
+        finally:
+            if self.history is not None and observations:
+                try:
+                    self.history.append(category, observations)
+                except Exception as e:
+                    print(f"Video history append failed for {category}: {e}")
+
+    def plan(self, categories: List[str]) -> List[Dict[str, Any]]:
+        return plan_refresh(self.store, categories, self.ledger, self.intervals, self.priorities)
+
+    def _wait_for_quota(self, category: str):
+        self.stats["skipped_quota"] += 1
+        self._retry_at[category] = time.time() + seconds_until_reset()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    async def refresh(self, categories: List[str]) -> List[str]:
+        """Refresh the given categories now (as far as the quota allows); returns the ones published."""
+        async with self._lock:
+            return await self._refresh(categories)
+
+    async def _refresh(self, categories: List[str]) -> List[str]:
+        if not categories:
+            return []
+        plan = await run_in_threadpool(self.plan, categories)
+        self.stats["last_plan"] = plan
+        published = []
+        for row in plan:
+            category = row["category"]
+            if row["action"] != "fetch":
+                if row["reason"].startswith("quota"):
+                    self._wait_for_quota(category)
+                continue
+            try:
+                videos = await run_in_threadpool(self._fetch, category)
+            except QuotaExhausted as e:
+                # 계획보다 많이 쓴 경우(다른 프로세스 사용 등): 남은 카테고리는 할당량 초기화 후에
+                print(f"Popular videos refresh stopped at {category}: {e}")
+                for rest in plan[plan.index(row):]:
+                    if rest["action"] == "fetch":
+                        self._wait_for_quota(rest["category"])
+                break
+            except Exception as e:
+                print(f"Popular videos refresh failed for {category}: {e}")
+                self.stats["failed"] += 1
+                self.stats["last_error"] = f"{category}: {e}"
+                self._retry_at[category] = time.time() + self.retry_delay
+                continue
+            if not videos:
+                self.stats["empty"] += 1
+                self._retry_at[category] = time.time() + self.retry_delay
+                continue
+            await run_in_threadpool(self.store.publish, {category: videos})
+            self._retry_at.pop(category, None)
+            self.stats["refreshed"] += 1
+            self.stats["last_refresh"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            published.append(category)
+        return published
+
+    async def run(self):
+        while True:
+            try:
+                # 수동 갱신이 끝나길 기다린 뒤 그 결과를 반영해 다시 고름
+                async with self._lock:
+                    await self._refresh(self.due_categories())
+            except Exception as e:
+                print(f"Popular videos scheduler error: {e}")
+            await asyncio.sleep(self.tick)
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        return dict(
+            self.stats,
+            categories={
+                category: {
+                    "interval_hours": round(seconds / 3600, 2),
+                    "next_in_minutes": max(0, round((self.next_due(category) - now) / 60)),
+                }
+                for category, seconds in self.intervals.items()
+            },
+            quota=self.ledger.status(),
+        )
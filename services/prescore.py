@@ -0,0 +1,186 @@
+"""
+Deterministic structural pre-score computed from a timed transcript.
+
+Some signals need no model: how long the hook runs, whether the opening
+asks a question, promises a number or uses strong wording, the speaking
+rate, emotional wording, and a call to action near the end. This scorer
+reads them from transcript segments in a few milliseconds. It returns a
+preliminary score in the same shape as analyze_structure's score
+breakdown, so the UI can show something while Gemini runs and bulk
+triage can rank many videos without calling the model.
+"""
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+SCORE_WEIGHTS = {"후킹": 0.35, "전환": 0.25, "감정": 0.15, "CTA": 0.25}
+
+HOOK_MAX_SEGMENTS = 3  # 첫 문장이 끝나지 않아도 이 구간 수까지를 훅으로 봄
+# 신호 단어도 부분 문자열이 아니라 패턴으로 매칭: 영어는 단어 경계 ("show"의 how, "nevertheless"의 never 제외),
+# 한국어는 조사가 붙으므로 어간 그대로 두고 짧은 단어만 앞뒤 글자를 확인
+QUESTION_PATTERNS = (
+    r"\?",
+    r"(?<![가-힣])왜(?!냐)",
+    r"어떻게", r"무엇", r"(?<![가-힣])뭘", r"뭐가", r"(?<![가-힣])어떤", r"혹시", r"아세요", r"알고\s?계",
+    r"\bwhy\b", r"\bhow\b", r"\bwhat\b(?!ever)",
+)
+STRONG_PATTERNS = (
+    r"절대", r"충격", r"비밀", r"무조건", r"반드시", r"최악", r"최고의", r"실수", r"이것만", r"(?<![가-힣])딱(?=\s)",
+    r"\bnever\b", r"\bsecrets?\b", r"\bmistakes?\b", r"\bstop\b",
+)
+EMOTION_PATTERNS = (
+    r"대박", r"진짜", r"놀라", r"감동", r"행복", r"소름", r"미쳤", r"레전드", r"최고", r"웃기", r"무서", r"슬프", r"화나",
+    r"\bamazing\b", r"\bcrazy\b", r"\binsane(?:ly)?\b",
+)
+_QUESTION = [re.compile(pattern, re.IGNORECASE) for pattern in QUESTION_PATTERNS]
+_STRONG = [re.compile(pattern, re.IGNORECASE) for pattern in STRONG_PATTERNS]
+_EMOTION = [re.compile(pattern, re.IGNORECASE) for pattern in EMOTION_PATTERNS]
+# CTA 는 단어 단독이 아니라 행동을 요청하는 표현만 인정 ("맛이 좋아요", "likely" 등 오탐 방지)
+CTA_PATTERNS = (
+    r"구독\s?(부탁|해\s?주|하시|하세요|하고|눌러|버튼|과\s?좋아요)",
+    r"좋아요\s?(눌러|부탁|버튼|한\s?번|꾹|와\s?구독)",
+    r"댓글\s?(로|에|남겨|달아|써|부탁)",
+    r"알림\s?(설정|켜)",
+    r"팔로우\s?(해|부탁|하고|하세요)",
+    r"공유\s?(해|부탁|하세요)",
+    r"저장\s?(해\s?두|해\s?놓|하세요)",
+    r"(프로필|설명란|고정\s?댓글|더보기)\s?(의|에|에\s?있는)?\s?링크",
+    r"\bsubscribe\b",
+    r"\b(hit|smash|tap)\s+(the\s+)?like\b",
+    r"\blike\s+(this|the)\s+video\b",
+    r"\b(leave|drop)\s+a\s+comment\b",
+    r"\bcomment\s+below\b",
+    r"\bfollow\s+(me|us|for)\b",
+    r"\bshare\s+(this|it)\b",
+    r"\blink\s+in\s+(my\s+|the\s+)?(bio|description)\b",
+    r"\bturn\s+on\s+notifications\b",
+)
+_CTA = [re.compile(pattern, re.IGNORECASE) for pattern in CTA_PATTERNS]
+CTA_TAIL_SHARE = 0.25  # 영상 마지막 25% 안의 CTA만 "끝부분 CTA"로 인정
+
+_NUMBER = re.compile(r"\d+|[한두세네다섯]\s?(가지|개|번|초|분|단계)|(첫|두|세)\s?번째|top\s?\d", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"([.?!]|다|요|죠|까)[\s\"']*$")
+_HANGUL = re.compile(r"[가-힣]")
+
+# 말하기 속도 적정 범위: 한국어는 초당 음절, 그 외는 초당 단어
+RATE_RANGES = {"syllables/s": (5.0, 8.0), "words/s": (2.3, 3.6)}
+
+
+def _matches(text: str, patterns) -> List[str]:
+    """First match of each compiled pattern found in text."""
+    return [match.group(0).lower() for pattern in patterns for match in [pattern.search(text)] if match]
+
+
+def _clamp(value: float) -> int:
+    return int(round(min(max(value, 0), 100)))
+
+
+def _fallback_segments(text: str, duration: Optional[float]) -> List[Dict[str, Any]]:
+    """Split plain text into sentences with times spread by length (when no timing is known)."""
+    sentences = [s.strip() for s in re.split(r"(?<=[.?!])\s+", text) if s.strip()]
+    total_chars = sum(len(s) for s in sentences) or 1
+    seconds_per_char = (duration or total_chars / 7.0) / total_chars
+    segments, cursor = [], 0.0
+    for sentence in sentences:
+        end = cursor + len(sentence) * seconds_per_char
+        segments.append({"start": cursor, "end": end, "text": sentence})
+        cursor = end
+    return segments
+
+
+def _hook(segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    parts, end = [], 0.0
+    for segment in segments[:HOOK_MAX_SEGMENTS]:
+        parts.append(segment["text"].strip())
+        end = segment["end"]
+        if _SENTENCE_END.search(segment["text"].strip()):
+            break
+    text = " ".join(parts)
+    signals = []
+    if _matches(text, _QUESTION):
+        signals.append("question")
+    if _NUMBER.search(text):
+        signals.append("number")
+    if _matches(text, _STRONG):
+        signals.append("strong_claim")
+
+    score = 40 + 20 * ("question" in signals) + 15 * ("number" in signals) + 15 * ("strong_claim" in signals)
+    # 짧고 빠른 훅일수록 이탈이 적음
+    score += 10 if end <= 3 else 5 if end <= 6 else -10 if end > 10 else 0
+    return {"detected": bool(signals), "end": round(end, 1), "text": text[:120], "signals": signals, "score": _clamp(score)}
+
+
+def _pacing(segments: List[Dict[str, Any]], text: str, duration: float) -> Dict[str, Any]:
+    spoken = sum(max(s["end"] - s["start"], 0) for s in segments) or duration or 1.0
+    hangul = len(_HANGUL.findall(text))
+    if hangul >= len(text.replace(" ", "")) * 0.5:
+        unit, amount = "syllables/s", hangul
+    else:
+        unit, amount = "words/s", len(text.split())
+    rate = amount / spoken
+    low, high = RATE_RANGES[unit]
+    if rate < low:
+        rate_score = 100 - (low - rate) / low * 150
+    elif rate > high:
+        rate_score = 100 - (rate - high) / high * 150
+    else:
+        rate_score = 100
+
+    # 구간 사이 1.5초 이상 공백은 흐름이 끊기는 지점
+    gaps = sum(1 for a, b in zip(segments, segments[1:]) if b["start"] - a["end"] > 1.5)
+    gap_penalty = min(30, gaps / max(len(segments) - 1, 1) * 100)
+    return {"rate": round(rate, 2), "unit": unit, "long_pauses": gaps, "score": _clamp(rate_score * 0.8 + 20 - gap_penalty)}
+
+
+def _cta(segments: List[Dict[str, Any]], duration: float) -> Dict[str, Any]:
+    tail_start = duration * (1 - CTA_TAIL_SHARE)
+    tail_phrases, anywhere, start = [], [], None
+    for segment in segments:
+        found = _matches(segment["text"], _CTA)
+        if not found:
+            continue
+        anywhere += found
+        if segment["end"] >= tail_start:
+            tail_phrases += found
+            start = segment["start"] if start is None else start
+    phrases = sorted(set(tail_phrases or anywhere))
+    score = 85 + 5 * min(len(set(tail_phrases)), 3) if tail_phrases else 55 if anywhere else 20
+    return {
+        "detected": bool(tail_phrases),
+        "start": round(start, 1) if start is not None else None,
+        "phrases": phrases,
+        "score": _clamp(score),
+    }
+
+
+def _emotion(text: str, duration: float) -> int:
+    hits = sum(len(pattern.findall(text)) for pattern in _EMOTION) + text.count("!")
+    per_minute = hits / max(duration / 60, 0.25)
+    return _clamp(35 + per_minute * 12)
+
+
+def prescore(transcript: Dict[str, Any]) -> Dict[str, Any]:
+    """Preliminary score + hook/CTA detection from get_transcript's result."""
+    started = time.perf_counter()
+    text = (transcript.get("text") or "").strip()
+    segments = [s for s in transcript.get("segments") or [] if (s.get("text") or "").strip()]
+    if not segments:
+        segments = _fallback_segments(text, transcript.get("duration"))
+    duration = float(transcript.get("duration") or (segments[-1]["end"] if segments else 0) or 1.0)
+
+    hook = _hook(segments)
+    pacing = _pacing(segments, text, duration)
+    cta = _cta(segments, duration)
+    emotion = _emotion(text, duration)
+
+    breakdown = {"후킹": hook.pop("score"), "전환": pacing.pop("score"), "감정": emotion, "CTA": cta.pop("score")}
+    score = sum(breakdown[name] * weight for name, weight in SCORE_WEIGHTS.items())
+    return {
+        "preliminary_score": _clamp(score),
+        "score_breakdown": [{"name": name, "score": value} for name, value in breakdown.items()],
+        "hook": hook,
+        "cta": cta,
+        "speaking_rate": pacing,
+        "duration": round(duration, 1),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
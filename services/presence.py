@@ -0,0 +1,82 @@
+"""
+Presence tracking where an open WebSocket *is* the heartbeat.
+
+Tabs keep one WebSocket open to /ws/presence; connecting and disconnecting
+only update in-process sets on the event loop. A single flush loop writes
+every live session to the state backend in one batch, so sessions survive
+the heartbeat timeout and other workers see them. The plain-HTTP fallback
+(for clients without WebSocket) just marks the session in the same sets.
+"""
+import asyncio
+import time
+from typing import Dict, Set
+
+from starlette.concurrency import run_in_threadpool
+
+from services.state import StateBackend
+
+
+class PresenceHub:
+    def __init__(self, state: StateBackend, timeout: float, flush_interval: float = 10.0):
+        self.state = state
+        self.timeout = timeout
+        self.flush_interval = flush_interval
+        self._connections: Dict[str, int] = {}  # 세션 ID → 이 프로세스에 열린 연결 수
+        self._touched: Set[str] = set()  # 다음 flush 때 기록할 HTTP 폴백 세션
+        self._left: Set[str] = set()
+        self.active_users = 0  # 마지막 flush 시점의 전체 접속자 수 (응답용 캐시)
+        self.stats = {"flushes": 0, "last_flush_ms": None}
+
+    @property
+    def connections(self) -> int:
+        return sum(self._connections.values())
+
+    def connect(self, session_id: str):
+        self._connections[session_id] = self._connections.get(session_id, 0) + 1
+        self._touched.add(session_id)
+        self._left.discard(session_id)
+
+    def disconnect(self, session_id: str):
+        remaining = self._connections.get(session_id, 0) - 1
+        if remaining > 0:
+            self._connections[session_id] = remaining
+            return
+        self._connections.pop(session_id, None)
+        self._touched.discard(session_id)
+        self._left.add(session_id)
+
+    def touch(self, session_id: str):
+        """HTTP fallback heartbeat; recorded on the next flush."""
+        self._touched.add(session_id)
+        self._left.discard(session_id)
+
+    def leave(self, session_id: str):
+        if session_id not in self._connections:
+            self._touched.discard(session_id)
+            self._left.add(session_id)
+
+    def _write(self, alive, left):
+        start = time.perf_counter()
+        self.state.touch_sessions(alive, time.time())
+        for session_id in left:
+            self.state.remove_session(session_id)
+        self.active_users = self.state.count_active_sessions(self.timeout)
+        self.stats["flushes"] += 1
+        self.stats["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    async def flush(self):
+        alive = list(set(self._connections) | self._touched)
+        left = list(self._left)
+        self._touched, self._left = set(), set()
+        await run_in_threadpool(self._write, alive, left)
+
+    async def run(self):
+        while True:
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Presence flush failed: {e}")
+            await asyncio.sleep(self.flush_interval)
+
+    def status(self) -> dict:
+        return dict(self.stats, connections=self.connections, sessions=len(self._connections))
@@ -0,0 +1,339 @@
+"""
+On-demand CPU and memory profiling of the live process.
+
+CPU: an admin arms a session for the next N matching requests or a time
+window, whichever ends first. While a profiled request is in flight, a
+sampler thread reads every thread's stack via sys._current_frames() at a
+fixed interval. Samples are aggregated as folded stacks
+("thread;outer;...;inner count"), which flamegraph.pl, speedscope and
+inferno read directly. This covers the event loop as well as threadpool
+work such as Whisper and yt-dlp.
+
+Memory: tracemalloc snapshots (the first one is the baseline), reported
+per source line, per repo file and as byte-weighted folded stacks of the
+growth since the baseline. tracemalloc charges each block to the line that
+allocated it (json.decoder for a cached analysis, not the cache), so
+long-lived structures registered with track() are also measured directly
+at every snapshot: entry count and deep size, diffed against the baseline.
+
+When nothing is armed the middleware does one attribute check per
+request, and tracemalloc is off until the first snapshot.
+"""
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 대기 중인 스레드(이벤트 루프 select, 스레드풀 대기)는 샘플에서 제외
+IDLE_FUNCTIONS = {"select", "poll", "epoll", "wait", "_wait_for_tstate_lock", "get", "_worker", "accept"}
+IDLE_FILES = ("selectors.py", "threading.py", "queue.py", "thread.py", "socket.py")
+MAX_DEPTH = 64
+# 구조 크기 계산 때 따라가지 않는 공유 객체 (클래스, 모듈, 함수)
+SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(REPO_ROOT):
+        return os.path.relpath(filename, REPO_ROOT)
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+def _label(filename: str, function: str) -> str:
+    # folded 형식에서 ';'와 공백은 구분자라 쓰지 않음
+    return f"{function}({_short_path(filename)})".replace(";", ":").replace(" ", "_")
+
+
+class CpuProfiler:
+    def __init__(self):
+        self.active = False  # 미들웨어가 요청마다 확인하는 유일한 값
+        self._lock = threading.Lock()
+        self._samples: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._inflight = 0
+        self._remaining = 0
+        self._path_prefix = ""
+        self._deadline = 0.0
+        self._session_id = 0  # 이전 세션에서 claim 한 요청이 새 세션 집계를 건드리지 않도록 구분
+        self.session: Dict[str, Any] = {}
+
+    def start(self, requests: int = 10, seconds: float = 60.0, path_prefix: str = "/api/",
+              interval_ms: float = 5.0) -> Dict[str, Any]:
+        with self._lock:
+            if self.active:
+                raise RuntimeError("A CPU profiling session is already running")
+            self._session_id += 1
+            self._samples = Counter()
+            self._stop.clear()
+            self._inflight = 0
+            self._remaining = requests
+            self._path_prefix = path_prefix
+            self._deadline = time.monotonic() + seconds
+            self.session = {
+                "started_at": time.time(), "finished_at": None, "path_prefix": path_prefix,
+                "requests_requested": requests, "seconds": seconds, "interval_ms": interval_ms,
+                "requests": [], "samples": 0, "idle_samples": 0,
+            }
+            self.active = True
+            self._thread = threading.Thread(
+                target=self._run, args=(interval_ms / 1000,), name="cpu-profiler", daemon=True,
+            )
+            self._thread.start()
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=2)
+        return self.status()
+
+    def claim(self, path: str) -> Optional[int]:
+        """Reserve a slot for this request; returns the session id, or None if it should not be profiled."""
+        if not path.startswith(self._path_prefix):
+            return None
+        with self._lock:
+            if not self.active or self._remaining <= 0:
+                return None
+            self._remaining -= 1
+            self._inflight += 1
+            return self._session_id
+
+    def release(self, session_id: int, method: str, path: str, elapsed: float):
+        with self._lock:
+            if session_id != self._session_id:
+                # 시간 제한으로 끝난 이전 세션의 요청이 새 세션 시작 후에 끝난 경우
+                return
+            self._inflight -= 1
+            self.session["requests"].append({"method": method, "path": path, "ms": round(elapsed * 1000, 1)})
+            done = self._remaining <= 0 and self._inflight == 0
+        if done:
+            self._stop.set()
+
+    def _run(self, interval: float):
+        me = threading.get_ident()
+        try:
+            while not self._stop.wait(interval):
+                if time.monotonic() >= self._deadline:
+                    break
+                if self._inflight > 0:
+                    self._sample(me)
+        finally:
+            with self._lock:
+                self.active = False
+                self.session["finished_at"] = time.time()
+
+    def _sample(self, me: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks, idle = [], 0
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            code = frame.f_code
+            if code.co_name in IDLE_FUNCTIONS and os.path.basename(code.co_filename) in IDLE_FILES:
+                idle += 1
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(_label(frame.f_code.co_filename, frame.f_code.co_name))
+                frame = frame.f_back
+            thread_name = names.get(ident, str(ident)).replace(" ", "_").replace(";", ":")
+            stacks.append(";".join([thread_name] + stack[::-1]))
+        with self._lock:
+            self._samples.update(stacks)
+            self.session["samples"] += len(stacks)
+            self.session["idle_samples"] += idle
+
+    def folded(self) -> str:
+        """Folded stacks of the current/last session, one "stack count" per line."""
+        with self._lock:
+            samples = list(self._samples.items())
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(samples))
+
+    def top_functions(self, limit: int = 15) -> List[Dict[str, Any]]:
+        """Leaf (self-time) functions by sample count."""
+        leaves: Counter = Counter()
+        with self._lock:
+            for stack, count in self._samples.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [
+            {"function": name, "samples": count, "share": round(count / total, 3)}
+            for name, count in leaves.most_common(limit)
+        ]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            session = dict(self.session, requests=list(self.session.get("requests", [])))
+            remaining = self._remaining
+        return dict(session, active=self.active, requests_remaining=remaining if self.active else 0)
+
+
+def _deep_size(obj: Any) -> int:
+    """Bytes reachable from obj (containers, instance dicts, numpy buffers), each object counted once."""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, SHARED_TYPES):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        stack.extend(gc.get_referents(item))
+    return total
+
+
+def _entries(obj: Any) -> Optional[int]:
+    if hasattr(obj, "__len__"):
+        return len(obj)
+    return getattr(obj, "size", None)
+
+
+class MemoryProfiler:
+    def __init__(self):
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.latest: Optional[tracemalloc.Snapshot] = None
+        self.taken_at: List[float] = []
+        self._structures: Dict[str, Callable[[], Any]] = {}
+        self._baseline_structures: Dict[str, Dict[str, Any]] = {}
+        self._latest_structures: Dict[str, Dict[str, Any]] = {}
+
+    def track(self, name: str, get: Callable[[], Any]):
+        """Measure a long-lived structure (returned by `get`) at every snapshot."""
+        self._structures[name] = get
+
+    def _measure(self) -> Dict[str, Dict[str, Any]]:
+        measured = {}
+        for name, get in self._structures.items():
+            obj = get()
+            if obj is not None:
+                measured[name] = {"entries": _entries(obj), "size": _deep_size(obj)}
+        return measured
+
+    def snapshot(self, reset_baseline: bool = False) -> Dict[str, Any]:
+        """Take a snapshot (starting tracemalloc on first use); the first one is the baseline."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(int(os.getenv("TRACEMALLOC_FRAMES", "15")))
+            self.baseline = None
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ])
+        structures = self._measure()
+        if self.baseline is None or reset_baseline:
+            self.baseline = snapshot
+            self._baseline_structures = structures
+            self.taken_at = []
+        self.latest = snapshot
+        self._latest_structures = structures
+        self.taken_at.append(time.time())
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        tracemalloc.stop()
+        self.baseline = self.latest = None
+        self.taken_at = []
+        self._baseline_structures = self._latest_structures = {}
+        return self.status()
+
+    def _diff(self, key_type: str):
+        if self.latest is None:
+            raise RuntimeError("No memory snapshot yet")
+        return self.latest.compare_to(self.baseline, key_type)
+
+    def _structure_report(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for name, latest in self._latest_structures.items():
+            base = self._baseline_structures.get(name, {"entries": None, "size": 0})
+            report[name] = {
+                "entries": latest["entries"],
+                "size_kb": round(latest["size"] / 1024, 1),
+                "entries_diff": latest["entries"] - base["entries"]
+                if latest["entries"] is not None and base["entries"] is not None else None,
+                "size_diff_kb": round((latest["size"] - base["size"]) / 1024, 1),
+            }
+        return report
+
+    def report(self, limit: int = 30) -> Dict[str, Any]:
+        """Growth since the baseline by source line, current size per repo file, and tracked structures."""
+        by_line = self._diff("lineno")
+        by_file: Counter = Counter()
+        for stat in self.latest.statistics("filename"):
+            filename = stat.traceback[0].filename
+            if filename.startswith(REPO_ROOT):
+                by_file[_short_path(filename)] += stat.size
+        return {
+            **self.status(),
+            "growth": [
+                {
+                    "where": f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                    "size_kb": round(stat.size / 1024, 1),
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "count_diff": stat.count_diff,
+                }
+                for stat in by_line[:limit]
+            ],
+            # 할당한 줄(가장 안쪽 프레임)의 파일 기준이라 오래 사는 구조의 크기는 structures 에서 확인
+            "repo_files_kb": {name: round(size / 1024, 1) for name, size in by_file.most_common()},
+            "structures": self._structure_report(),
+        }
+
+    def folded(self, growth: bool = True) -> str:
+        """Byte-weighted folded stacks: growth since the baseline, or everything currently traced."""
+        if self.latest is None:
+            raise RuntimeError("No memory snapshot yet")
+        stats = self._diff("traceback") if growth else self.latest.statistics("traceback")
+        lines = []
+        for stat in stats:
+            size = stat.size_diff if growth else stat.size
+            if size <= 0:
+                continue
+            # tracemalloc 트레이스백은 안쪽 프레임부터라 뒤집어서 바깥 → 안쪽
+            stack = ";".join(
+                f"{_short_path(frame.filename)}:{frame.lineno}".replace(";", ":").replace(" ", "_")
+                for frame in reversed(stat.traceback)
+            )
+            lines.append(f"{stack} {size}\n")
+        return "".join(lines)
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "traced_mb": round(current / 1048576, 2),
+            "peak_mb": round(peak / 1048576, 2),
+            "snapshots": len(self.taken_at),
+        }
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware: one flag check per request unless a CPU session is armed."""
+
+    def __init__(self, app, profiler: CpuProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        session_id = None
+        if self.profiler.active and scope["type"] == "http":
+            session_id = self.profiler.claim(scope["path"])
+        if session_id is None:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.release(session_id, scope["method"], scope["path"], time.perf_counter() - start)
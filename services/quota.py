@@ -0,0 +1,124 @@
+"""
+YouTube Data API quota accounting.
+
+Every API call has a fixed cost in quota units (search.list is 100,
+videos.list and channels.list are 1). The project's daily quota resets at
+midnight Pacific time. QuotaLedger stores the units spent in the current
+quota day in a small JSON file, which scripts/update_videos.py and the
+in-app refresher share. Every read-modify-write of it runs under a
+cross-process file lock, so concurrent spenders (the script, one or more
+workers) never overwrite each other's charges. A call is charged before
+it is made and refused with QuotaExhausted if it would eat into the
+reserve. A quotaExceeded error from the API marks the day as spent, so
+nothing keeps hammering it.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict
+
+from services.filelock import file_lock
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    PACIFIC = ZoneInfo("America/Los_Angeles")
+except (ImportError, ZoneInfoNotFoundError):
+    # tzdata 가 없는 환경(Windows 등): 서머타임 동안은 1시간 어긋나지만 날짜 경계용으로는 충분
+    PACIFIC = timezone(timedelta(hours=-8))
+
+# API 호출 1회당 할당량 단위
+COSTS = {"search": 100, "videos": 1, "channels": 1}
+
+
+class QuotaExhausted(Exception):
+    def __init__(self, kind: str, cost: int, available: int):
+        self.kind = kind
+        self.cost = cost
+        self.available = available
+        super().__init__(f"YouTube quota: {kind} needs {cost} units, {available} left today")
+
+
+def quota_day(now: datetime = None) -> str:
+    return (now or datetime.now(PACIFIC)).astimezone(PACIFIC).strftime("%Y-%m-%d")
+
+
+def seconds_until_reset() -> float:
+    now = datetime.now(PACIFIC)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+def is_quota_error(error: Exception) -> bool:
+    """True for googleapiclient HttpErrors caused by an exhausted daily quota."""
+    resp = getattr(error, "resp", None)
+    return getattr(resp, "status", None) == 403 and b"quotaExceeded" in (getattr(error, "content", b"") or b"")
+
+
+class QuotaLedger:
+    def __init__(self, path: Path, daily_limit: int = None, reserve: int = None):
+        self.path = path
+        self.daily_limit = daily_limit if daily_limit is not None else int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+        # 다른 용도(수동 확인, 다른 스크립트)를 위해 남겨 두는 양
+        self.reserve = reserve if reserve is not None else int(os.getenv("YOUTUBE_QUOTA_RESERVE", "500"))
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        """Today's record (a new one when the stored day has passed)."""
+        today = quota_day()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("day") == today:
+                return data
+        except (OSError, json.JSONDecodeError):
+            pass
+        return {"day": today, "used": 0, "calls": {kind: 0 for kind in COSTS}, "exhausted": False}
+
+    def _save(self, data: Dict[str, Any]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def available(self) -> int:
+        """Units that can still be spent today without touching the reserve."""
+        data = self._load()
+        if data.get("exhausted"):
+            return 0
+        return max(0, self.daily_limit - self.reserve - data["used"])
+
+    def spend(self, kind: str, calls: int = 1):
+        """Charge `calls` calls of `kind` before making them; raises QuotaExhausted if unaffordable."""
+        cost = COSTS[kind] * calls
+        with self._lock, file_lock(self.path):
+            data = self._load()
+            available = 0 if data.get("exhausted") else self.daily_limit - self.reserve - data["used"]
+            if cost > available:
+                raise QuotaExhausted(kind, cost, max(available, 0))
+            data["used"] += cost
+            data["calls"][kind] = data["calls"].get(kind, 0) + calls
+            self._save(data)
+
+    def mark_exhausted(self):
+        """The API reported quotaExceeded: stop spending until the next quota day."""
+        with self._lock, file_lock(self.path):
+            data = self._load()
+            data["exhausted"] = True
+            self._save(data)
+        print(f"YouTube quota exhausted for {data['day']} (resets in {seconds_until_reset() / 3600:.1f}h)")
+
+    def status(self) -> Dict[str, Any]:
+        data = self._load()
+        return {
+            "day": data["day"],
+            "used": data["used"],
+            "calls": data["calls"],
+            "daily_limit": self.daily_limit,
+            "reserve": self.reserve,
+            "available": self.available(),
+            "exhausted": data.get("exhausted", False),
+            "resets_in_minutes": round(seconds_until_reset() / 60),
+        }
@@ -0,0 +1,203 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import deque
+
+# 일시적인 제공자 장애로 판단하는 오류 (재시도/차단기 집계 대상)
+_RETRYABLE_CODES = re.compile(r"\b(429|500|503|504)\b")
+_RETRYABLE_TOKENS = ("UNAVAILABLE", "OVERLOADED", "RESOURCE_EXHAUSTED", "DEADLINE_EXCEEDED")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f"{name} circuit open, retry after {self.retry_after}s")
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Transient provider errors (overload, rate limit, timeout) are worth retrying."""
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    msg = str(exc).upper()
+    return bool(_RETRYABLE_CODES.search(msg)) or any(token in msg for token in _RETRYABLE_TOKENS)
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker over a sliding window of recent calls.
+
+    closed -> open when the failure ratio of the last `window` calls reaches
+    `failure_ratio` (after at least `min_calls`); open -> half-open after
+    `cooldown` seconds, where a single probe call decides whether to close again.
+    """
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 5,
+                 failure_ratio: float = 0.5, cooldown: float = 30.0):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return "open"
+            return "half_open"
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not go out right now."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed < self.cooldown:
+                raise CircuitOpenError(self.name, self.cooldown - elapsed)
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.name, 1)
+            self._probe_in_flight = True
+
+    def record(self, success: bool):
+        with self._lock:
+            if self._opened_at is not None:
+                # half-open 상태의 탐색 호출 결과로 열림/닫힘 결정
+                self._probe_in_flight = False
+                if success:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                else:
+                    self._opened_at = time.monotonic()
+                return
+
+            self._outcomes.append(success)
+            if success:
+                return
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_ratio:
+                self._opened_at = time.monotonic()
+                print(f"[{self.name}] circuit opened ({failures}/{len(self._outcomes)} recent calls failed)")
+
+    def release(self):
+        """Forget an in-flight probe that was cancelled before it finished."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = len(self._outcomes)
+            failures = self._outcomes.count(False)
+        return {"state": self.state, "recent_calls": recent, "recent_failures": failures}
+
+
+class LatencyTracker:
+    """Keeps recent successful call latencies to derive a hedging threshold."""
+
+    def __init__(self, size: int = 100, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def p95(self):
+        return self.percentile(0.95)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 8.0) -> float:
+    """Exponential backoff with equal jitter: half fixed, half random."""
+    ceiling = min(cap, base * (2 ** attempt))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+async def _hedged(make_call, hedge_after: float):
+    """Start a duplicate request if the first one is slower than `hedge_after`."""
+    tasks = {asyncio.ensure_future(make_call())}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            tasks.add(asyncio.ensure_future(make_call()))
+
+        error = None
+        pending = tasks
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def call_with_resilience(make_call, *, breaker: CircuitBreaker, latency: LatencyTracker = None,
+                               attempts: int = 3, base_delay: float = 1.0, max_delay: float = 8.0,
+                               hedge: bool = False, deadline=None, stage: str = None):
+    """
+    Await `make_call()` (a coroutine factory) with retries, circuit breaking and
+    optional hedging. Backoff uses asyncio.sleep so no worker thread is held.
+    With a request `deadline` (services.deadline.Deadline), each attempt is
+    bounded by the remaining budget and no retry starts after it runs out.
+    """
+    stage = stage or breaker.name
+    for attempt in range(attempts):
+        if deadline is not None:
+            deadline.check(stage)
+        breaker.before_call()
+        started = time.monotonic()
+        hedge_after = latency.p95() if (hedge and latency is not None) else None
+        try:
+            if hedge_after is not None and breaker.state == "closed":
+                call = _hedged(make_call, hedge_after)
+            else:
+                call = make_call()
+            if deadline is not None:
+                result = await asyncio.wait_for(call, timeout=max(deadline.remaining(), 0.001))
+            else:
+                result = await call
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            if deadline is not None and (deadline.cancelled or deadline.remaining() <= 0):
+                # 요청 마감/취소로 끊은 호출은 제공자 장애로 집계하지 않음
+                breaker.release()
+                deadline.check(stage)
+            retryable = is_retryable(e)
+            # 요청 자체의 오류(잘못된 입력 등)는 제공자 장애로 집계하지 않음
+            breaker.record(not retryable)
+            if not retryable or attempt == attempts - 1:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            print(f"[{breaker.name}] attempt {attempt + 1} failed ({e}); retrying in {delay:.1f}s")
+            if deadline is not None:
+                delay = min(delay, max(deadline.remaining(), 0))
+            await asyncio.sleep(delay)
+            continue
+
+        breaker.record(True)
+        if latency is not None:
+            latency.add(time.monotonic() - started)
+        return result
@@ -0,0 +1,223 @@
+import json
+import re
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, create_model
+
+
+class ScoreItem(BaseModel):
+    name: str
+    score: int
+
+
+class TimelineItem(BaseModel):
+    time: str
+    phase: str
+    formula: str
+    intent: str
+
+
+class ViralStructure(BaseModel):
+    """Response schema for analyze_structure (passed to Gemini as response_schema)."""
+    viral_score: int
+    score_reason: str
+    keywords: List[str]
+    one_line_summary: str
+    score_breakdown: List[ScoreItem]
+    timeline: List[TimelineItem]
+
+
+class TitleSet(BaseModel):
+    """Response schema for generate_titles."""
+    titles: List[str]
+
+
+STRUCTURE_FIELDS = tuple(ViralStructure.model_fields)
+# 이 필드가 없으면 결과를 쓸 수 없음 (나머지는 재요청 후에도 없으면 기본값으로 채움)
+CRITICAL_STRUCTURE_FIELDS = ("timeline",)
+MAX_KEYWORDS = 6
+
+# 타임라인 phase 이름은 자유 텍스트라 비교/집계용으로 네 가지로 묶음
+PHASE_BUCKETS = ("HOOK", "BODY", "CTA", "END")
+_PHASE_ALIASES = (
+    ("HOOK", ("HOOK", "후킹", "훅")),
+    ("CTA", ("CTA", "행동", "구독", "팔로우")),
+    ("END", ("END", "마무리", "엔딩", "결말", "OUTRO")),
+)
+_TIMESTAMP = re.compile(r"\d+(?::\d{1,2}){0,2}(?:\.\d+)?")
+
+
+def partial_structure_schema(fields: List[str]):
+    """Schema containing only the given ViralStructure fields, for re-asking missing parts."""
+    return create_model(
+        "ViralStructurePatch",
+        **{name: (ViralStructure.model_fields[name].annotation, ...) for name in fields},
+    )
+
+
+def _close_truncated(text: str) -> List[str]:
+    """Candidate completions for JSON cut off mid-output (e.g. max_output_tokens hit)."""
+    stack, in_str, escaped = [], False, False
+    cut_points = []  # (prefix length, closers) where the prefix ends on a complete value
+    for i, ch in enumerate(text):
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            cut_points.append((i + 1, "".join(reversed(stack))))
+        elif ch == ",":
+            cut_points.append((i, "".join(reversed(stack))))
+
+    closers = "".join(reversed(stack))
+    candidates = [text + ('"' if in_str else "") + closers]
+    candidates += [text[:index] + tail for index, tail in reversed(cut_points[-20:])]
+    return candidates
+
+
+def parse_json_lenient(text: str) -> Optional[dict]:
+    """Parse model output, tolerating code fences and truncated trailing content."""
+    if not text:
+        return None
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    elif text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    text = text.strip()
+
+    for candidate in [text] + _close_truncated(text):
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        return data if isinstance(data, dict) else None
+    return None
+
+
+def _to_score(value) -> Optional[int]:
+    try:
+        return max(0, min(100, int(round(float(value)))))
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value) -> str:
+    return value.strip() if isinstance(value, str) else ""
+
+
+def repair_structure(data: dict) -> Tuple[dict, List[str]]:
+    """
+    Validate a (possibly partial) viral-structure payload field by field.
+    Returns the usable fields and the names of fields that are missing or invalid.
+    """
+    result, missing = {}, []
+
+    score = _to_score(data.get("viral_score"))
+    if score is not None:
+        result["viral_score"] = score
+
+    for name in ("score_reason", "one_line_summary"):
+        if _text(data.get(name)):
+            result[name] = _text(data.get(name))
+
+    keywords = data.get("keywords")
+    if isinstance(keywords, str):
+        keywords = keywords.replace(",", " ").split()
+    if isinstance(keywords, list):
+        keywords = [k.strip() for k in keywords if isinstance(k, str) and k.strip()]
+        if keywords:
+            result["keywords"] = keywords[:MAX_KEYWORDS]
+
+    breakdown = []
+    for item in data.get("score_breakdown") or []:
+        if isinstance(item, dict) and _text(item.get("name")) and _to_score(item.get("score")) is not None:
+            breakdown.append({"name": _text(item["name"]), "score": _to_score(item["score"])})
+    if breakdown:
+        result["score_breakdown"] = breakdown
+
+    # 잘려서 끝나는 마지막 구간처럼 필수 값이 빠진 항목은 버림
+    timeline = []
+    for item in data.get("timeline") or []:
+        if isinstance(item, dict) and all(_text(item.get(k)) for k in ("time", "phase", "formula")):
+            timeline.append({
+                "time": _text(item["time"]),
+                "phase": _text(item["phase"]),
+                "formula": _text(item["formula"]),
+                "intent": _text(item.get("intent")),
+            })
+    if timeline:
+        result["timeline"] = timeline
+
+    missing = [name for name in STRUCTURE_FIELDS if name not in result]
+    return result, missing
+
+
+def fill_structure_defaults(result: dict) -> dict:
+    """Fill non-critical fields that are still missing after a re-ask."""
+    if "viral_score" not in result:
+        scores = [item["score"] for item in result.get("score_breakdown", [])]
+        result["viral_score"] = round(sum(scores) / len(scores)) if scores else 0
+    result.setdefault("score_reason", "")
+    result.setdefault("one_line_summary", "")
+    result.setdefault("keywords", [])
+    result.setdefault("score_breakdown", [])
+    return result
+
+
+def repair_titles(data: Optional[dict]) -> List[str]:
+    titles = (data or {}).get("titles") or []
+    return [t.strip() for t in titles if isinstance(t, str) and t.strip()][:3]
+
+
+def phase_bucket(phase: str) -> str:
+    upper = (phase or "").upper()
+    for bucket, aliases in _PHASE_ALIASES:
+        if any(alias in upper for alias in aliases):
+            return bucket
+    return "BODY"
+
+
+def parse_time_range(text: str) -> Optional[Tuple[float, Optional[float]]]:
+    """'00:05-00:12' -> (5.0, 12.0); '00:50-END' -> (50.0, None); None if no timestamp."""
+    seconds = []
+    for token in _TIMESTAMP.findall(text or "")[:2]:
+        value = 0.0
+        for part in token.split(":"):
+            value = value * 60 + float(part)
+        seconds.append(value)
+    if not seconds:
+        return None
+    return seconds[0], (seconds[1] if len(seconds) > 1 else None)
+
+
+def timeline_durations(timeline: List[dict]) -> List[float]:
+    """
+    Seconds covered by each timeline item. Open-ended items run until the next
+    item starts; unparseable ones get the average of the known durations.
+    """
+    ranges = [parse_time_range(item.get("time", "")) for item in timeline]
+    durations = []
+    for i, time_range in enumerate(ranges):
+        if time_range is None:
+            durations.append(None)
+            continue
+        start, end = time_range
+        if end is None:
+            end = next((r[0] for r in ranges[i + 1:] if r), None)
+        durations.append(max(0.0, end - start) if end is not None else None)
+    known = [d for d in durations if d]
+    fallback = sum(known) / len(known) if known else 1.0
+    return [d if d else fallback for d in durations]
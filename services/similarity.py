@@ -0,0 +1,158 @@
+"""
+In-memory similarity index over cached analyses ("videos built like this one").
+
+Each analysis becomes a fixed-length float32 vector made of three blocks:
+score components, the share of runtime spent in each phase bucket, and
+hashed keywords. Every block is unit-normalized and weighted, so the dot
+product of two vectors is a weighted sum of per-block cosine similarities.
+Rows live in one NumPy matrix; search is a single matrix-vector product.
+"""
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.schemas import PHASE_BUCKETS, phase_bucket, timeline_durations
+
+SCORE_NAMES = ("후킹", "전환", "감정", "CTA")
+KEYWORD_DIM = 32
+MAX_PHASES = 6
+
+# 블록별 가중치 (제곱근을 곱해 두면 내적 = 블록 코사인 유사도의 가중합)
+BLOCK_WEIGHTS = {"scores": 0.4, "phases": 0.35, "keywords": 0.25}
+
+SCORE_DIM = 1 + len(SCORE_NAMES)
+PHASE_DIM = len(PHASE_BUCKETS) + 1
+VECTOR_DIM = SCORE_DIM + PHASE_DIM + KEYWORD_DIM
+
+
+def _unit(block):
+    import numpy as np
+
+    norm = np.linalg.norm(block)
+    return block / norm if norm > 0 else block
+
+
+def _keyword_slot(keyword: str) -> int:
+    normalized = keyword.lstrip("#").strip().lower()
+    return zlib.crc32(normalized.encode("utf-8")) % KEYWORD_DIM
+
+
+def vectorize(analysis: Dict[str, Any]):
+    """Vector for one analysis result (the dict stored in the analysis cache)."""
+    import numpy as np
+
+    viral = float(analysis.get("viral_score") or 0)
+    breakdown = {item.get("name"): item.get("score") for item in analysis.get("score_breakdown") or []}
+    # 50점을 기준으로 중심화해 점수 분포의 "모양"을 비교
+    scores = np.array(
+        [viral] + [float(breakdown.get(name, viral) or 0) for name in SCORE_NAMES],
+        dtype=np.float32,
+    )
+    scores = (scores - 50.0) / 50.0
+
+    timeline = analysis.get("timeline") or []
+    phases = np.zeros(PHASE_DIM, dtype=np.float32)
+    if timeline:
+        for item, seconds in zip(timeline, timeline_durations(timeline)):
+            phases[PHASE_BUCKETS.index(phase_bucket(item.get("phase")))] += seconds
+        total = phases[:len(PHASE_BUCKETS)].sum()
+        if total > 0:
+            phases[:len(PHASE_BUCKETS)] /= total
+        phases[-1] = min(len(timeline), MAX_PHASES) / MAX_PHASES
+
+    keywords = np.zeros(KEYWORD_DIM, dtype=np.float32)
+    for keyword in analysis.get("keywords") or []:
+        if isinstance(keyword, str) and keyword.strip("# "):
+            keywords[_keyword_slot(keyword)] += 1.0
+
+    return np.concatenate([
+        _unit(scores) * np.sqrt(BLOCK_WEIGHTS["scores"]),
+        _unit(phases) * np.sqrt(BLOCK_WEIGHTS["phases"]),
+        _unit(keywords) * np.sqrt(BLOCK_WEIGHTS["keywords"]),
+    ]).astype(np.float32)
+
+
+def _summary(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "viral_score": analysis.get("viral_score"),
+        "one_line_summary": analysis.get("one_line_summary", ""),
+        "keywords": analysis.get("keywords", []),
+    }
+
+
+class SimilarityIndex:
+    """Append/update-only matrix of analysis vectors keyed by URL."""
+
+    def __init__(self, capacity: int = 256):
+        self._capacity = capacity
+        self._matrix = None
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._meta: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        # 마지막 동기화 이후 반영한 캐시 항목 수. 타임라인 없는 항목은 색인에 안 들어가므로
+        # 색인 크기 대신 이 값을 캐시 크기와 비교해야 매 요청 전체 동기화를 피함
+        self.source_count = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def add(self, key: str, analysis: Dict[str, Any]) -> bool:
+        """Insert or replace one analysis; returns False for unusable entries."""
+        import numpy as np
+
+        if not isinstance(analysis, dict) or not analysis.get("timeline"):
+            return False
+        vector = vectorize(analysis)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self._capacity, VECTOR_DIM), dtype=np.float32)
+            row = self._rows.get(key)
+            if row is None:
+                self.source_count += 1
+                row = len(self._keys)
+                if row == self._matrix.shape[0]:
+                    grown = np.zeros((row * 2, VECTOR_DIM), dtype=np.float32)
+                    grown[:row] = self._matrix
+                    self._matrix = grown
+                self._rows[key] = row
+                self._keys.append(key)
+                self._meta.append({})
+            self._matrix[row] = vector
+            self._meta[row] = _summary(analysis)
+        return True
+
+    def sync(self, items: Iterable[Tuple[str, Any]]) -> int:
+        """Add entries not yet indexed (e.g. written by another worker); returns how many."""
+        added, seen = 0, 0
+        for key, analysis in items:
+            seen += 1
+            if key not in self._rows and self.add(key, analysis):
+                added += 1
+        self.source_count = seen
+        return added
+
+    def search(self, key: str, k: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Top-k most similar indexed analyses to `key` (excluding itself); None if not indexed."""
+        import numpy as np
+
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            n = len(self._keys)
+            similarities = self._matrix[:n] @ self._matrix[row]
+            similarities[row] = -np.inf
+            k = min(k, n - 1)
+            if k <= 0:
+                return []
+            top = np.argpartition(-similarities, k - 1)[:k]
+            top = top[np.argsort(-similarities[top])]
+            return [
+                {"url": self._keys[i], "similarity": round(float(similarities[i]), 4), **self._meta[i]}
+                for i in top
+            ]
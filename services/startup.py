@@ -0,0 +1,106 @@
+"""
+Startup profiling: import-time breakdown, time-to-listening and background preloading
+of heavy dependencies that are otherwise imported on first use.
+
+`python -m services.startup` imports the app and exits non-zero when the import
+exceeds STARTUP_BUDGET_MS (used by CI to keep cold start in check).
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter()
+
+# 첫 요청 때 import 되는 무거운 의존성 (서버 기동 후 백그라운드 로드)
+HEAVY_MODULES = ("google.genai", "yt_dlp", "youtube_transcript_api")
+
+_marks = {}
+_timings = {}
+_preload_lock = threading.Lock()
+_preload_started = False
+
+
+def _since_start() -> float:
+    return round((time.perf_counter() - PROCESS_START) * 1000, 1)
+
+
+def mark(name: str):
+    """Record the first time (ms since process start) a milestone is reached."""
+    _marks.setdefault(name, _since_start())
+
+
+@contextmanager
+def timed(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def get_budget_ms() -> float:
+    return float(os.getenv("STARTUP_BUDGET_MS", "3000"))
+
+
+def mark_listening():
+    """Called once the server socket accepts connections; warns when over budget."""
+    mark("listening")
+    elapsed = _marks["listening"]
+    if elapsed > get_budget_ms():
+        print(f"Startup budget exceeded: listening after {elapsed:.0f}ms (budget {get_budget_ms():.0f}ms)")
+
+
+def preload_heavy_modules():
+    """Import heavy dependencies so the first request does not pay for them."""
+    for module in HEAVY_MODULES:
+        if module in sys.modules:
+            continue
+        try:
+            with timed(f"preload:{module}"):
+                importlib.import_module(module)
+        except Exception as e:
+            print(f"Preload of {module} failed: {e}")
+    mark("preload_done")
+
+
+def start_preload(delay: float = 0.0):
+    """Start preloading in a daemon thread (once), optionally after `delay` seconds."""
+    global _preload_started
+    with _preload_lock:
+        if _preload_started or os.getenv("STARTUP_PRELOAD", "1") != "1":
+            return
+        _preload_started = True
+
+    def _run():
+        if delay:
+            time.sleep(delay)
+        preload_heavy_modules()
+
+    threading.Thread(target=_run, name="startup-preload", daemon=True).start()
+
+
+def report() -> dict:
+    budget = get_budget_ms()
+    listening = _marks.get("listening")
+    return {
+        "milestones_ms": dict(_marks),
+        "timings_ms": dict(_timings),
+        "heavy_modules_loaded": {m: m in sys.modules for m in HEAVY_MODULES},
+        "budget_ms": budget,
+        "within_budget": None if listening is None else listening <= budget,
+    }
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    importlib.import_module("application")
+    elapsed = (time.perf_counter() - start) * 1000
+    # 앱이 import 한 services.startup 인스턴스에 기록된 구간별 시간
+    app_report = importlib.import_module("services.startup").report()
+    print(f"application import: {elapsed:.0f}ms (budget {get_budget_ms():.0f}ms)")
+    for name, ms in app_report["timings_ms"].items():
+        print(f"  {name}: {ms:.0f}ms")
+    sys.exit(0 if elapsed <= get_budget_ms() else 1)
@@ -0,0 +1,558 @@
+"""
+Runtime state backends (presence, usage limits, whitelist, activity log, analysis cache,
+failed-video records).
+
+- memory: in-process dicts persisted to usage_data.json (desktop build, single worker)
+- sqlite: SQLite in WAL mode, shared by every worker process on one host
+- redis:  any Redis-compatible server, shared across hosts (needs the `redis` package);
+          falls back to the local sqlite backend when Redis is unavailable
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.activity import ActivityStore, PRUNE_EVERY
+
+USAGE_KINDS = ("analyze", "generate")
+
+
+class StateBackend(ABC):
+    """Interface every endpoint uses instead of module-level globals; a backend missing a method fails at creation."""
+
+    name = "base"
+
+    # 접속자
+    @abstractmethod
+    def touch_session(self, session_id: str, now: float): ...
+    @abstractmethod
+    def remove_session(self, session_id: str): ...
+    @abstractmethod
+    def count_active_sessions(self, timeout: float) -> int: ...
+    @abstractmethod
+    def add_visitor(self, session_id: str): ...
+    @abstractmethod
+    def count_visitors(self) -> int: ...
+
+    def touch_sessions(self, session_ids: List[str], now: float):
+        """Batch form of touch_session + add_visitor (used by the presence flush)."""
+        for session_id in session_ids:
+            self.touch_session(session_id, now)
+            self.add_visitor(session_id)
+
+    # IP별 사용 기록
+    @abstractmethod
+    def get_usage(self, kind: str, ip: str) -> Optional[float]: ...
+    @abstractmethod
+    def set_usage(self, kind: str, ip: str, ts: float): ...
+    @abstractmethod
+    def clear_usage(self, ip: str): ...
+    @abstractmethod
+    def all_usage(self, kind: str) -> Dict[str, float]: ...
+
+    # 화이트리스트
+    @abstractmethod
+    def add_whitelist(self, ip: str): ...
+    @abstractmethod
+    def remove_whitelist(self, ip: str): ...
+    @abstractmethod
+    def is_whitelisted(self, ip: str) -> bool: ...
+    @abstractmethod
+    def list_whitelist(self) -> List[str]: ...
+
+    # 활동 로그 (커서 페이지네이션 + IP/액션/기간 필터)
+    @abstractmethod
+    def append_activity(self, entry: Dict[str, str]): ...
+    @abstractmethod
+    def query_activity(self, ip: Optional[str] = None, action: Optional[str] = None,
+                       since: Optional[float] = None, until: Optional[float] = None,
+                       cursor: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict], Optional[int]]: ...
+
+    def recent_activity(self, limit: int) -> List[Dict[str, str]]:
+        return self.query_activity(limit=limit)[0]
+
+    # 분석 캐시
+    @abstractmethod
+    def cache_get(self, key: str) -> Optional[Any]: ...
+    @abstractmethod
+    def cache_set(self, key: str, value: Any): ...
+    @abstractmethod
+    def cache_count(self) -> int: ...
+    @abstractmethod
+    def cache_items(self) -> Iterator[Tuple[str, Any]]: ...
+
+    # 자막 추출 실패 영상 (영상 ID → 실패 기록, services/negative_cache.py)
+    @abstractmethod
+    def failure_get(self, video_id: str) -> Optional[Dict[str, Any]]: ...
+    @abstractmethod
+    def failure_set(self, video_id: str, record: Dict[str, Any]): ...
+    @abstractmethod
+    def failure_delete(self, video_id: str): ...
+    @abstractmethod
+    def failure_count(self) -> int: ...
+
+    def memory_structures(self) -> Dict[str, Any]:
+        """In-process structures worth watching in the memory profiler (none for shared backends)."""
+        return {}
+
+
+class MemoryBackend(StateBackend):
+    """
+    Single-process state; usage and whitelist survive restarts via a JSON file,
+    the activity log lives in an indexed SQLite file next to it.
+    """
+
+    name = "memory"
+
+    def __init__(self, data_file: Path):
+        self.data_file = data_file
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, float] = {}
+        self._visitors: set = set()
+        self._usage: Dict[str, Dict[str, float]] = {kind: {} for kind in USAGE_KINDS}
+        self._whitelist: set = set()
+        self._activity = ActivityStore(data_file.parent / "activity.db")
+        self._cache: Dict[str, Any] = {}
+        self._failures: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self):
+        if not self.data_file.exists():
+            return
+        try:
+            with open(self.data_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for kind in USAGE_KINDS:
+                self._usage[kind] = data.get(f"ip_usage_{kind}", {})
+            self._whitelist = set(data.get("whitelist_ips", []))
+            # 예전 버전이 JSON에 남긴 활동 로그는 처음 한 번만 이전
+            legacy_log = data.get("activity_log", [])
+            if legacy_log and self._activity.is_empty():
+                for entry in legacy_log:
+                    self._activity.append(entry, ts=_entry_timestamp(entry))
+        except (json.JSONDecodeError, OSError):
+            pass
+
+    def _save(self):
+        with self._lock:
+            data = {f"ip_usage_{kind}": dict(self._usage[kind]) for kind in USAGE_KINDS}
+            data["whitelist_ips"] = list(self._whitelist)
+            with open(self.data_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def touch_session(self, session_id, now):
+        self._sessions[session_id] = now
+
+    def remove_session(self, session_id):
+        self._sessions.pop(session_id, None)
+
+    def count_active_sessions(self, timeout):
+        cutoff = time.time() - timeout
+        with self._lock:
+            expired = [sid for sid, last in self._sessions.items() if last < cutoff]
+            for sid in expired:
+                self._sessions.pop(sid, None)
+            return len(self._sessions)
+
+    def add_visitor(self, session_id):
+        self._visitors.add(session_id)
+
+    def count_visitors(self):
+        return len(self._visitors)
+
+    def get_usage(self, kind, ip):
+        return self._usage[kind].get(ip)
+
+    def set_usage(self, kind, ip, ts):
+        self._usage[kind][ip] = ts
+        self._save()
+
+    def clear_usage(self, ip):
+        for kind in USAGE_KINDS:
+            self._usage[kind].pop(ip, None)
+        self._save()
+
+    def all_usage(self, kind):
+        return dict(self._usage[kind])
+
+    def add_whitelist(self, ip):
+        self._whitelist.add(ip)
+        self._save()
+
+    def remove_whitelist(self, ip):
+        self._whitelist.discard(ip)
+        self._save()
+
+    def is_whitelisted(self, ip):
+        return ip in self._whitelist
+
+    def list_whitelist(self):
+        return list(self._whitelist)
+
+    def append_activity(self, entry):
+        self._activity.append(entry)
+
+    def query_activity(self, **filters):
+        return self._activity.query(**filters)
+
+    def cache_get(self, key):
+        return self._cache.get(key)
+
+    def cache_set(self, key, value):
+        self._cache[key] = value
+
+    def cache_count(self):
+        return len(self._cache)
+
+    def cache_items(self):
+        return iter(list(self._cache.items()))
+
+    def failure_get(self, video_id):
+        return self._failures.get(video_id)
+
+    def failure_set(self, video_id, record):
+        self._failures[video_id] = record
+
+    def failure_delete(self, video_id):
+        self._failures.pop(video_id, None)
+
+    def failure_count(self):
+        return len(self._failures)
+
+    def memory_structures(self):
+        return {
+            "analysis_cache": self._cache,
+            "sessions": self._sessions,
+            "visitors": self._visitors,
+            "usage": self._usage,
+            "failed_videos": self._failures,
+        }
+
+
+class SQLiteBackend(StateBackend):
+    """Multi-process state on one host. WAL lets readers proceed while a writer commits."""
+
+    name = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_seen REAL NOT NULL);
+    CREATE INDEX IF NOT EXISTS idx_sessions_last_seen ON sessions(last_seen);
+    CREATE TABLE IF NOT EXISTS visitors (session_id TEXT PRIMARY KEY);
+    CREATE TABLE IF NOT EXISTS usage (kind TEXT NOT NULL, ip TEXT NOT NULL, ts REAL NOT NULL, PRIMARY KEY (kind, ip));
+    CREATE TABLE IF NOT EXISTS whitelist (ip TEXT PRIMARY KEY);
+    CREATE TABLE IF NOT EXISTS analysis_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS failed_videos (video_id TEXT PRIMARY KEY, value TEXT NOT NULL);
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+        self._activity = ActivityStore(db_path)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 연결은 스레드 간 공유하지 않음 (스레드별 연결)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, sql, params=()):
+        with self._conn() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def touch_session(self, session_id, now):
+        self._execute(
+            "INSERT INTO sessions (session_id, last_seen) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET last_seen = excluded.last_seen",
+            (session_id, now),
+        )
+
+    def remove_session(self, session_id):
+        self._execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def count_active_sessions(self, timeout):
+        self._execute("DELETE FROM sessions WHERE last_seen < ?", (time.time() - timeout,))
+        return self._execute("SELECT COUNT(*) FROM sessions")[0][0]
+
+    def add_visitor(self, session_id):
+        self._execute("INSERT OR IGNORE INTO visitors (session_id) VALUES (?)", (session_id,))
+
+    def count_visitors(self):
+        return self._execute("SELECT COUNT(*) FROM visitors")[0][0]
+
+    def touch_sessions(self, session_ids, now):
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT INTO sessions (session_id, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_seen = excluded.last_seen",
+                [(sid, now) for sid in session_ids],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO visitors (session_id) VALUES (?)",
+                [(sid,) for sid in session_ids],
+            )
+
+    def get_usage(self, kind, ip):
+        rows = self._execute("SELECT ts FROM usage WHERE kind = ? AND ip = ?", (kind, ip))
+        return rows[0][0] if rows else None
+
+    def set_usage(self, kind, ip, ts):
+        self._execute("INSERT OR REPLACE INTO usage (kind, ip, ts) VALUES (?, ?, ?)", (kind, ip, ts))
+
+    def clear_usage(self, ip):
+        self._execute("DELETE FROM usage WHERE ip = ?", (ip,))
+
+    def all_usage(self, kind):
+        return dict(self._execute("SELECT ip, ts FROM usage WHERE kind = ?", (kind,)))
+
+    def add_whitelist(self, ip):
+        self._execute("INSERT OR IGNORE INTO whitelist (ip) VALUES (?)", (ip,))
+
+    def remove_whitelist(self, ip):
+        self._execute("DELETE FROM whitelist WHERE ip = ?", (ip,))
+
+    def is_whitelisted(self, ip):
+        return bool(self._execute("SELECT 1 FROM whitelist WHERE ip = ?", (ip,)))
+
+    def list_whitelist(self):
+        return [row[0] for row in self._execute("SELECT ip FROM whitelist")]
+
+    def append_activity(self, entry):
+        self._activity.append(entry)
+
+    def query_activity(self, **filters):
+        return self._activity.query(**filters)
+
+    def cache_get(self, key):
+        rows = self._execute("SELECT value FROM analysis_cache WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def cache_set(self, key, value):
+        self._execute(
+            "INSERT OR REPLACE INTO analysis_cache (key, value) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+
+    def cache_count(self):
+        return self._execute("SELECT COUNT(*) FROM analysis_cache")[0][0]
+
+    def cache_items(self):
+        for key, value in self._execute("SELECT key, value FROM analysis_cache"):
+            yield key, json.loads(value)
+
+    def failure_get(self, video_id):
+        rows = self._execute("SELECT value FROM failed_videos WHERE video_id = ?", (video_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def failure_set(self, video_id, record):
+        self._execute(
+            "INSERT OR REPLACE INTO failed_videos (video_id, value) VALUES (?, ?)",
+            (video_id, json.dumps(record, ensure_ascii=False)),
+        )
+
+    def failure_delete(self, video_id):
+        self._execute("DELETE FROM failed_videos WHERE video_id = ?", (video_id,))
+
+    def failure_count(self):
+        return self._execute("SELECT COUNT(*) FROM failed_videos")[0][0]
+
+
+class RedisBackend(StateBackend):
+    """Multi-node state on a Redis-compatible server."""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "vsc:"):
+        import redis
+
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self.r.ping()
+        self.p = prefix
+
+    def touch_session(self, session_id, now):
+        self.r.zadd(self.p + "sessions", {session_id: now})
+
+    def remove_session(self, session_id):
+        self.r.zrem(self.p + "sessions", session_id)
+
+    def count_active_sessions(self, timeout):
+        key = self.p + "sessions"
+        pipe = self.r.pipeline()
+        pipe.zremrangebyscore(key, "-inf", time.time() - timeout)
+        pipe.zcard(key)
+        return pipe.execute()[1]
+
+    def add_visitor(self, session_id):
+        # 누적 방문자는 HyperLogLog로 근사 (세션 수와 무관하게 12KB)
+        self.r.pfadd(self.p + "visitors", session_id)
+
+    def count_visitors(self):
+        return self.r.pfcount(self.p + "visitors")
+
+    def touch_sessions(self, session_ids, now):
+        if not session_ids:
+            return
+        pipe = self.r.pipeline()
+        pipe.zadd(self.p + "sessions", {sid: now for sid in session_ids})
+        pipe.pfadd(self.p + "visitors", *session_ids)
+        pipe.execute()
+
+    def get_usage(self, kind, ip):
+        value = self.r.hget(self.p + f"usage:{kind}", ip)
+        return float(value) if value is not None else None
+
+    def set_usage(self, kind, ip, ts):
+        self.r.hset(self.p + f"usage:{kind}", ip, ts)
+
+    def clear_usage(self, ip):
+        for kind in USAGE_KINDS:
+            self.r.hdel(self.p + f"usage:{kind}", ip)
+
+    def all_usage(self, kind):
+        return {ip: float(ts) for ip, ts in self.r.hgetall(self.p + f"usage:{kind}").items()}
+
+    def add_whitelist(self, ip):
+        self.r.sadd(self.p + "whitelist", ip)
+
+    def remove_whitelist(self, ip):
+        self.r.srem(self.p + "whitelist", ip)
+
+    def is_whitelisted(self, ip):
+        return bool(self.r.sismember(self.p + "whitelist", ip))
+
+    def list_whitelist(self):
+        return list(self.r.smembers(self.p + "whitelist"))
+
+    # 활동 로그: 이벤트 본문은 해시, id를 점수로 하는 정렬 집합(전체/IP별/액션별)이 인덱스,
+    # ts 정렬 집합으로 기간 필터를 id 범위로 변환
+    def _activity_index(self, ip=None, action=None) -> str:
+        if ip:
+            return self.p + f"activity:ip:{ip}"
+        if action:
+            return self.p + f"activity:action:{action}"
+        return self.p + "activity:all"
+
+    def append_activity(self, entry):
+        ts = time.time()
+        event_id = self.r.incr(self.p + "activity:seq")
+        event = dict(entry, id=event_id, ts=ts)
+        pipe = self.r.pipeline()
+        pipe.hset(self.p + "activity:events", event_id, json.dumps(event, ensure_ascii=False))
+        pipe.zadd(self.p + "activity:ts", {event_id: ts})
+        for index in (self._activity_index(), self._activity_index(ip=entry["ip"]),
+                      self._activity_index(action=entry["action"])):
+            pipe.zadd(index, {event_id: event_id})
+        pipe.execute()
+        if event_id % PRUNE_EVERY == 0:
+            self._prune_activity()
+
+    def _prune_activity(self):
+        days = float(os.getenv("ACTIVITY_RETENTION_DAYS", "14"))
+        expired = self.r.zrangebyscore(self.p + "activity:ts", "-inf", time.time() - days * 86400)
+        if not expired:
+            return
+        events = self.r.hmget(self.p + "activity:events", expired)
+        pipe = self.r.pipeline()
+        for event_id, raw in zip(expired, events):
+            if raw:
+                event = json.loads(raw)
+                pipe.zrem(self._activity_index(ip=event["ip"]), event_id)
+                pipe.zrem(self._activity_index(action=event["action"]), event_id)
+        pipe.zrem(self._activity_index(), *expired)
+        pipe.zrem(self.p + "activity:ts", *expired)
+        pipe.hdel(self.p + "activity:events", *expired)
+        pipe.execute()
+
+    def query_activity(self, ip=None, action=None, since=None, until=None, cursor=None, limit=50):
+        ts_key = self.p + "activity:ts"
+        max_id = float(cursor) - 1 if cursor else float("inf")
+        min_id = float("-inf")
+        if since is not None:
+            first = self.r.zrangebyscore(ts_key, since, "+inf", start=0, num=1)
+            if not first:
+                return [], None
+            min_id = float(first[0])
+        if until is not None:
+            last = self.r.zrevrangebyscore(ts_key, f"({until}", "-inf", start=0, num=1)
+            if not last:
+                return [], None
+            max_id = min(max_id, float(last[0]))
+
+        index = self._activity_index(ip=ip, action=action)
+        items = []
+        while len(items) <= limit and max_id >= min_id:
+            ids = self.r.zrevrangebyscore(index, max_id, min_id, start=0, num=limit + 1)
+            if not ids:
+                break
+            for raw in self.r.hmget(self.p + "activity:events", ids):
+                if not raw:
+                    continue
+                event = json.loads(raw)
+                # IP 인덱스를 탄 경우 액션 조건은 여기서 추가로 거름
+                if action and event["action"] != action:
+                    continue
+                items.append(event)
+            max_id = float(ids[-1]) - 1
+
+        next_cursor = items[limit - 1]["id"] if len(items) > limit else None
+        return items[:limit], next_cursor
+
+    def cache_get(self, key):
+        value = self.r.hget(self.p + "analysis_cache", key)
+        return json.loads(value) if value is not None else None
+
+    def cache_set(self, key, value):
+        self.r.hset(self.p + "analysis_cache", key, json.dumps(value, ensure_ascii=False))
+
+    def cache_count(self):
+        return self.r.hlen(self.p + "analysis_cache")
+
+    def cache_items(self):
+        for key, value in self.r.hscan_iter(self.p + "analysis_cache"):
+            yield key, json.loads(value)
+
+    def failure_get(self, video_id):
+        value = self.r.hget(self.p + "failed_videos", video_id)
+        return json.loads(value) if value is not None else None
+
+    def failure_set(self, video_id, record):
+        self.r.hset(self.p + "failed_videos", video_id, json.dumps(record, ensure_ascii=False))
+
+    def failure_delete(self, video_id):
+        self.r.hdel(self.p + "failed_videos", video_id)
+
+    def failure_count(self):
+        return self.r.hlen(self.p + "failed_videos")
+
+
+def _entry_timestamp(entry: Dict[str, str]) -> float:
+    try:
+        return datetime.strptime(entry["time"], "%Y-%m-%d %H:%M:%S").timestamp()
+    except (KeyError, ValueError):
+        return time.time()
+
+
+def create_backend(kind: str, data_dir: Path) -> StateBackend:
+    """Build the backend selected by STATE_BACKEND (memory | sqlite | redis)."""
+    kind = (kind or "memory").lower()
+    if kind == "redis":
+        url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        try:
+            return RedisBackend(url)
+        except Exception as e:
+            # Redis가 없으면 같은 호스트 안에서는 SQLite로 대신 공유
+            print(f"Redis state backend unavailable ({e}); using local SQLite instead")
+            kind = "sqlite"
+    if kind == "sqlite":
+        return SQLiteBackend(data_dir / "state.db")
+    return MemoryBackend(data_dir / "usage_data.json")
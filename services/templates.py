@@ -0,0 +1,263 @@
+"""
+Category structure templates for script generation without a source video.
+
+`build_library()` aggregates cached analyses of each category's popular
+videos into a profile (typical length, hook/CTA share, scores, keywords and
+a representative timeline) and composes one ready-to-use structure per
+template skeleton. scripts/build_templates.py runs it offline and writes
+data/structure_templates.json, which the app loads at startup; categories
+without enough analyses fall back to the bare skeleton timings.
+"""
+import json
+import os
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.schemas import PHASE_BUCKETS, phase_bucket, timeline_durations
+
+# 프론트엔드(static/script.js CATEGORIES)와 같은 id/이름
+CATEGORY_NAMES = {
+    "health": "건강/운동",
+    "finance": "재테크/투자",
+    "food": "요리/맛집",
+    "tech": "IT/테크",
+    "selfdev": "자기계발",
+    "beauty": "뷰티/화장품",
+    "travel": "여행",
+    "game": "게임",
+    "pet": "반려동물",
+    "humor": "유머/예능",
+}
+
+# 구조 템플릿 뼈대: (시작 초, phase, formula, intent). 시간은 카테고리 평균 길이에 맞게 재배치됨
+TEMPLATE_SKELETONS = {
+    "problem-solution": ("문제-해결 구조", [
+        (0, "HOOK", "충격적인 문제 상황 제시", "주의환기, 공감유도"),
+        (15, "BODY", "왜 이 문제가 생기는지 원인 분석", "신뢰구축, 전문성"),
+        (45, "BODY", "구체적인 해결 방법 3가지", "가치전달, 실용성"),
+        (90, "CTA", "지금 바로 적용해보세요 + 구독 유도", "행동유도, 전환"),
+    ]),
+    "listicle": ("리스트형 구조", [
+        (0, "HOOK", "\"이 5가지만 알면 OO 마스터\"", "기대감, 구체성"),
+        (10, "BODY", "첫 번째 팁 (가장 쉬운 것)", "진입장벽 낮춤"),
+        (30, "BODY", "두 번째, 세 번째 팁", "가치 축적"),
+        (60, "BODY", "네 번째, 다섯 번째 (핵심)", "클라이맥스"),
+        (90, "CTA", "요약 + 다음 영상 예고", "정리, 전환유도"),
+    ]),
+    "story": ("스토리텔링 구조", [
+        (0, "HOOK", "결과 먼저 보여주기 (Before/After)", "호기심, 결과증명"),
+        (15, "BODY", "예전 상황 설명 (공감 포인트)", "동질감, 공감"),
+        (40, "BODY", "어떻게 바뀌게 되었는지", "전환점, 희망"),
+        (70, "BODY", "구체적인 방법 공유", "실용적 가치"),
+        (100, "CTA", "여러분도 할 수 있어요", "동기부여, 행동촉구"),
+    ]),
+    "myth-busting": ("오해 타파 구조", [
+        (0, "HOOK", "\"다들 OO라고 하는데, 틀렸습니다\"", "논쟁유발, 호기심"),
+        (15, "BODY", "왜 이런 오해가 생겼는지", "배경설명"),
+        (35, "BODY", "실제 사실/데이터 제시", "신뢰구축, 전문성"),
+        (60, "BODY", "올바른 방법 안내", "실용적 대안"),
+        (85, "CTA", "더 많은 진실 알려드릴게요", "후속영상 유도"),
+    ]),
+    "comparison": ("비교 분석 구조", [
+        (0, "HOOK", "\"A vs B, 결론부터 말씀드립니다\"", "결론 예고, 호기심"),
+        (15, "BODY", "비교 기준 설명", "공정성 확보"),
+        (35, "BODY", "각 항목별 비교 분석", "정보 전달"),
+        (75, "BODY", "상황별 추천", "맞춤형 조언"),
+        (95, "CTA", "댓글로 의견 나눠주세요", "참여유도"),
+    ]),
+    "tutorial": ("튜토리얼 구조", [
+        (0, "HOOK", "완성된 결과물 먼저 보여주기", "목표 제시, 동기부여"),
+        (15, "BODY", "필요한 준비물/사전지식", "진입장벽 낮춤"),
+        (30, "BODY", "Step 1, 2, 3 순차 설명", "따라하기 쉬움"),
+        (80, "BODY", "자주하는 실수 & 꿀팁", "추가 가치"),
+        (100, "CTA", "다음 레벨 영상 예고", "시리즈화"),
+    ]),
+}
+
+SKELETON_TAIL_SECONDS = 15  # 뼈대 마지막 구간(CTA) 길이
+MIN_SAMPLES = 3  # 이보다 분석이 적은 카테고리는 프로필 없이 뼈대만 사용
+SCORE_NAMES = ("후킹", "전환", "감정", "CTA")
+
+
+def resolve_category(value: Optional[str]) -> Optional[str]:
+    """Category id from an id or its display name ("건강/운동")."""
+    if not value:
+        return None
+    if value in CATEGORY_NAMES:
+        return value
+    return next((cid for cid, name in CATEGORY_NAMES.items() if name == value), None)
+
+
+def resolve_template(value: Optional[str]) -> Optional[str]:
+    """Template id from an id or its display name ("문제-해결 구조")."""
+    if not value:
+        return None
+    if value in TEMPLATE_SKELETONS:
+        return value
+    return next((tid for tid, (name, _) in TEMPLATE_SKELETONS.items() if name == value), None)
+
+
+def _fmt(seconds: float) -> str:
+    seconds = int(round(seconds))
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def build_profile(analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate a category's analyses into typical length, phase shares, scores and keywords."""
+    from services.similarity import vectorize
+
+    lengths, shares = [], {bucket: [] for bucket in PHASE_BUCKETS}
+    for analysis in analyses:
+        timeline = analysis["timeline"]
+        durations = timeline_durations(timeline)
+        total = sum(durations)
+        lengths.append(total)
+        per_bucket = Counter()
+        for item, seconds in zip(timeline, durations):
+            per_bucket[phase_bucket(item.get("phase"))] += seconds
+        for bucket in PHASE_BUCKETS:
+            shares[bucket].append(per_bucket[bucket] / total if total else 0.0)
+
+    breakdowns = {name: [] for name in SCORE_NAMES}
+    for analysis in analyses:
+        for item in analysis.get("score_breakdown") or []:
+            if item.get("name") in breakdowns:
+                breakdowns[item["name"]].append(item["score"])
+
+    keyword_counts = Counter(
+        keyword for analysis in analyses for keyword in analysis.get("keywords") or []
+    )
+
+    # 대표 구조: 카테고리 평균 벡터에 가장 가까운 실제 분석 (구체 문구 참고용)
+    vectors = [vectorize(analysis) for analysis in analyses]
+    centroid = sum(vectors) / len(vectors)
+    representative = analyses[max(range(len(analyses)), key=lambda i: float(vectors[i] @ centroid))]
+
+    return {
+        "sample_size": len(analyses),
+        "median_length": round(statistics.median(lengths), 1),
+        "phase_share": {bucket: round(statistics.median(values), 3) for bucket, values in shares.items()},
+        "viral_score": round(statistics.mean(a.get("viral_score") or 0 for a in analyses)),
+        "score_breakdown": [
+            {"name": name, "score": round(statistics.mean(scores))}
+            for name, scores in breakdowns.items() if scores
+        ],
+        "keywords": [keyword for keyword, _ in keyword_counts.most_common(6)],
+        "reference_timeline": [
+            {"phase": item["phase"], "formula": item["formula"], "intent": item.get("intent", "")}
+            for item in representative["timeline"]
+        ],
+    }
+
+
+def compose_structure(category_id: str, template_id: str, profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Analysis-shaped structure for generate_script from a skeleton and an optional category profile."""
+    template_name, skeleton = TEMPLATE_SKELETONS[template_id]
+    starts = [start for start, *_ in skeleton]
+    skeleton_length = starts[-1] + SKELETON_TAIL_SECONDS
+
+    if profile:
+        # 훅 길이와 CTA 시작점은 카테고리 실측 비율에 맞추고, 본문 구간은 뼈대 비율대로 배분
+        length = profile["median_length"]
+        hook_end = max(2.0, length * profile["phase_share"]["HOOK"])
+        tail_share = profile["phase_share"]["CTA"] + profile["phase_share"]["END"]
+        cta_start = length * (1 - min(max(tail_share, 0.05), 0.5))
+        body_start, body_end = starts[1], starts[-1]
+        starts = [0.0] + [
+            hook_end + (s - body_start) / max(body_end - body_start, 1) * (cta_start - hook_end)
+            for s in starts[1:-1]
+        ] + [cta_start]
+    else:
+        length = skeleton_length
+
+    ends = starts[1:] + [length]
+    category_name = CATEGORY_NAMES[category_id]
+    structure = {
+        "one_line_summary": f"{category_name} 분야의 {template_name} 콘텐츠",
+        "viral_score": profile["viral_score"] if profile else 75,
+        "keywords": profile["keywords"] if profile else [category_name],
+        "score_breakdown": profile["score_breakdown"] if profile else [],
+        "timeline": [
+            {"time": f"{_fmt(start)}-{_fmt(end)}", "phase": phase, "formula": formula, "intent": intent}
+            for (_, phase, formula, intent), start, end in zip(skeleton, starts, ends)
+        ],
+        "template": {"category": category_id, "template": template_id, "sample_size": 0},
+    }
+    if profile:
+        structure["template"]["sample_size"] = profile["sample_size"]
+        structure["category_patterns"] = profile["reference_timeline"]
+    return structure
+
+
+def build_library(category_urls: Dict[str, List[str]], cache_items: Iterable[Tuple[str, Any]],
+                  min_samples: int = MIN_SAMPLES) -> Dict[str, Any]:
+    """Precompute every (category, template) structure from cached analyses."""
+    from services.youtube import extract_video_id
+
+    # 캐시 키는 사용자가 입력한 URL 그대로라 영상 ID로 맞춤
+    category_of = {}
+    for category_id, urls in category_urls.items():
+        for url in urls:
+            category_of[extract_video_id(url) or url] = category_id
+
+    analyses = {category_id: [] for category_id in CATEGORY_NAMES}
+    for key, analysis in cache_items:
+        category_id = category_of.get(extract_video_id(key) or key)
+        if category_id in analyses and isinstance(analysis, dict) and analysis.get("timeline"):
+            analyses[category_id].append(analysis)
+
+    categories = {}
+    for category_id, items in analyses.items():
+        profile = build_profile(items) if len(items) >= min_samples else None
+        categories[category_id] = {
+            "profile": profile,
+            "templates": {tid: compose_structure(category_id, tid, profile) for tid in TEMPLATE_SKELETONS},
+        }
+    return {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "categories": categories}
+
+
+def save_library(library: Dict[str, Any], path: Path):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(library, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class TemplateLibrary:
+    """Precomputed structures loaded at startup; lookups never touch the network or the model."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.generated_at = None
+        self._categories: Dict[str, Any] = {}
+
+    def load(self) -> "TemplateLibrary":
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.replace(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Failed to load structure templates from {self.path}: {e}")
+        return self
+
+    def replace(self, library: Dict[str, Any]):
+        self._categories = library.get("categories", {})
+        self.generated_at = library.get("generated_at")
+
+    def get(self, category: Optional[str], template: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Structure for a category/template given by id or display name; None if unknown."""
+        category_id, template_id = resolve_category(category), resolve_template(template)
+        if not category_id or not template_id:
+            return None
+        stored = self._categories.get(category_id, {}).get("templates", {}).get(template_id)
+        return stored or compose_structure(category_id, template_id)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "generated_at": self.generated_at,
+            "profiled_categories": sorted(cid for cid, c in self._categories.items() if c.get("profile")),
+        }
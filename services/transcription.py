@@ -0,0 +1,129 @@
+"""
+Per-job Whisper decoding policy.
+
+A 20-second Short and a 40-minute video should not be decoded the same
+way. Profiles are tried from most to least accurate; the first one whose
+estimated runtime (audio seconds × real-time factor) fits the latency
+budget is used. Shorts get their own, tighter budget because users wait
+on them interactively. Real-time factors come from per-model defaults,
+scaled by a host speed factor that every finished job updates, so the
+policy calibrates itself to the machine it runs on. The language comes
+from the video metadata or Whisper's own detection. English audio uses
+the English-only model variant, which is both faster and more accurate.
+"""
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+# 모델별 CPU int8 기준 실시간 배율 (오디오 1초당 처리 초, beam 1). 실측 비율로 전체 보정
+DEFAULT_RTF = {"tiny": 0.03, "base": 0.06, "small": 0.15, "medium": 0.4, "large-v2": 0.8, "large-v3": 0.8}
+BEAM_COST = 0.15  # beam 1개 추가당 디코딩 비용 증가 비율 (인코더 비용은 그대로)
+ENGLISH_ONLY_MODELS = {"tiny", "base", "small", "medium"}  # "<model>.en" 변형이 있는 모델
+EMA_WEIGHT = 0.3
+
+
+def get_profiles() -> List[Dict[str, Any]]:
+    """Decoding profiles, most accurate first. Read per call so .env values apply."""
+    model = os.getenv("WHISPER_MODEL", "small")
+    return [
+        {
+            "name": "accurate",
+            "model": model,
+            "beam_size": int(os.getenv("WHISPER_BEAM_SIZE", "5")),
+            "condition_on_previous_text": True,
+            "without_timestamps": False,
+        },
+        {
+            # 탐욕 디코딩 + 이전 문맥 미사용: 짧은 영상에서 정확도 손실은 작고 속도는 크게 개선
+            "name": "fast",
+            "model": model,
+            "beam_size": 1,
+            "condition_on_previous_text": False,
+            "without_timestamps": True,
+        },
+        {
+            # 긴 영상: 작은 모델 + 탐욕 디코딩, 앞 구간 오인식이 뒤로 번지지 않도록 문맥 미사용
+            "name": "throughput",
+            "model": os.getenv("WHISPER_LONG_MODEL", "base"),
+            "beam_size": 1,
+            "condition_on_previous_text": False,
+            "without_timestamps": True,
+        },
+    ]
+
+
+def _budget(audio_seconds: float) -> float:
+    if audio_seconds <= float(os.getenv("WHISPER_SHORTS_MAX_SECONDS", "60")):
+        return float(os.getenv("WHISPER_SHORTS_BUDGET", "15"))
+    return float(os.getenv("WHISPER_LATENCY_BUDGET", "120"))
+
+
+def english_model(model: str) -> str:
+    return f"{model}.en" if model in ENGLISH_ONLY_MODELS else model
+
+
+class TranscriptionPolicy:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scale = 1.0  # 실측 / 기본 추정 비율 (지수 이동 평균), 모든 프로필에 공통 적용
+        self._scale_samples = 0
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+        self.last_decision: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def _default_rtf(model: str, beam_size: int) -> float:
+        base = DEFAULT_RTF.get(model.removesuffix(".en"), DEFAULT_RTF["small"])
+        return base * (1 + BEAM_COST * (beam_size - 1))
+
+    def _estimated_rtf(self, model: str, beam_size: int) -> float:
+        return self._default_rtf(model, beam_size) * self._scale
+
+    def choose(self, audio_seconds: float) -> Dict[str, Any]:
+        """Most accurate profile expected to finish within the budget (else the cheapest)."""
+        budget = _budget(audio_seconds)
+        profiles = get_profiles()
+        chosen, estimate = profiles[-1], None
+        for profile in profiles:
+            estimate = audio_seconds * self._estimated_rtf(profile["model"], profile["beam_size"])
+            if estimate <= budget:
+                chosen = profile
+                break
+        else:
+            estimate = audio_seconds * self._estimated_rtf(chosen["model"], chosen["beam_size"])
+        return dict(chosen, budget_seconds=budget, estimated_seconds=round(estimate, 1))
+
+    def record(self, decision: Dict[str, Any], audio_seconds: float, elapsed: float):
+        """Fold a finished job into the real-time factor estimate and per-profile metrics."""
+        if audio_seconds <= 0:
+            return
+        ratio = elapsed / audio_seconds / self._default_rtf(decision["model"], decision["beam_size"])
+        with self._lock:
+            self._scale = ratio if not self._scale_samples else self._scale + EMA_WEIGHT * (ratio - self._scale)
+            self._scale_samples += 1
+            metrics = self._metrics.setdefault(decision["name"], {
+                "jobs": 0, "audio_seconds": 0.0, "compute_seconds": 0.0, "over_budget": 0,
+            })
+            metrics["jobs"] += 1
+            metrics["audio_seconds"] += audio_seconds
+            metrics["compute_seconds"] += elapsed
+            metrics["over_budget"] += elapsed > decision["budget_seconds"]
+            self.last_decision = dict(decision, audio_seconds=round(audio_seconds, 1), elapsed_seconds=round(elapsed, 1))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "profiles": {
+                    name: dict(
+                        m,
+                        audio_seconds=round(m["audio_seconds"], 1),
+                        compute_seconds=round(m["compute_seconds"], 1),
+                        rtf=round(m["compute_seconds"] / m["audio_seconds"], 3) if m["audio_seconds"] else None,
+                    )
+                    for name, m in self._metrics.items()
+                },
+                "host_scale": round(self._scale, 2),
+                "last_decision": self.last_decision,
+            }
+
+
+POLICY = TranscriptionPolicy()
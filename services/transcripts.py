@@ -0,0 +1,261 @@
+"""
+Managed transcript fetching for youtube_transcript_api.
+
+Requests go out over a set of routes: a direct connection, every proxy
+listed in TRANSCRIPT_PROXIES, and Webshare when WEBSHARE_PROXY_USERNAME and
+WEBSHARE_PROXY_PASSWORD are set. Each worker thread keeps one pooled
+keep-alive session per route. When a route is blocked (429, RequestBlocked)
+or its proxy fails, it is put on an exponentially growing cooldown and the
+fetch rotates to the next route. Per-route latency and outcome counters are
+exposed via stats().
+
+A local stand-in proxy (e.g. TRANSCRIPT_PROXIES=http://127.0.0.1:8899) is
+enough to exercise rotation and health tracking.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from services import deadline
+from services.resilience import LatencyTracker
+
+PREFERRED_LANGS = ['ko', 'en', 'ja', 'zh-Hans', 'zh-Hant', 'es', 'pt', 'de', 'fr']
+FALLBACK_LANGS = ['ko', 'en', 'en-US', 'ja', 'zh', 'zh-Hans', 'zh-Hant', 'es', 'pt', 'de', 'fr']
+
+BLOCK_COOLDOWN = 60.0  # 차단 시 첫 휴식 시간, 연속 차단마다 2배 (최대 30분)
+ERROR_COOLDOWN = 15.0  # 프록시 연결 오류 등
+MAX_COOLDOWN = 30 * 60.0
+
+
+class TranscriptRoutesExhausted(Exception):
+    """Every route is cooling down or failed for this request."""
+
+
+class _Route:
+    def __init__(self, name: str, proxy_config=None):
+        self.name = name
+        self.proxy_config = proxy_config
+        self.latency = LatencyTracker(size=50, min_samples=1)
+        self.requests = 0
+        self.successes = 0
+        self.blocked = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_error = None
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def record_success(self, seconds: float):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.latency.add(seconds)
+
+    def record_failure(self, blocked: bool, error: Exception):
+        self.consecutive_failures += 1
+        self.last_error = f"{type(error).__name__}: {str(error).splitlines()[0][:200] if str(error) else ''}"
+        if blocked:
+            self.blocked += 1
+        else:
+            self.errors += 1
+        base = BLOCK_COOLDOWN if blocked else ERROR_COOLDOWN
+        cooldown = min(MAX_COOLDOWN, base * 2 ** (self.consecutive_failures - 1))
+        self.cooldown_until = time.time() + cooldown
+
+    def snapshot(self, now: float) -> dict:
+        p50, p95 = self.latency.percentile(0.5), self.latency.p95()
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "blocked": self.blocked,
+            "errors": self.errors,
+            "consecutive_failures": self.consecutive_failures,
+            "cooldown_remaining": max(0, round(self.cooldown_until - now)),
+            "latency_p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000) if p95 is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+def _timeout_adapter(timeout: float, retries: int = 0):
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    class _TimeoutAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            if kwargs.get("timeout") is None:
+                kwargs["timeout"] = timeout
+            return super().send(request, **kwargs)
+
+    max_retries = Retry(total=retries, status_forcelist=[429]) if retries else 0
+    return _TimeoutAdapter(pool_connections=4, pool_maxsize=8, max_retries=max_retries)
+
+
+def _route_errors():
+    """Errors caused by the network path (rotate to another route) rather than the video."""
+    import requests
+    from youtube_transcript_api import RequestBlocked, YouTubeRequestFailed
+
+    return RequestBlocked, YouTubeRequestFailed, requests.exceptions.RequestException
+
+
+def _fetch_items(api, video_id: str):
+    """Preferred-language transcript, then any language (same order as before pooling)."""
+    route_errors = _route_errors()
+    try:
+        transcript_list = api.list(video_id)
+    except route_errors:
+        raise
+    except Exception as list_error:
+        print(f"api.list failed: {list_error}")
+        try:
+            return api.fetch(video_id, languages=FALLBACK_LANGS)
+        except route_errors:
+            raise
+        except Exception as fetch_error:
+            print(f"api.fetch with languages failed: {fetch_error}")
+            return api.fetch(video_id)
+
+    print(f"Available transcripts: {[t.language_code for t in transcript_list]}")
+    for lang in PREFERRED_LANGS:
+        for transcript in transcript_list:
+            if transcript.language_code == lang or transcript.language_code.startswith(lang):
+                print(f"Found transcript in {transcript.language_code}")
+                return transcript.fetch()
+    for transcript in transcript_list:
+        print(f"Using first available transcript: {transcript.language_code}")
+        return transcript.fetch()
+    return None
+
+
+class TranscriptFetcher:
+    def __init__(self, proxies: Optional[List[str]] = None, webshare: Optional[Dict[str, str]] = None,
+                 include_direct: bool = True, timeout: float = 10.0):
+        from youtube_transcript_api.proxies import GenericProxyConfig, WebshareProxyConfig
+
+        self.timeout = timeout
+        self.routes: List[_Route] = []
+        if include_direct:
+            self.routes.append(_Route("direct"))
+        for proxy_url in proxies or []:
+            self.routes.append(_Route(_redact(proxy_url), GenericProxyConfig(http_url=proxy_url, https_url=proxy_url)))
+        if webshare:
+            self.routes.append(_Route("webshare", WebshareProxyConfig(
+                proxy_username=webshare["username"],
+                proxy_password=webshare["password"],
+                retries_when_blocked=int(webshare.get("retries", 2)),
+            )))
+        self._lock = threading.Lock()
+        self._next = 0
+        self._local = threading.local()
+
+    def _api(self, route: _Route):
+        """Per-thread YouTubeTranscriptApi (the library's sessions are not thread-safe)."""
+        from requests import Session
+        from youtube_transcript_api import YouTubeTranscriptApi
+
+        apis = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+        api = apis.get(route.name)
+        if api is None:
+            session = Session()
+            api = YouTubeTranscriptApi(proxy_config=route.proxy_config, http_client=session)
+            # 라이브러리가 설정한 재시도 횟수는 유지하고 기본 타임아웃 + 연결 풀만 추가
+            retries = getattr(route.proxy_config, "retries_when_blocked", 0) if route.proxy_config else 0
+            adapter = _timeout_adapter(self.timeout, retries)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            apis[route.name] = api
+        return api
+
+    def _ordered_routes(self) -> List[_Route]:
+        """Available routes, rotating the starting point so healthy proxies share the load."""
+        now = time.time()
+        with self._lock:
+            available = [route for route in self.routes if route.available(now)]
+            if not available:
+                return []
+            start = self._next % len(available)
+            self._next += 1
+        # 직전 실패가 적은 경로부터, 같으면 순환 순서대로
+        rotated = available[start:] + available[:start]
+        return sorted(rotated, key=lambda route: route.consecutive_failures)
+
+    def fetch(self, video_id: str):
+        """
+        Transcript snippets for a video. Video-level errors (no transcript,
+        unavailable video) are raised immediately; blocked or broken routes
+        rotate to the next one.
+        """
+        from youtube_transcript_api import RequestBlocked
+
+        route_errors = _route_errors()
+        last_error = None
+        for route in self._ordered_routes():
+            deadline.check("transcript_api")
+            route.requests += 1
+            start = time.perf_counter()
+            try:
+                items = _fetch_items(self._api(route), video_id)
+            except RequestBlocked as e:
+                route.record_failure(blocked=True, error=e)
+                print(f"Transcript route {route.name} blocked, rotating")
+                last_error = e
+                continue
+            except route_errors as e:
+                # 프록시 자체가 429로 CONNECT를 거절한 경우도 차단으로 취급
+                route.record_failure(blocked=" 429 " in str(e), error=e)
+                print(f"Transcript route {route.name} failed ({type(e).__name__}), rotating")
+                last_error = e
+                continue
+            route.record_success(time.perf_counter() - start)
+            return items
+        raise TranscriptRoutesExhausted(f"No transcript route available: {last_error}")
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {route.name: route.snapshot(now) for route in self.routes}
+
+
+def _redact(proxy_url: str) -> str:
+    """Proxy URL without credentials, for logs and stats."""
+    if "@" not in proxy_url:
+        return proxy_url
+    scheme, _, rest = proxy_url.partition("://")
+    return f"{scheme}://***@{rest.split('@', 1)[1]}"
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher() -> TranscriptFetcher:
+    """Shared fetcher configured from the environment on first use."""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            proxies = [p.strip() for p in os.getenv("TRANSCRIPT_PROXIES", "").split(",") if p.strip()]
+            webshare = None
+            if os.getenv("WEBSHARE_PROXY_USERNAME") and os.getenv("WEBSHARE_PROXY_PASSWORD"):
+                webshare = {
+                    "username": os.getenv("WEBSHARE_PROXY_USERNAME"),
+                    "password": os.getenv("WEBSHARE_PROXY_PASSWORD"),
+                    "retries": os.getenv("WEBSHARE_RETRIES", "2"),
+                }
+            include_direct = os.getenv("TRANSCRIPT_DIRECT", "1") == "1" or not (proxies or webshare)
+            _fetcher = TranscriptFetcher(
+                proxies=proxies,
+                webshare=webshare,
+                include_direct=include_direct,
+                timeout=float(os.getenv("TRANSCRIPT_TIMEOUT", "10")),
+            )
+        return _fetcher
+
+
+def get_transcript_stats() -> dict:
+    """Per-route stats, without creating the fetcher (and importing its dependencies) early."""
+    return _fetcher.stats() if _fetcher is not None else {}
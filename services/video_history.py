@@ -0,0 +1,204 @@
+"""
+Columnar history of popular-video observations, for velocity ranking.
+
+Every collection run observes each candidate video's view and subscriber
+counts. They are appended to one compressed .npz file per UTC day, holding
+parallel arrays: video ID (fixed 11-byte strings), category code, views,
+subscribers and observation time. Appending rewrites only that day's small
+file, atomically, under a per-day cross-process file lock so a script run
+and the in-app refresher never drop each other's observations. Files older
+than the retention window are deleted, so disk usage stays bounded by
+days × runs per day × videos per run.
+
+Loaded days are cached by file mtime, and a window is one concatenation.
+Velocity (views gained per hour between a video's first and last
+observation in the window) and growth are computed for all videos at once
+with a lexsort and group boundaries, with no Python loop over observations.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from services.filelock import file_lock
+from services.popular_videos import CATEGORIES
+
+CATEGORY_CODES = {name: code for code, name in enumerate(CATEGORIES)}
+CATEGORY_NAMES = list(CATEGORIES)
+COLUMNS = ("video_id", "category", "views", "subscribers", "observed_at")
+MIN_SPAN_HOURS = 1.0  # 관측 간격이 이보다 짧으면 속도를 계산하지 않음 (같은 실행 중복 관측 등)
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+class VideoHistory:
+    def __init__(self, directory: Path, retention_days: int = None):
+        self.directory = directory
+        self.retention_days = retention_days if retention_days is not None else int(os.getenv("VIDEO_HISTORY_DAYS", "30"))
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}  # 파일명 → (mtime, 열 배열)
+
+    def _path(self, day: str) -> Path:
+        return self.directory / f"{day}.npz"
+
+    def _empty(self) -> Dict[str, Any]:
+        import numpy as np
+
+        return {
+            "video_id": np.empty(0, dtype="S11"),
+            "category": np.empty(0, dtype=np.uint8),
+            "views": np.empty(0, dtype=np.int64),
+            "subscribers": np.empty(0, dtype=np.int64),
+            "observed_at": np.empty(0, dtype=np.int64),
+        }
+
+    def _load_day(self, path: Path) -> Dict[str, Any]:
+        import numpy as np
+
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            return self._empty()
+        cached = self._cache.get(path.name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            with np.load(path) as data:
+                columns = {name: data[name] for name in COLUMNS}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Video history file unreadable, ignoring {path.name}: {e}")
+            return self._empty()
+        self._cache[path.name] = (mtime, columns)
+        return columns
+
+    def append(self, category: str, observations: List[Dict[str, Any]], observed_at: float = None) -> int:
+        """Append one run's observations ({"id", "views", "subscribers"}) for a category."""
+        import numpy as np
+
+        if not observations or category not in CATEGORY_CODES:
+            return 0
+        observed_at = observed_at or time.time()
+        new = {
+            "video_id": np.array([o["id"] for o in observations], dtype="S11"),
+            "category": np.full(len(observations), CATEGORY_CODES[category], dtype=np.uint8),
+            "views": np.array([o["views"] for o in observations], dtype=np.int64),
+            "subscribers": np.array([o["subscribers"] for o in observations], dtype=np.int64),
+            "observed_at": np.full(len(observations), int(observed_at), dtype=np.int64),
+        }
+        path = self._path(_day(observed_at))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock, file_lock(path):
+            # 잠금을 잡은 뒤에 읽어야 다른 프로세스가 방금 쓴 관측값까지 합쳐짐 (mtime 이 바뀌면 캐시 무시)
+            current = self._load_day(path)
+            merged = {name: np.concatenate([current[name], new[name]]) for name in COLUMNS}
+            # np.savez 는 확장자가 없으면 .npz 를 붙이므로 임시 파일도 .npz 로 끝나게
+            tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+            try:
+                np.savez_compressed(tmp_path, **merged)
+                os.replace(tmp_path, path)
+            except OSError:
+                tmp_path.unlink(missing_ok=True)
+                raise
+            self._prune(observed_at)
+        return len(observations)
+
+    def _prune(self, now: float):
+        cutoff = _day(now - self.retention_days * 86400)
+        for path in self.directory.glob("*.npz"):
+            if "." not in path.stem and path.stem < cutoff:
+                path.unlink(missing_ok=True)
+                self._cache.pop(path.name, None)
+        for lock_path in self.directory.glob("*.npz.lock"):
+            if lock_path.name.split(".")[0] < cutoff:
+                lock_path.unlink(missing_ok=True)
+
+    def load(self, hours: float, now: float = None) -> Dict[str, Any]:
+        """All observations of the last `hours` as concatenated column arrays."""
+        import numpy as np
+
+        now = now or time.time()
+        since = now - hours * 3600
+        day = datetime.fromtimestamp(since, timezone.utc).date()
+        last = datetime.fromtimestamp(now, timezone.utc).date()
+        parts = []
+        while day <= last:
+            parts.append(self._load_day(self._path(day.strftime("%Y-%m-%d"))))
+            day += timedelta(days=1)
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+        keep = columns["observed_at"] >= since
+        return {name: values[keep] for name, values in columns.items()}
+
+    def velocity(self, hours: float = 48, category: str = "", now: float = None) -> Dict[str, Any]:
+        """
+        Per video with at least two observations MIN_SPAN_HOURS apart: views
+        per hour and relative growth between the first and last observation
+        in the window, plus the latest views and subscribers.
+        """
+        import numpy as np
+
+        columns = self.load(hours, now)
+        if category:
+            mask = columns["category"] == CATEGORY_CODES.get(category, 255)
+            columns = {name: values[mask] for name, values in columns.items()}
+        if not len(columns["video_id"]):
+            return {"video_id": columns["video_id"]}
+
+        # 영상 ID, 관측 시각 순 정렬 → 영상별 첫/마지막 관측 위치
+        order = np.lexsort((columns["observed_at"], columns["video_id"]))
+        ids = columns["video_id"][order]
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        ends = np.r_[starts[1:], len(ids)] - 1
+        first, last = order[starts], order[ends]
+
+        span_hours = (columns["observed_at"][last] - columns["observed_at"][first]) / 3600.0
+        gained = columns["views"][last] - columns["views"][first]
+        valid = span_hours >= MIN_SPAN_HOURS
+        first, last, span_hours, gained = first[valid], last[valid], span_hours[valid], gained[valid]
+        first_views = columns["views"][first]
+        return {
+            "video_id": columns["video_id"][last],
+            "category": columns["category"][last],
+            "views": columns["views"][last],
+            "subscribers": columns["subscribers"][last],
+            "observations": (ends - starts + 1)[valid],
+            "span_hours": span_hours,
+            "views_per_hour": gained / span_hours,
+            "growth": np.where(first_views > 0, gained / np.maximum(first_views, 1), np.nan),
+        }
+
+    def rank(self, hours: float = 48, category: str = "", limit: int = 20, now: float = None) -> List[Dict[str, Any]]:
+        """Fastest-growing videos in the window, by views per hour."""
+        import numpy as np
+
+        result = self.velocity(hours, category, now)
+        if not len(result["video_id"]):
+            return []
+        top = np.argsort(-result["views_per_hour"], kind="stable")[:limit]
+        return [
+            {
+                "id": result["video_id"][i].decode("ascii"),
+                "url": f"https://www.youtube.com/shorts/{result['video_id'][i].decode('ascii')}",
+                "category": CATEGORY_NAMES[result["category"][i]] if result["category"][i] < len(CATEGORY_NAMES) else None,
+                "view_count": int(result["views"][i]),
+                "subscriber_count": int(result["subscribers"][i]),
+                "views_per_hour": round(float(result["views_per_hour"][i]), 1),
+                "growth": round(float(result["growth"][i]), 3) if not np.isnan(result["growth"][i]) else None,
+                "observations": int(result["observations"][i]),
+                "span_hours": round(float(result["span_hours"][i]), 1),
+            }
+            for i in top
+        ]
+
+    def status(self) -> Dict[str, Any]:
+        files = sorted(f for f in self.directory.glob("*.npz") if "." not in f.stem) if self.directory.exists() else []
+        return {
+            "days": len(files),
+            "retention_days": self.retention_days,
+            "size_kb": round(sum(f.stat().st_size for f in files) / 1024, 1),
+            "oldest": files[0].stem if files else None,
+            "newest": files[-1].stem if files else None,
+        }
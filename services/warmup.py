@@ -0,0 +1,95 @@
+import asyncio
+import time
+from pathlib import Path
+
+from services.admission import AdmissionController, AdmissionRejected, PRIORITY_BACKGROUND
+
+
+class CacheWarmer:
+    """
+    Pre-analyzes URLs in the background so later user requests hit the cache.
+
+    Work goes through the same admission pool as user analyses but at
+    background priority, so queued user requests are always admitted first,
+    and at most `concurrency` warm-up jobs are in flight (or queued) at once.
+    """
+
+    def __init__(self, analyze, is_cached, admission: AdmissionController,
+                 pool: str = "analyze", concurrency: int = 1, retry_delay: float = 30.0):
+        self.analyze = analyze
+        self.is_cached = is_cached
+        self.admission = admission
+        self.pool = pool
+        self.concurrency = max(1, concurrency)
+        self.retry_delay = retry_delay
+        self._queue: asyncio.Queue = None
+        self._pending = set()
+        self._workers = set()
+        self.stats = {"enqueued": 0, "warmed": 0, "skipped": 0, "failed": 0, "last_enqueue": None}
+
+    def enqueue(self, urls) -> int:
+        """Queue URLs that are not cached or already pending; must run on the event loop."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        added = 0
+        for url in urls:
+            if not url or url in self._pending or self.is_cached(url):
+                continue
+            self._pending.add(url)
+            self._queue.put_nowait(url)
+            added += 1
+        if added:
+            self.stats["enqueued"] += added
+            self.stats["last_enqueue"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            while len(self._workers) < self.concurrency:
+                task = asyncio.create_task(self._worker())
+                self._workers.add(task)
+                task.add_done_callback(self._workers.discard)
+        return added
+
+    async def _worker(self):
+        while not self._queue.empty():
+            url = self._queue.get_nowait()
+            requeued = False
+            try:
+                if self.is_cached(url):
+                    self.stats["skipped"] += 1
+                    continue
+                async with self.admission.slot(self.pool, PRIORITY_BACKGROUND):
+                    await self.analyze(url)
+                self.stats["warmed"] += 1
+            except AdmissionRejected:
+                # 사용자 요청이 밀려 있으면 잠시 뒤 다시 시도
+                await asyncio.sleep(self.retry_delay)
+                self._queue.put_nowait(url)
+                requeued = True
+            except Exception as e:
+                print(f"Cache warm-up failed for {url}: {e}")
+                self.stats["failed"] += 1
+            finally:
+                if not requeued:
+                    self._pending.discard(url)
+
+    def status(self) -> dict:
+        return dict(self.stats, pending=len(self._pending), workers=len(self._workers))
+
+    def cancel(self):
+        for task in list(self._workers):
+            task.cancel()
+
+
+async def watch_file(path: Path, on_change, interval: float = 60.0):
+    """Call `on_change()` at start and whenever the file's mtime changes."""
+    last_mtime = None
+    while True:
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != last_mtime:
+            last_mtime = mtime
+            try:
+                on_change()
+            except Exception as e:
+                print(f"Watcher callback for {path.name} failed: {e}")
+        await asyncio.sleep(interval)
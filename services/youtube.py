@@ -1,169 +1,323 @@
-from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api.proxies import WebshareProxyConfig
 from urllib.parse import urlparse, parse_qs
 import sys
 import glob
 import os
 import tempfile
+import threading
 import time
 
-from yt_dlp import YoutubeDL
+from services import audio_cache, deadline, metadata
+from services.deadline import PipelineAborted
+from services.transcripts import get_fetcher
+from services.transcription import POLICY, english_model
 
-# Whisper model (lazy loaded)
-_whisper_model = None
+# yt_dlp / youtube_transcript_api are imported on first use to keep app startup fast
 
-def get_whisper_model():
-    """Lazy load the Whisper model to avoid slow startup"""
-    global _whisper_model
-    if _whisper_model is None:
+# Whisper models by name (lazy loaded; the default WHISPER_MODEL is optionally warmed up at startup)
+_whisper_models = {}
+_whisper_lock = threading.Lock()
+_whisper_state = {"status": "cold", "model": None, "load_seconds": None, "error": None}
+
+# yt-dlp 오류 메시지 중 영상 자체를 받을 수 없는 경우 (재시도해도 같은 결과)
+UNAVAILABLE_MARKERS = (
+    "video unavailable",
+    "private video",
+    "this video is not available",
+    "not available in your country",
+    "has been removed",
+    "sign in to confirm your age",
+    "members-only",
+)
+
+
+def _report(failure, reason: str, detail=""):
+    """Record why transcript extraction failed (see services/negative_cache.py for reasons)."""
+    if failure is not None:
+        failure.update(reason=reason, detail=str(detail).splitlines()[0][:200] if str(detail) else "")
+
+
+def _download_error_reason(error: Exception) -> str:
+    message = str(error).lower()
+    return "unavailable" if any(marker in message for marker in UNAVAILABLE_MARKERS) else "download_failed"
+
+
+def get_whisper_settings():
+    """
+    Runtime settings shared by every Whisper model (per-job decoding is in services/transcription.py).
+    Read on every call so values from .env (loaded by the app after import) apply.
+    """
+    return {
+        "model": os.getenv("WHISPER_MODEL", "small"),
+        "device": os.getenv("WHISPER_DEVICE", "cpu"),
+        "compute_type": os.getenv("WHISPER_COMPUTE_TYPE", "int8"),
+        "cpu_threads": int(os.getenv("WHISPER_CPU_THREADS", "0")),
+        "vad_filter": os.getenv("WHISPER_VAD", "1") == "1",
+        "vad_min_silence_ms": int(os.getenv("WHISPER_VAD_MIN_SILENCE_MS", "500")),
+        "language": os.getenv("WHISPER_LANGUAGE", "ko"),
+    }
+
+
+def get_whisper_model(name: str | None = None):
+    """Lazy load a Whisper model (default WHISPER_MODEL); loaded models are kept for reuse."""
+    settings = get_whisper_settings()
+    name = name or settings["model"]
+    model = _whisper_models.get(name)
+    if model is not None:
+        return model
+
+    # Warm-up thread and request threads may race here; load only once
+    with _whisper_lock:
+        if name not in _whisper_models:
+            # 준비 상태(/api/ready)는 기본 모델 기준
+            is_default = name == settings["model"]
+            if is_default:
+                _whisper_state.update(status="loading", model=name, error=None)
+            try:
+                from faster_whisper import WhisperModel
+                print(f"Loading Whisper model ({name}, {settings['compute_type']})...")
+                start = time.time()
+                _whisper_models[name] = WhisperModel(
+                    name,
+                    device=settings["device"],
+                    compute_type=settings["compute_type"],
+                    cpu_threads=settings["cpu_threads"],
+                )
+                elapsed = time.time() - start
+                if is_default:
+                    _whisper_state.update(status="warm", load_seconds=round(elapsed, 1))
+                print(f"Whisper model {name} loaded in {elapsed:.1f}s")
+            except Exception as e:
+                if is_default:
+                    _whisper_state.update(status="failed", error=str(e))
+                print(f"Failed to load Whisper model {name}: {e}")
+                return None
+    return _whisper_models[name]
+
+
+def warm_up_whisper():
+    """Load the model and run one short inference so the first real job skips both costs."""
+    model = get_whisper_model()
+    if model is None:
+        return
+    try:
+        import numpy as np
+        start = time.time()
+        segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32), beam_size=1, language="ko")
+        list(segments)
+        print(f"Whisper warm-up inference done in {time.time() - start:.1f}s")
+    except Exception as e:
+        print(f"Whisper warm-up inference failed: {e}")
+
+
+def get_whisper_status():
+    """Transcriber readiness for the readiness endpoint."""
+    return dict(_whisper_state, loaded_models=sorted(_whisper_models))
+
+
+def _pick_language(video_id: str, model, audio) -> tuple[str, str]:
+    """(language, source): metadata language, else Whisper detection, else WHISPER_LANGUAGE."""
+    fallback = get_whisper_settings()["language"]
+    supported = set(getattr(model, "supported_languages", None) or [])
+    hint = ((metadata.cached(video_id) or {}).get("language") or "").split("-")[0].lower()
+    if hint and (not supported or hint in supported):
+        return hint, "metadata"
+    try:
+        language, probability, _ = model.detect_language(audio)
+    except Exception as e:
+        print(f"Whisper language detection failed: {e}")
+        return fallback, "default"
+    if probability >= 0.5:
+        return language, "detected"
+    return fallback, "default"
+
+
+def download_audio(video_id: str, url: str):
+    """
+    Download the lowest-bitrate usable audio stream and decode it to 16 kHz mono.
+    Returns float32 samples or None. AUDIO_MAX_SECONDS (0 = off) trims long videos.
+    """
+    from faster_whisper import decode_audio
+    from yt_dlp.utils import DownloadError
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        audio_path = os.path.join(tmpdir, f"{video_id}")
+
+        # Speech recognition needs far less than bestaudio; ~48 kbps opus/m4a is plenty
+        ydl_opts = {
+            "format": os.getenv("AUDIO_FORMAT", "worstaudio[abr>=32]/worstaudio/bestaudio/best"),
+            "outtmpl": audio_path + ".%(ext)s",
+            # 다운로드 중에도 요청 마감/취소 확인 (예외가 다운로드를 중단시킴)
+            "progress_hooks": [lambda status: deadline.check("audio_download")],
+        }
+
+        # 자막 단계에서 이미 추출한 메타데이터를 재사용 (페이지/플레이어 재요청 없음)
+        print("Downloading audio...")
         try:
-            from faster_whisper import WhisperModel
-            print("Loading Whisper model (small)...")
-            start = time.time()
-            # Use small model for better accuracy, CPU mode
-            _whisper_model = WhisperModel("small", device="cpu", compute_type="int8")
-            print(f"Whisper model loaded in {time.time() - start:.1f}s")
-        except Exception as e:
-            print(f"Failed to load Whisper model: {e}")
+            metadata.download(metadata.resolve(video_id, url), ydl_opts)
+        except DownloadError as e:
+            # 마감/취소로 중단된 경우 yt-dlp가 감싼 오류일 수 있으니 먼저 확인
+            deadline.check("audio_download")
+            # 캐시된 포맷 URL이 만료됐을 수 있으니 한 번만 새로 추출해서 재시도
+            print(f"Audio download with cached metadata failed ({e}), re-extracting...")
+            metadata.invalidate(video_id)
+            metadata.download(metadata.resolve(video_id, url), ydl_opts)
+
+        audio_files = glob.glob(os.path.join(tmpdir, f"{video_id}.*"))
+        if not audio_files:
+            print("No audio file downloaded")
             return None
-    return _whisper_model
 
+        print(f"Audio downloaded: {audio_files[0]}")
+        samples = decode_audio(audio_files[0], sampling_rate=audio_cache.SAMPLE_RATE)
 
-def transcribe_with_whisper(video_id: str, url: str) -> dict | None:
+    max_seconds = float(os.getenv("AUDIO_MAX_SECONDS", "0"))
+    if max_seconds > 0:
+        samples = samples[: int(max_seconds * audio_cache.SAMPLE_RATE)]
+    return samples
+
+
+def transcribe_with_whisper(video_id: str, url: str, failure: dict | None = None) -> dict | None:
     """
-    Download audio and transcribe with Whisper.
-    Returns { "text": "...", "duration": seconds } or None
+    Transcribe a video's audio with Whisper, reusing cached decoded audio when present.
+    Returns { "text": "...", "duration": seconds } or None (reason recorded in `failure`)
     """
+    from yt_dlp.utils import DownloadError
+
     try:
         print(f"Attempting Whisper transcription for {video_id}...")
         start_time = time.time()
 
-        model = get_whisper_model()
-        if model is None:
+        # 오디오를 받기 전에 Whisper 사용 가능 여부만 확인 (모델은 길이를 안 뒤에 선택)
+        try:
+            import faster_whisper
+        except ImportError as e:
+            _report(failure, "whisper_unavailable", e)
             return None
 
-        # Create temp directory for audio
-        with tempfile.TemporaryDirectory() as tmpdir:
-            audio_path = os.path.join(tmpdir, f"{video_id}")
-
-            # Download audio only (without ffmpeg conversion)
-            ydl_opts = {
-                "format": "bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best",
-                "outtmpl": audio_path + ".%(ext)s",
-                "quiet": True,
-                "no_warnings": True,
-            }
-
-            print("Downloading audio...")
-            with YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-
-            # Find the downloaded audio file
-            audio_files = glob.glob(os.path.join(tmpdir, f"{video_id}.*"))
-            if not audio_files:
-                print("No audio file downloaded")
+        audio = audio_cache.load_audio(video_id)
+        if audio is not None:
+            print(f"Using cached audio for {video_id}")
+        else:
+            deadline.check("audio_download")
+            audio = download_audio(video_id, url)
+            if audio is None:
+                _report(failure, "download_failed", "no audio file downloaded")
                 return None
+            audio_cache.store_audio(video_id, audio)
 
-            audio_file = audio_files[0]
-            print(f"Audio downloaded: {audio_file}")
-
-            # Transcribe with Whisper - use beam_size=5 for better accuracy, try Korean first
-            print("Transcribing with Whisper (Korean)...")
-            segments, info = model.transcribe(audio_file, beam_size=5, language="ko")
-
-            # Collect all segments
-            text_parts = []
-            duration = 0.0
-            for segment in segments:
-                text_parts.append(segment.text.strip())
-                duration = max(duration, segment.end)
-
-            full_text = " ".join(text_parts).strip()
-            elapsed = time.time() - start_time
-
-            print(f"Whisper transcription complete in {elapsed:.1f}s")
-            print(f"Detected language: {info.language}, Duration: {duration:.1f}s")
-            print(f"Transcript preview: {full_text[:100]}...")
+        # 길이(지연 예산)에 맞는 디코딩 프로필 선택 → 언어 결정 → 영어는 영어 전용 모델
+        deadline.check("whisper")
+        audio_seconds = len(audio) / audio_cache.SAMPLE_RATE
+        decision = POLICY.choose(audio_seconds)
+        model = get_whisper_model(decision["model"])
+        if model is None:
+            _report(failure, "whisper_unavailable", _whisper_state.get("error") or decision["model"])
+            return None
+        language, language_source = _pick_language(video_id, model, audio)
+        if language == "en" and english_model(decision["model"]) != decision["model"]:
+            english = get_whisper_model(english_model(decision["model"]))
+            if english is not None:
+                model, decision["model"] = english, english_model(decision["model"])
+        decision.update(language=language, language_source=language_source)
+
+        # VAD skips silent stretches
+        settings = get_whisper_settings()
+        print(f"Transcribing with Whisper ({decision['name']}: {decision['model']}, {language}, "
+              f"beam={decision['beam_size']}, ~{decision['estimated_seconds']}s of {decision['budget_seconds']:.0f}s budget)...")
+        decode_start = time.time()
+        segments, info = model.transcribe(
+            audio,
+            beam_size=decision["beam_size"],
+            best_of=decision["beam_size"],
+            language=language,
+            condition_on_previous_text=decision["condition_on_previous_text"],
+            without_timestamps=decision["without_timestamps"],
+            vad_filter=settings["vad_filter"],
+            vad_parameters={"min_silence_duration_ms": settings["vad_min_silence_ms"]},
+        )
+
+        # Collect all segments (decoding is lazy, so the deadline is checked between segments)
+        text_parts, timed = [], []
+        for segment in segments:
+            deadline.check("whisper")
+            text_parts.append(segment.text.strip())
+            timed.append({"start": segment.start, "end": segment.end, "text": segment.text.strip()})
+        POLICY.record(decision, audio_seconds, time.time() - decode_start)
+        # AUDIO_MAX_SECONDS로 잘랐을 수 있으니 메타데이터의 실제 길이를 우선
+        video_info = metadata.cached(video_id) or {}
+        duration = video_info.get("duration") or len(audio) / audio_cache.SAMPLE_RATE
+
+        full_text = " ".join(text_parts).strip()
+        elapsed = time.time() - start_time
+
+        print(f"Whisper transcription complete in {elapsed:.1f}s")
+        print(f"Detected language: {info.language}, Duration: {duration:.1f}s")
+        print(f"Transcript preview: {full_text[:100]}...")
+
+        if full_text:
+            return {"text": full_text, "duration": duration, "segments": timed, "transcription": decision}
+
+        _report(failure, "no_speech", f"no speech recognized in {duration:.0f}s of audio")
+        return None
 
-            if full_text:
-                return {"text": full_text, "duration": duration}
+    except PipelineAborted:
+        raise
 
+    except DownloadError as e:
+        print(f"Audio download failed: {e}")
+        _report(failure, _download_error_reason(e), e)
         return None
 
     except Exception as e:
+        _report(failure, "transcription_failed", e)
         print(f"Whisper transcription failed: {e}")
         import traceback
         traceback.print_exc()
         return None
 
-def get_transcript(url):
-    """
-    Extracts video ID from URL and fetches transcript.
-    Returns a dict: { "text": "...", "duration": seconds or None } or None if failed.
-    """
+def extract_video_id(url):
+    """YouTube video ID from watch/shorts/embed/youtu.be URLs, or None."""
     try:
-        video_id = None
         parsed_url = urlparse(url)
-
         if parsed_url.hostname == 'youtu.be':
-            video_id = parsed_url.path[1:]
+            return parsed_url.path[1:] or None
         if parsed_url.hostname in ('www.youtube.com', 'youtube.com'):
             if parsed_url.path == '/watch':
-                p = parse_qs(parsed_url.query)
-                video_id = p['v'][0]
-            if parsed_url.path[:7] == '/embed/':
-                video_id = parsed_url.path.split('/')[2]
-            if parsed_url.path[:3] == '/v/':
-                video_id = parsed_url.path.split('/')[2]
-            if parsed_url.path[:8] == '/shorts/':
-                video_id = parsed_url.path.split('/')[2]
+                return parse_qs(parsed_url.query)['v'][0]
+            if parsed_url.path[:7] == '/embed/' or parsed_url.path[:3] == '/v/' or parsed_url.path[:8] == '/shorts/':
+                return parsed_url.path.split('/')[2] or None
+    except (KeyError, IndexError, ValueError):
+        pass
+    return None
+
 
+def _whisper_fallback(video_id: str, url: str, failure: dict | None, whisper: bool):
+    if not whisper:
+        _report(failure, "whisper_skipped", "no captions and Whisper disabled for this request")
+        return None
+    return transcribe_with_whisper(video_id, url, failure)
+
+
+def get_transcript(url, failure: dict | None = None, whisper: bool = True):
+    """
+    Extracts video ID from URL and fetches transcript.
+    Returns a dict: { "text": "...", "duration": seconds or None, "segments": [{start, end, text}] }
+    or None if failed. On failure, `failure` (if given) gets "reason" and "detail" keys.
+    whisper=False stops after the caption sources (cheap lookups such as bulk triage).
+    """
+    try:
+        video_id = extract_video_id(url)
         if not video_id:
             print(f"Failed to extract video_id from: {url}")
+            _report(failure, "invalid_url", url)
             return None
 
         print(f"Extracted video_id: {video_id} from {url}")
+        deadline.check("transcript_api")
 
-        # Method 1: youtube_transcript_api
+        # Method 1: youtube_transcript_api (공유 세션 + 프록시 순환, services/transcripts.py)
         try:
-            api = YouTubeTranscriptApi()
-            transcript_items = None
-
-            # Try 1: Get list of available transcripts and fetch any available one
-            try:
-                transcript_list = api.list(video_id)
-                print(f"Available transcripts: {[t.language_code for t in transcript_list]}")
-
-                # Priority order for languages
-                preferred_langs = ['ko', 'en', 'ja', 'zh-Hans', 'zh-Hant', 'es', 'pt', 'de', 'fr']
-
-                # Try to find a transcript in preferred language order
-                for lang in preferred_langs:
-                    for transcript in transcript_list:
-                        if transcript.language_code == lang or transcript.language_code.startswith(lang):
-                            print(f"Found transcript in {transcript.language_code}")
-                            transcript_items = transcript.fetch()
-                            break
-                    if transcript_items:
-                        break
-
-                # If no preferred language found, get the first available
-                if not transcript_items:
-                    for transcript in transcript_list:
-                        print(f"Using first available transcript: {transcript.language_code}")
-                        transcript_items = transcript.fetch()
-                        break
-
-            except Exception as list_error:
-                print(f"api.list failed: {list_error}")
-                # Try 2: Direct fetch with expanded language list
-                try:
-                    preferred_langs = ['ko', 'en', 'en-US', 'ja', 'zh', 'zh-Hans', 'zh-Hant', 'es', 'pt', 'de', 'fr']
-                    transcript_items = api.fetch(video_id, languages=preferred_langs)
-                except Exception as fetch_error:
-                    print(f"api.fetch with languages failed: {fetch_error}")
-                    # Try 3: Fetch without specifying languages
-                    transcript_items = api.fetch(video_id)
+            transcript_items = get_fetcher().fetch(video_id)
 
             if transcript_items:
                 # Convert to list if needed
@@ -175,81 +329,68 @@ def get_transcript(url):
                 if transcript_items:
                     last = transcript_items[-1]
                     duration = float(getattr(last, 'start', 0) + getattr(last, 'duration', 0))
+                segments = [
+                    {"start": item.start, "end": item.start + item.duration, "text": item.text}
+                    for item in transcript_items
+                ]
 
                 if full_text:
-                    return {"text": full_text, "duration": duration or None}
+                    return {"text": full_text, "duration": duration or None, "segments": segments}
 
             # youtube_transcript_api didn't return usable transcript, fall through to Whisper
             print("youtube_transcript_api returned no usable transcript, trying Whisper...")
-            result = transcribe_with_whisper(video_id, url)
+            result = _whisper_fallback(video_id, url, failure, whisper)
             if result:
                 return result
             return None
 
+        except PipelineAborted:
+            raise
+
         except Exception as e:
             print(f"youtube_transcript_api failed: {e}")
 
-            # Method 2: yt-dlp fallback (library call)
+            # Method 2: yt-dlp fallback - subtitles from the shared metadata (Whisper reuses it)
             try:
                 print("Attempting yt-dlp fallback...")
-                output_template = f"transcript_{video_id}.%(ext)s"
-
-                # Clean up old files
-                for f in glob.glob(f"transcript_{video_id}*"):
-                    os.remove(f)
-
-                ydl_opts = {
-                    "skip_download": True,
-                    "writesubtitles": True,
-                    "writeautomaticsub": True,
-                    "subtitleslangs": ["ko", "en", "ja", "zh", "es", "pt", "de", "fr"],
-                    "outtmpl": output_template,
-                    "quiet": True,
-                }
-
-                with YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
-
-                # Find the downloaded vtt file
-                files = glob.glob(f"transcript_{video_id}*.vtt")
-                if not files:
+                deadline.check("metadata")
+                info = metadata.resolve(video_id, url)
+                deadline.check("subtitles")
+                segments = metadata.subtitle_segments(info)
+                if not segments:
                     print("No subtitle files found, trying Whisper...")
                     # No subtitles found, try Whisper fallback
-                    result = transcribe_with_whisper(video_id, url)
+                    result = _whisper_fallback(video_id, url, failure, whisper)
                     if result:
                         return result
                     return None
 
-                vtt_file = files[0]
-
-                # Simple VTT parser (skipping timestamps) - duration unavailable here
-                text_content = []
-                with open(vtt_file, 'r', encoding='utf-8') as f:
-                    seen_lines = set()
-                    for line in f:
-                        line = line.strip()
-                        if '-->' in line or not line or line == 'WEBVTT':
-                            continue
-                        if line not in seen_lines:
-                            text_content.append(line)
-                            seen_lines.add(line)
-
-                # Cleanup
-                for f_path in glob.glob(f"transcript_{video_id}*"):
-                    os.remove(f_path)
+                # 자막 마지막 큐보다 메타데이터의 영상 길이가 정확
+                text = " ".join(segment["text"] for segment in segments)
+                return {"text": text, "duration": info.get("duration") or segments[-1]["end"], "segments": segments}
 
-                return {"text": " ".join(text_content), "duration": None}
+            except PipelineAborted:
+                raise
 
             except Exception as e2:
                 print(f"yt-dlp fallback failed: {e2}")
 
+                # 삭제/비공개/지역 제한 영상은 오디오도 받을 수 없으니 Whisper까지 가지 않음
+                if _download_error_reason(e2) == "unavailable":
+                    _report(failure, "unavailable", e2)
+                    return None
+
                 # Method 3: Whisper fallback (for videos without subtitles)
-                result = transcribe_with_whisper(video_id, url)
+                result = _whisper_fallback(video_id, url, failure, whisper)
                 if result:
                     return result
 
                 return None
 
+    except PipelineAborted:
+        raise
+
     except Exception as e:
         print(f"Error fetching transcript: {e}")
+        _report(failure, "error", e)
         return None
@@ -11,24 +11,53 @@ if (isLocalEnvironment) {
   });
 }
 
-// 세션 ID 생성 및 heartbeat
+// 세션 ID 생성 및 접속 유지
 const SESSION_ID = 'user_' + Math.random().toString(36).substr(2, 9) + '_' + Date.now();
+const PRESENCE_URL = `/api/presence?sid=${encodeURIComponent(SESSION_ID)}`;
+
+// WebSocket이 열려 있는 동안 접속 중으로 집계 (주기적인 요청 없음)
+// 연결이 안 되는 환경에서만 10초마다 가벼운 HTTP heartbeat로 대체
+let presenceSocket = null;
+let presenceTimer = null;
+let presenceRetry = 0;
 
 function sendHeartbeat() {
-  fetch('/api/heartbeat', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ session_id: SESSION_ID })
-  }).catch(() => {});
+  fetch(PRESENCE_URL, { method: 'POST', keepalive: true }).catch(() => {});
+}
+
+function startHeartbeatFallback() {
+  if (presenceTimer) return;
+  sendHeartbeat();
+  presenceTimer = setInterval(sendHeartbeat, 10000);
+}
+
+function connectPresence() {
+  if (!('WebSocket' in window)) return startHeartbeatFallback();
+  const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+  const socket = new WebSocket(`${protocol}//${window.location.host}/ws/presence?sid=${encodeURIComponent(SESSION_ID)}`);
+  presenceSocket = socket;
+
+  socket.onopen = () => {
+    presenceRetry = 0;
+    if (presenceTimer) {
+      clearInterval(presenceTimer);
+      presenceTimer = null;
+    }
+  };
+  socket.onclose = () => {
+    presenceSocket = null;
+    // 끊기면 HTTP로 유지하면서 점점 늦게 재연결 시도 (최대 1분)
+    startHeartbeatFallback();
+    presenceRetry = Math.min(presenceRetry + 1, 6);
+    setTimeout(connectPresence, Math.min(60000, 1000 * 2 ** presenceRetry));
+  };
 }
 
-// 페이지 로드 시 즉시 heartbeat, 이후 10초마다
-sendHeartbeat();
-setInterval(sendHeartbeat, 10000);
+connectPresence();
 
-// 페이지 떠날 때 알림 (선택적)
+// 페이지 떠날 때 알림 (WebSocket은 연결 종료로 자동 처리)
 window.addEventListener('beforeunload', () => {
-  navigator.sendBeacon('/api/heartbeat', JSON.stringify({ session_id: SESSION_ID + '_leave' }));
+  if (!presenceSocket) navigator.sendBeacon(PRESENCE_URL + '&leave=1');
 });
 
 // 개발자 도구 차단
@@ -119,6 +148,43 @@ async function postJSON(url, body) {
   }
 }
 
+// NDJSON streaming POST: calls onEvent for each intermediate event, resolves with the final analysis
+async function postNDJSON(url, body, onEvent) {
+  const res = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  });
+
+  if (!res.ok) {
+    let detail = await res.text();
+    try {
+      const j = JSON.parse(detail);
+      detail = j.detail || detail;
+    } catch (_) { }
+    throw new Error(detail || res.statusText);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (value) buffer += decoder.decode(value, { stream: true });
+    let newline;
+    while ((newline = buffer.indexOf("\n")) >= 0) {
+      const line = buffer.slice(0, newline).trim();
+      buffer = buffer.slice(newline + 1);
+      if (!line) continue;
+      const event = JSON.parse(line);
+      if (event.type === "result") return event.analysis;
+      if (event.type === "error") throw new Error(event.detail || "분석 실패");
+      onEvent(event);
+    }
+    if (done) throw new Error("응답이 중간에 끊겼습니다.");
+  }
+}
+
 // Progress Steps Animation
 let progressTimers = [];
 let loadingTimers = [];
@@ -181,6 +247,19 @@ const showLoadingOverlay = () => {
   });
 };
 
+// 자막이 준비되면 서버가 보내는 예비 점수(로컬 휴리스틱)를 AI 분석이 끝날 때까지 표시
+const HOOK_SIGNAL_LABELS = { question: "질문형", number: "숫자", strong_claim: "강한 주장" };
+
+const showPrescore = (pre) => {
+  clearLoadingTimers();
+  const title = el("loadingTitle");
+  const subtitle = el("loadingSubtitle");
+  if (!title || !subtitle) return;
+  const hook = pre.hook.signals.map(s => HOOK_SIGNAL_LABELS[s] || s).join("·") || "감지 안 됨";
+  title.innerText = `예상 점수 ${pre.preliminary_score}점`;
+  subtitle.innerText = `훅: ${hook} · CTA: ${pre.cta.detected ? "있음" : "없음"} — AI가 정밀 분석 중이에요`;
+};
+
 const hideLoadingOverlay = () => {
   clearLoadingTimers();
   const overlay = el("loadingOverlay");
@@ -783,7 +862,12 @@ document.addEventListener("DOMContentLoaded", () => {
     showLoadingOverlay();
 
     try {
-      const data = await postJSON("/api/analyze", { url });
+      // 스트리밍을 지원하면 예비 점수를 먼저 보여주고, 아니면 기존 방식
+      const data = (window.ReadableStream && window.TextDecoder)
+        ? await postNDJSON("/api/analyze/stream", { url }, (event) => {
+          if (event.type === "prescore") showPrescore(event);
+        })
+        : await postJSON("/api/analyze", { url });
       renderBlueprint(data);
       showToast("분석이 완료되었습니다! 🎉");
     } catch (e) {
@@ -1512,8 +1596,9 @@ document.addEventListener("DOMContentLoaded", () => {
         closeCategoryModal();
 
         // 결과 표시
-        state.analysis = templateAnalysis;
-        renderBlueprint(templateAnalysis);
+        // 서버의 카테고리 템플릿 구조(실측 타이밍 반영)가 있으면 그것을 표시
+        state.analysis = res.analysis || templateAnalysis;
+        renderBlueprint(state.analysis);
 
         const id = `Ver ${state.scripts.length + 1}`;
         state.scripts.push({ id, text: res.script });